@@ -0,0 +1,54 @@
+# frozen_string_literal: true
+
+require 'json'
+require 'io/wait'
+require 'socket'
+require 'securerandom'
+
+# Client for the persistent CrewAI worker (lib/crewai/worker.py).
+#
+# The worker keeps the CrewAI and Ollama imports warm and accepts the same
+# JSON payloads as the one-shot scripts over a Unix socket, one JSON document
+# per line. When no worker is configured or reachable, callers fall back to
+# spawning the scripts.
+class CrewAiClient
+  Error = Class.new(StandardError)
+
+  TIMEOUT = 300
+
+  class << self
+    def socket_path
+      ENV.fetch('CREWAI_WORKER_SOCKET', nil)
+    end
+
+    def available?
+      socket_path.present? && File.socket?(socket_path)
+    end
+
+    # Sends a command to the worker and returns the parsed success envelope,
+    # or nil when the worker is not available
+    def call(command, payload)
+      return unless available?
+
+      request_id = SecureRandom.hex(8)
+      line = { id: request_id, command: command.to_s, payload: payload }.to_json
+
+      response = UNIXSocket.open(socket_path) do |socket|
+        socket.write("#{line}\n")
+        raise Error, 'CrewAI worker timed out' unless socket.wait_readable(TIMEOUT)
+
+        socket.gets
+      end
+
+      raise Error, 'CrewAI worker closed the connection' if response.nil?
+
+      result = JSON.parse(response)
+      raise Error, result['message'] unless result['status'] == 'success'
+
+      result
+    rescue Errno::ENOENT, Errno::ECONNREFUSED => e
+      Rails.logger.warn("CrewAI worker unavailable, falling back to scripts: #{e.message}")
+      nil
+    end
+  end
+end
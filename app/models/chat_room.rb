@@ -71,6 +71,10 @@ class ChatRoom < ApplicationRecord
       verbose: Rails.env.development?
     }
     
+    # Prefer the persistent worker when it is running
+    worker_result = CrewAiClient.call(:create_crew, crew_data)
+    return worker_result['crew_id'] if worker_result
+    
     # Call Python helper to create the crew
     python_script = Rails.root.join('lib', 'crewai', 'create_crew.py')
     
@@ -110,6 +114,10 @@ class ChatRoom < ApplicationRecord
   
   # Method to run a crew's tasks and get the result
   def run_crew(crew_id)
+    # Prefer the persistent worker when it is running
+    worker_result = CrewAiClient.call(:run_crew, crew_id.to_s)
+    return worker_result['result'] if worker_result
+    
     # Call Python helper to run the crew
     python_script = Rails.root.join('lib', 'crewai', 'run_crew.py')
     
@@ -80,6 +80,10 @@ class CrewAgent < ApplicationRecord
       memory: memory
     }
     
+    # Prefer the persistent worker when it is running
+    worker_result = CrewAiClient.call(:create_agent, agent_data)
+    return worker_result['agent_id'] if worker_result
+    
     # Call Python helper to create the agent
     python_script = Rails.root.join('lib', 'crewai', 'create_agent.py')
     
@@ -87,6 +87,10 @@ class CrewTask < ApplicationRecord
       tools: tools
     }
     
+    # Prefer the persistent worker when it is running
+    worker_result = CrewAiClient.call(:create_task, task_data)
+    return worker_result['task_id'] if worker_result
+    
     # Call Python helper to create the task
     python_script = Rails.root.join('lib', 'crewai', 'create_task.py')
     
@@ -0,0 +1,35 @@
+# frozen_string_literal: true
+
+class AddChatRoomsChangedTrigger < ActiveRecord::Migration[7.0]
+  # Lets the CrewAI bot keep its in-process room registry in sync by
+  # LISTENing on chat_rooms_changed. Only the operation and room ID are sent;
+  # the bot re-reads the row itself so keys never appear in notifications.
+  def up
+    execute <<~SQL.squish
+      CREATE OR REPLACE FUNCTION notify_chat_rooms_changed() RETURNS trigger AS $$
+      DECLARE
+        changed_id bigint;
+      BEGIN
+        IF TG_OP = 'DELETE' THEN
+          changed_id := OLD.id;
+        ELSE
+          changed_id := NEW.id;
+        END IF;
+        PERFORM pg_notify('chat_rooms_changed', json_build_object('op', TG_OP, 'id', changed_id)::text);
+        RETURN NULL;
+      END;
+      $$ LANGUAGE plpgsql;
+    SQL
+
+    execute <<~SQL.squish
+      CREATE TRIGGER chat_rooms_changed
+      AFTER INSERT OR UPDATE OR DELETE ON chat_rooms
+      FOR EACH ROW EXECUTE FUNCTION notify_chat_rooms_changed();
+    SQL
+  end
+
+  def down
+    execute 'DROP TRIGGER IF EXISTS chat_rooms_changed ON chat_rooms'
+    execute 'DROP FUNCTION IF EXISTS notify_chat_rooms_changed()'
+  end
+end
@@ -0,0 +1,16 @@
+# frozen_string_literal: true
+
+class CreateChatRoomSummaries < ActiveRecord::Migration[7.0]
+  # Rolling conversation summary maintained by the CrewAI bot. The watermark
+  # is the (created_at, id) key of the newest message folded into the summary.
+  def change
+    create_table :chat_room_summaries do |t|
+      t.references :room, null: false, foreign_key: { to_table: :chat_rooms, on_delete: :cascade }, index: { unique: true }
+      t.binary :encrypted_summary, null: false
+      t.datetime :watermark_created_at
+      t.bigint :watermark_message_id
+
+      t.timestamps
+    end
+  end
+end
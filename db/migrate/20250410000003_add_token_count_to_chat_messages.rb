@@ -0,0 +1,9 @@
+# frozen_string_literal: true
+
+class AddTokenCountToChatMessages < ActiveRecord::Migration[7.0]
+  # Token count of the decrypted message, computed once by the CrewAI bot when
+  # the message is written so prompt assembly never has to tokenize history
+  def change
+    add_column :chat_messages, :token_count, :integer
+  end
+end
@@ -0,0 +1,20 @@
+# frozen_string_literal: true
+
+class CreateCrewResponseCacheEntries < ActiveRecord::Migration[7.0]
+  # Second-tier response cache shared by CrewAI bot processes. Responses are
+  # encrypted with the room key, so entries are scoped to their room.
+  def change
+    create_table :crew_response_cache_entries do |t|
+      t.references :room, null: false, foreign_key: { to_table: :chat_rooms, on_delete: :cascade }, index: false
+      t.string :cache_key, null: false
+      t.binary :encrypted_response, null: false
+      t.integer :size, null: false
+      t.datetime :expires_at, null: false
+
+      t.timestamps
+    end
+
+    add_index :crew_response_cache_entries, [:room_id, :cache_key], unique: true
+    add_index :crew_response_cache_entries, :expires_at
+  end
+end
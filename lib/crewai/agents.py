@@ -0,0 +1,76 @@
+import logging
+import threading
+
+from crewai import Agent
+from .llm import get_llm, get_endpoint_pool
+
+DEFAULT_MODEL = "phi3:mini"
+
+class AgentRegistry:
+    """
+    Prebuilt CrewAI agents keyed by name, created once from config/agents.yaml.
+
+    The agent and its ChatOllama client are built at startup, once per Ollama
+    endpoint (CrewAI fixes the endpoint when the agent is built). Each request
+    only binds its per-room memory onto a shallow copy that shares the prebuilt
+    LLM client, so no objects or HTTP clients are constructed on the hot path.
+    Agents with other model parameters (picked by the routing policy) are
+    built the first time they are needed and kept alongside.
+    """
+    def __init__(self, agent_configs):
+        self.agent_configs = agent_configs
+        self.endpoints = [endpoint.url for endpoint in get_endpoint_pool().endpoints]
+        self.agents = {}
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger('agents')
+
+        for name, config in agent_configs.items():
+            for base_url in self.endpoints:
+                self.agents[(name, base_url, self.params(name))] = self._build(config, base_url)
+        self.logger.info(
+            f"Built {len(agent_configs)} agents on {len(self.endpoints)} endpoints: {', '.join(agent_configs)}"
+        )
+
+    def _build(self, config, base_url, params=None):
+        return Agent(
+            role=config['role'],
+            goal=config['goal'],
+            backstory=config['backstory'],
+            verbose=True,
+            llm=self.llm_for(config, base_url, params)
+        )
+
+    def llm_for(self, config, base_url=None, params=None):
+        """Return the shared LLM client for an agent config (or routed params) on an endpoint"""
+        model, temperature, top_p, max_tokens = params or self._llm_params(config)
+        return get_llm(model=model, temperature=temperature, base_url=base_url, top_p=top_p, max_tokens=max_tokens)
+
+    def _llm_params(self, config):
+        return (
+            config.get('model', DEFAULT_MODEL),
+            config.get('temperature', 0.7),
+            0.9,
+            config.get('max_tokens', 1024),
+        )
+
+    def params(self, name):
+        """Model parameters for an agent, as used in response cache keys"""
+        return self._llm_params(self.agent_configs[name])
+
+    def __contains__(self, name):
+        return name in self.agent_configs
+
+    def names(self):
+        return list(self.agent_configs)
+
+    def bind(self, name, memory=None, base_url=None, params=None):
+        """Return the named agent on an endpoint, bound to a request's memory"""
+        key = (name, base_url or self.endpoints[0], params or self.params(name))
+        agent = self.agents.get(key)
+        if agent is None:
+            with self.lock:
+                agent = self.agents.get(key)
+                if agent is None:
+                    agent = self.agents[key] = self._build(self.agent_configs[name], key[1], key[2])
+                    self.logger.info(f"Built {name} agent for {key[2][0]} on {key[1]}")
+        return agent.model_copy(update={'memory': memory})
@@ -0,0 +1,194 @@
+"""
+Micro-benchmarks for the CrewAI bot hot paths.
+
+Run from the Rails root, e.g.:
+
+    python -m lib.crewai.bench agents --iterations 200
+"""
+import sys
+import time
+import argparse
+
+def _report(label, iterations, elapsed):
+    per_call_us = elapsed / iterations * 1e6
+    print(f"{label:<32} {iterations:>8} iterations  {per_call_us:>10.1f} us/op  {iterations / elapsed:>12.1f} ops/s")
+
+def bench_agents(args):
+    """Per-message agent setup: building everything vs binding a prebuilt agent"""
+    import yaml
+    from crewai import Agent, Task, Crew
+    from langchain_ollama import ChatOllama
+    from .agents import AgentRegistry
+
+    with open("config/agents.yaml") as f:
+        agent_configs = yaml.safe_load(f)
+    with open("config/tasks.yaml") as f:
+        task_config = yaml.safe_load(f)['default']
+
+    agent_name = next(iter(agent_configs))
+    agent_config = agent_configs[agent_name]
+    description = task_config['description'].format(content="plan a bake sale")
+
+    def per_message_build():
+        agent = Agent(
+            role=agent_config['role'],
+            goal=agent_config['goal'],
+            backstory=agent_config['backstory'],
+            verbose=True,
+            llm=ChatOllama(model="phi3:mini", temperature=0.7, top_p=0.9, max_tokens=1024)
+        )
+        task = Task(description=description, expected_output=task_config['expected_output'], agent=agent)
+        Crew(agents=[agent], tasks=[task], verbose=True)
+
+    registry = AgentRegistry(agent_configs)
+
+    def registry_bind():
+        agent = registry.bind(agent_name, None)
+        task = Task(description=description, expected_output=task_config['expected_output'], agent=agent)
+        Crew(agents=[agent], tasks=[task], verbose=True)
+
+    for label, func in (("build per message", per_message_build), ("prebuilt registry", registry_bind)):
+        func()
+        start = time.perf_counter()
+        for _ in range(args.iterations):
+            func()
+        _report(label, args.iterations, time.perf_counter() - start)
+
+def bench_decrypt(args):
+    """History decryption throughput: per-row loop vs the batched decryption stage"""
+    from cryptography.fernet import Fernet
+    from .crypto import DecryptionStage
+
+    fernet = Fernet(Fernet.generate_key())
+    message = b"User: plan a bake sale for saturday\nAI: " + b"x" * args.message_size
+    tokens = [fernet.encrypt(message) for _ in range(args.rows)]
+
+    def per_row():
+        decrypted = []
+        for token in tokens:
+            decrypted.append(fernet.decrypt(token).decode())
+        return decrypted
+
+    stage = DecryptionStage()
+
+    for label, func in (("per-row loop", per_row), ("decryption stage", lambda: stage.decrypt_batch(fernet, tokens))):
+        func()
+        start = time.perf_counter()
+        for _ in range(args.iterations):
+            func()
+        elapsed = time.perf_counter() - start
+        print(f"{label:<32} {args.rows * args.iterations / elapsed:>12.1f} rows/s")
+
+def bench_sessions(args):
+    """Session creation, lookups and an expiry pass with many live sessions"""
+    import tracemalloc
+    from .session import SessionManager
+
+    # A short timeout lets the first one percent of sessions expire while
+    # the rest are still live
+    timeout = 3.0
+    manager = SessionManager(session_timeout=timeout)
+    keys = [(f"user{i}@example.org", f"room{i % 500}@conference.example.org") for i in range(args.sessions)]
+    expiring, live = keys[:len(keys) // 100], keys[len(keys) // 100:]
+
+    for user_jid, room_jid in expiring:
+        manager.get_session(user_jid, room_jid)
+    time.sleep(timeout + 0.1)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    for user_jid, room_jid in live:
+        manager.get_session(user_jid, room_jid)
+    _report("create session", len(live), time.perf_counter() - start)
+    current, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{'memory per session':<32} {current / len(live):>10.0f} bytes")
+
+    start = time.perf_counter()
+    removed = manager.cleanup_expired_sessions()
+    elapsed = time.perf_counter() - start
+    print(f"{'expiry pass':<32} {removed:>8} expired  {elapsed * 1000:>10.2f} ms  ({len(keys)} sessions)")
+
+    lookups = live[:10000]
+    start = time.perf_counter()
+    for _ in range(args.iterations):
+        for user_jid, room_jid in lookups:
+            manager.get_session(user_jid, room_jid)
+    _report("get live session", len(lookups) * args.iterations, time.perf_counter() - start)
+
+def bench_ingest(args):
+    """Groupchat ingest throughput: the per-agent startswith scan vs the command dispatcher"""
+    import random
+    import yaml
+    from .commands import CommandDispatcher
+
+    with open("config/agents.yaml") as f:
+        agent_names = list(yaml.safe_load(f))
+
+    # Mostly ordinary chat, with one message in command_every addressed to an agent
+    rng = random.Random(0)
+    chat = ["sounds good, see you there", "can someone share the doc?", "lol", "I'll bring snacks",
+            "what time is the meeting tomorrow?", "@alice thanks!", "  ok"]
+    messages = []
+    for i in range(10000):
+        if i % args.command_every == 0:
+            messages.append(f"@{rng.choice(agent_names)} default plan a bake sale")
+        else:
+            messages.append(rng.choice(chat))
+    bot_nick, domain, nick = "crewai", "example.org", "alice"
+
+    def startswith_scan():
+        commands = 0
+        for message in messages:
+            if nick == bot_nick:
+                continue
+            body = message.strip()
+            _user_jid = f"{nick}@{domain}"
+            for agent_name in agent_names:
+                if body.startswith(f"@{agent_name}"):
+                    parts = body.split(' ', 2)
+                    _task_name = parts[1] if len(parts) > 1 else "default"
+                    commands += 1
+                    break
+        return commands
+
+    dispatcher = CommandDispatcher(agent_names)
+
+    def dispatch():
+        commands = 0
+        parse = dispatcher.parse
+        for message in messages:
+            command = parse(message)
+            if command is None or nick == bot_nick:
+                continue
+            _user_jid = f"{nick}@{domain}"
+            commands += 1
+        return commands
+
+    assert startswith_scan() == dispatch()
+    for label, func in (("startswith scan", startswith_scan), ("command dispatcher", dispatch)):
+        start = time.perf_counter()
+        for _ in range(args.iterations):
+            func()
+        _report(label, len(messages) * args.iterations, time.perf_counter() - start)
+
+BENCHMARKS = {
+    'agents': bench_agents,
+    'decrypt': bench_decrypt,
+    'ingest': bench_ingest,
+    'sessions': bench_sessions,
+}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CrewAI bot micro-benchmarks")
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--rows', type=int, default=5000, help="rows per batch (decrypt)")
+    parser.add_argument('--message-size', type=int, default=400, help="plaintext bytes per row (decrypt)")
+    parser.add_argument('--sessions', type=int, default=100000, help="live sessions (sessions)")
+    parser.add_argument('--command-every', type=int, default=50, help="one command per N messages (ingest)")
+    args = parser.parse_args(argv)
+    BENCHMARKS[args.benchmark](args)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,69 +2,223 @@ import time
 import hashlib
 import threading
 import logging
+from collections import OrderedDict
+
+def normalize_content(content):
+    """Normalize request content so trivially different copies share a key"""
+    return " ".join(content.lower().split())
+
+class PostgresCacheTier:
+    """
+    Second cache tier in Postgres, shared across restarts and bot replicas.
+
+    Entries are encrypted with the room key, so they are stored per room.
+    Expired entries are ignored on read and removed in bulk by sweep(), which
+    also trims the table to max_entries, dropping the least recently written.
+    """
+    GET_SQL = (
+        "SELECT encrypted_response FROM crew_response_cache_entries "
+        "WHERE room_id = %s AND cache_key = %s AND expires_at > now()"
+    )
+    SET_SQL = (
+        "INSERT INTO crew_response_cache_entries "
+        "(room_id, cache_key, encrypted_response, size, expires_at, created_at, updated_at) "
+        "VALUES (%s, %s, %s, %s, now() + make_interval(secs => %s), now(), now()) "
+        "ON CONFLICT (room_id, cache_key) DO UPDATE SET encrypted_response = EXCLUDED.encrypted_response, "
+        "size = EXCLUDED.size, expires_at = EXCLUDED.expires_at, updated_at = now()"
+    )
+    SWEEP_EXPIRED_SQL = "DELETE FROM crew_response_cache_entries WHERE expires_at <= now()"
+    SWEEP_OVERFLOW_SQL = (
+        "DELETE FROM crew_response_cache_entries WHERE id IN ("
+        "SELECT id FROM crew_response_cache_entries ORDER BY updated_at DESC OFFSET %s)"
+    )
+
+    def __init__(self, pool, ttl=86400, max_entries=10000, max_entry_bytes=64 * 1024):
+        self.pool = pool
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_entry_bytes = max_entry_bytes
+        self.logger = logging.getLogger('cache')
+
+    def get(self, key, room):
+        with self.pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(self.GET_SQL, (room.room_id, key))
+                row = cursor.fetchone()
+        if row is None:
+            return None
+        return room.fernet.decrypt(bytes(row[0])).decode()
+
+    def set(self, key, room, response):
+        encrypted = room.fernet.encrypt(response.encode())
+        if len(encrypted) > self.max_entry_bytes:
+            return
+        with self.pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(self.SET_SQL, (room.room_id, key, encrypted, len(encrypted), self.ttl))
+            conn.commit()
+
+    def sweep(self):
+        """Delete expired entries and trim the table; returns rows removed"""
+        with self.pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(self.SWEEP_EXPIRED_SQL)
+                expired = cursor.rowcount
+                cursor.execute(self.SWEEP_OVERFLOW_SQL, (self.max_entries,))
+                trimmed = cursor.rowcount
+            conn.commit()
+        if expired or trimmed:
+            self.logger.info(f"Swept {expired} expired and {trimmed} overflow cache entries")
+        return expired + trimmed
 
 class ResponseCache:
     """
-    Simple in-memory cache for bot responses to avoid duplicate processing
+    In-memory LRU cache for bot responses to avoid duplicate processing.
+
+    Entries expire lazily after ttl seconds. The cache is bounded both by
+    entry count and by the total size of the cached responses in bytes;
+    inserting evicts from the least recently used end in O(1) per entry.
+
+    Responses are built from a room's private memory, so entries are keyed
+    by room as well as by request: a room is only ever served its own
+    answers, and get()/set() without a room bypass the cache. An optional
+    second tier (l2, e.g. PostgresCacheTier, itself stored per room) is
+    consulted on an L1 miss and written through on set; an L2 hit is copied
+    into that room's L1 entry only.
     """
-    def __init__(self, max_size=100, ttl=3600):
-        self.cache = {}
+    def __init__(self, max_size=100, ttl=3600, max_bytes=4 * 1024 * 1024, l2=None):
+        self.l2 = l2
+        self.cache = OrderedDict()
         self.max_size = max_size
+        self.max_bytes = max_bytes
         self.ttl = ttl  # Time to live in seconds
+        self.total_bytes = 0
+        self.stats = {
+            'hits': 0,
+            'l2_hits': 0,
+            'l2_errors': 0,
+            'misses': 0,
+            'expirations': 0,
+            'evictions': 0,
+        }
         self.lock = threading.Lock()
         self.logger = logging.getLogger('cache')
-    
-    def _generate_key(self, agent_name, task_name, content):
-        """Generate a cache key based on request parameters"""
-        key_string = f"{agent_name}:{task_name}:{content}"
+
+    def _generate_key(self, agent_name, task_name, content, params=None, room_id=None):
+        """Generate a cache key based on the room and request parameters"""
+        key_string = f"{room_id}:{agent_name}:{task_name}:{normalize_content(content)}:{params!r}"
         return hashlib.md5(key_string.encode()).hexdigest()
-    
-    def get(self, agent_name, task_name, content):
-        """Get a cached response if it exists and is valid"""
-        key = self._generate_key(agent_name, task_name, content)
-        
+
+    def _remove(self, key):
+        entry = self.cache.pop(key)
+        self.total_bytes -= entry['size']
+
+    def get(self, agent_name, task_name, content, params=None, room=None):
+        """Get a cached response for a room if it exists and is valid, falling through to L2"""
+        if room is None:
+            return None
+        key = self._generate_key(agent_name, task_name, content, params, room.room_id)
+        response = self._get_l1(key, agent_name, task_name)
+        if response is not None or self.l2 is None:
+            return response
+
+        try:
+            response = self.l2.get(key, room)
+        except Exception as e:
+            self.logger.error(f"L2 cache lookup failed: {e}")
+            with self.lock:
+                self.stats['l2_errors'] += 1
+            return None
+
+        if response is not None:
+            with self.lock:
+                self.stats['l2_hits'] += 1
+            self._set_l1(key, response, agent_name, task_name)
+        return response
+
+    def _get_l1(self, key, agent_name, task_name):
         with self.lock:
-            if key in self.cache:
-                entry = self.cache[key]
+            entry = self.cache.get(key)
+            if entry is not None:
                 if time.time() - entry['timestamp'] < self.ttl:
+                    self.cache.move_to_end(key)
+                    self.stats['hits'] += 1
                     self.logger.debug(f"Cache hit for {agent_name}/{task_name}")
                     return entry['response']
                 else:
                     # Expired entry
                     self.logger.debug(f"Cache expired for {agent_name}/{task_name}")
-                    del self.cache[key]
-            
+                    self._remove(key)
+                    self.stats['expirations'] += 1
+
+            self.stats['misses'] += 1
             return None
-    
-    def set(self, agent_name, task_name, content, response):
-        """Store a response in the cache"""
-        key = self._generate_key(agent_name, task_name, content)
-        
+
+    def set(self, agent_name, task_name, content, response, params=None, room=None):
+        """Store a response for a room, writing through to L2"""
+        if room is None:
+            return
+        key = self._generate_key(agent_name, task_name, content, params, room.room_id)
+        self._set_l1(key, response, agent_name, task_name)
+
+        if self.l2 is not None:
+            try:
+                self.l2.set(key, room, response)
+            except Exception as e:
+                self.logger.error(f"L2 cache write failed: {e}")
+                with self.lock:
+                    self.stats['l2_errors'] += 1
+
+    def _set_l1(self, key, response, agent_name, task_name):
+        size = len(response.encode())
+
+        if size > self.max_bytes:
+            self.logger.debug(f"Response for {agent_name}/{task_name} too large to cache ({size} bytes)")
+            return
+
         with self.lock:
-            # Evict oldest entries if cache is full
-            if len(self.cache) >= self.max_size:
-                oldest_key = min(self.cache.items(), key=lambda x: x[1]['timestamp'])[0]
-                del self.cache[oldest_key]
-            
+            if key in self.cache:
+                self._remove(key)
+
+            # Evict least recently used entries until the new one fits
+            while self.cache and (len(self.cache) >= self.max_size or self.total_bytes + size > self.max_bytes):
+                oldest_key = next(iter(self.cache))
+                self._remove(oldest_key)
+                self.stats['evictions'] += 1
+
             self.cache[key] = {
                 'response': response,
-                'timestamp': time.time()
+                'timestamp': time.time(),
+                'size': size
             }
+            self.total_bytes += size
             self.logger.debug(f"Cached response for {agent_name}/{task_name}")
-    
+
+    def get_stats(self):
+        """Hit, miss and eviction counters plus current size"""
+        with self.lock:
+            stats = dict(self.stats)
+            stats['entries'] = len(self.cache)
+            stats['bytes'] = self.total_bytes
+            lookups = stats['hits'] + stats['misses']
+            stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+            return stats
+
     def clear(self):
         """Clear the entire cache"""
         with self.lock:
             self.cache.clear()
+            self.total_bytes = 0
             self.logger.debug("Cache cleared")
-    
+
     def clear_expired(self):
         """Clear only expired entries"""
         with self.lock:
             now = time.time()
             expired_keys = [k for k, v in self.cache.items() if now - v['timestamp'] > self.ttl]
             for key in expired_keys:
-                del self.cache[key]
-            
+                self._remove(key)
+            self.stats['expirations'] += len(expired_keys)
+
             if expired_keys:
                 self.logger.debug(f"Cleared {len(expired_keys)} expired cache entries")
@@ -0,0 +1,41 @@
+from collections import namedtuple
+
+Command = namedtuple('Command', ['agent_name', 'task_name', 'content'])
+
+class CommandDispatcher:
+    """
+    Recognizes '@agent [task] [content]' commands in groupchat messages.
+
+    The '@agent' prefixes are compiled into a dict once, so a message that
+    does not start with '@' (ordinary chat, nearly all traffic) is rejected
+    after a single character check, and a command resolves its agent with
+    one dict lookup.
+    """
+    DEFAULT_TASK = "default"
+
+    def __init__(self, agent_names):
+        self.agents = {}
+        for name in agent_names:
+            self.agents[f"@{name}"] = name
+            # Allow addressing styles like '@planner:' and '@planner,'
+            self.agents[f"@{name}:"] = name
+            self.agents[f"@{name},"] = name
+
+    def parse(self, body):
+        """Return the Command in a message body, or None if it is not one"""
+        if body[:1] != '@':
+            if not body[:1].isspace():
+                return None
+            body = body.lstrip()
+            if body[:1] != '@':
+                return None
+
+        parts = body.split(None, 2)
+        agent_name = self.agents.get(parts[0])
+        if agent_name is None:
+            return None
+        return Command(
+            agent_name,
+            parts[1] if len(parts) > 1 else self.DEFAULT_TASK,
+            parts[2].rstrip() if len(parts) > 2 else ""
+        )
@@ -0,0 +1,35 @@
+import os
+import json
+import tempfile
+from pathlib import Path
+
+def storage_dir():
+    """Directory used to persist CrewAI objects between calls"""
+    path = Path(tempfile.gettempdir()) / "crewai_storage"
+    path.mkdir(exist_ok=True)
+    return path
+
+def load_payload(arg):
+    """
+    Parse a JSON payload passed on the command line.
+
+    The Rails models write the payload to a temp file and pass its path, so
+    accept either a path to a JSON file or an inline JSON string.
+    """
+    if not arg:
+        return {}
+    if os.path.isfile(arg):
+        with open(arg) as f:
+            return json.load(f)
+    return json.loads(arg)
+
+def error_response(prefix, error):
+    """Build the error envelope shared by the scripts and the worker"""
+    if isinstance(error, ImportError):
+        message = f"Error importing required Python modules: {str(error)}"
+    else:
+        message = f"{prefix}: {str(error)}"
+    return {
+        "status": "error",
+        "message": message
+    }
@@ -1,90 +1,84 @@
 #!/usr/bin/env python
 
-import os
 import sys
 import json
 import uuid
-import pickle
-import tempfile
-from pathlib import Path
 
-try:
+from common import load_payload, error_response
+from llm import get_llm, default_model
+from store import get_store
+from tracing import trace, span
+
+ERROR_PREFIX = "Error creating agent"
+
+def agent_spec(agent_data):
+    """Normalize the agent JSON description into the stored spec"""
+    llm_config = agent_data.get('llm') or {}
+    return {
+        'role': agent_data.get('role', 'Assistant'),
+        'goal': agent_data.get('goal', 'Help the user'),
+        'backstory': agent_data.get('backstory', ''),
+        'verbose': agent_data.get('verbose', False),
+        'memory': agent_data.get('memory') is not None,
+        'llm': {
+            # Only Ollama is supported, other providers fall back to it
+            'provider': 'ollama',
+            'model': llm_config.get('model') or default_model(),
+            'temperature': float(llm_config.get('temperature', 0.7)),
+        },
+    }
+
+def build_agent(spec):
+    """Build a CrewAI Agent from a stored spec"""
+    from crewai import Agent
+
+    llm_config = spec.get('llm') or {}
+    return Agent(
+        role=spec.get('role', 'Assistant'),
+        goal=spec.get('goal', 'Help the user'),
+        backstory=spec.get('backstory', ''),
+        verbose=spec.get('verbose', False),
+        memory=spec.get('memory', False),
+        llm=get_llm(model=llm_config.get('model'), temperature=llm_config.get('temperature', 0.7))
+    )
+
+def default_agent(verbose=False):
+    """Agent used when a task or crew references no loadable agent"""
     from crewai import Agent
-    from langchain_ollama import ChatOllama
-    
-    # Create a persistent storage directory
-    storage_dir = Path(tempfile.gettempdir()) / "crewai_storage"
-    storage_dir.mkdir(exist_ok=True)
-    
-    # Load agent data from command line argument
-    agent_data = json.loads(sys.argv[1]) if len(sys.argv) > 1 else {}
-    
-    # Extract agent parameters
-    role = agent_data.get('role', 'Assistant')
-    goal = agent_data.get('goal', 'Help the user')
-    backstory = agent_data.get('backstory', '')
-    verbose = agent_data.get('verbose', False)
-    memory_config = agent_data.get('memory')
-    
-    # Extract LLM settings
-    llm_config = agent_data.get('llm', {})
-    provider = llm_config.get('provider', 'ollama')
-    model = llm_config.get('model', os.environ.get('OLLAMA_MODEL', 'phi3'))
-    temperature = float(llm_config.get('temperature', 0.7))
-    
-    # Set up the language model
-    if provider == 'ollama':
-        llm = ChatOllama(
-            model=model,
-            temperature=temperature,
-            base_url=os.environ.get('OLLAMA_HOST', 'http://localhost:11434'),
-        )
-    else:
-        # Default to Ollama if provider not supported
-        llm = ChatOllama(
-            model=model,
-            temperature=temperature,
-            base_url=os.environ.get('OLLAMA_HOST', 'http://localhost:11434'),
-        )
-    
-    # Create the agent
-    agent = Agent(
-        role=role,
-        goal=goal,
-        backstory=backstory,
+
+    return Agent(
+        role="Assistant",
+        goal="Help complete tasks",
         verbose=verbose,
-        memory=memory_config is not None,
-        llm=llm
+        llm=get_llm()
     )
-    
+
+def create_agent(agent_data):
+    """Create an agent from its JSON description and return the result envelope"""
     # Generate a unique ID for the agent to reference it later
     agent_id = str(uuid.uuid4())
-    
-    # Store the agent in a file for persistence between calls
-    agent_file = storage_dir / f"agent_{agent_id}.pkl"
-    with open(agent_file, 'wb') as f:
-        pickle.dump(agent, f)
-    
+
+    # Store the agent spec; the Agent object is built when a crew runs
+    with span('store.put'):
+        get_store().put(agent_id, 'agent', agent_spec(agent_data))
+
     # Return the agent ID
-    result = {
+    return {
         "status": "success",
         "message": "Agent created successfully",
         "agent_id": agent_id
     }
-    print(json.dumps(result))
-    
-except ImportError as e:
-    error = {
-        "status": "error",
-        "message": f"Error importing required Python modules: {str(e)}"
-    }
-    print(json.dumps(error), file=sys.stderr)
-    sys.exit(1)
-    
-except Exception as e:
-    error = {
-        "status": "error",
-        "message": f"Error creating agent: {str(e)}"
-    }
-    print(json.dumps(error), file=sys.stderr)
-    sys.exit(1) 
\ No newline at end of file
+
+def main():
+    try:
+        # Load agent data from command line argument
+        agent_data = load_payload(sys.argv[1] if len(sys.argv) > 1 else None)
+        with trace('create_agent'):
+            result = create_agent(agent_data)
+        print(json.dumps(result))
+    except Exception as e:
+        print(json.dumps(error_response(ERROR_PREFIX, e)), file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -1,108 +1,105 @@
 #!/usr/bin/env python
 
-import os
 import sys
 import json
 import uuid
-import pickle
-import tempfile
-from pathlib import Path
-from glob import glob
-
-try:
-    from crewai import Crew, Agent, Task
-    from langchain_ollama import ChatOllama
-    
-    # Create a persistent storage directory
-    storage_dir = Path(tempfile.gettempdir()) / "crewai_storage"
-    storage_dir.mkdir(exist_ok=True)
-    
-    # Load crew data from command line argument
-    crew_data = json.loads(sys.argv[1]) if len(sys.argv) > 1 else {}
-    
-    # Extract crew parameters
-    agent_ids = crew_data.get('agents', [])
-    task_ids = crew_data.get('tasks', [])
-    verbose = crew_data.get('verbose', False)
-    
-    # Load agents from files
-    agents = []
-    for agent_id in agent_ids:
-        agent_file = storage_dir / f"agent_{agent_id}.pkl"
-        if agent_file.exists():
-            try:
-                with open(agent_file, 'rb') as f:
-                    agent = pickle.load(f)
-                    agents.append(agent)
-            except Exception as e:
-                print(f"Warning: Could not load agent {agent_id}: {e}", file=sys.stderr)
-    
-    # Create a default agent if none were found
+
+from common import load_payload, error_response
+from create_agent import build_agent, default_agent
+from create_task import build_task
+from store import get_store
+from tracing import trace, span
+
+ERROR_PREFIX = "Error creating crew"
+
+def build_crew(crew_id, artifacts=None):
+    """
+    Build a CrewAI Crew and all of its members.
+
+    The crew, its tasks and every referenced agent are loaded from the store
+    in one read. Each agent is built once and shared by all tasks that
+    reference it.
+    """
+    from crewai import Crew
+
+    if artifacts is None:
+        with span('store.load'):
+            artifacts = get_store().load(crew_id)
+
+    if crew_id not in artifacts:
+        raise FileNotFoundError(f"Crew not found: {crew_id}")
+
+    _kind, spec = artifacts[crew_id]
+    verbose = spec.get('verbose', False)
+
+    built_agents = {}
+
+    def agent_for(agent_id):
+        if agent_id not in built_agents:
+            entry = artifacts.get(agent_id)
+            built_agents[agent_id] = build_agent(entry[1]) if entry and entry[0] == 'agent' else None
+        return built_agents[agent_id]
+
+    agents = [agent for agent in map(agent_for, spec.get('agent_ids', [])) if agent is not None]
     if not agents:
-        llm = ChatOllama(
-            model=os.environ.get('OLLAMA_MODEL', 'phi3'),
-            temperature=0.7,
-            base_url=os.environ.get('OLLAMA_HOST', 'http://localhost:11434'),
-        )
-        
-        # Create a default agent
-        agent = Agent(
-            role="Assistant",
-            goal="Help complete tasks",
-            verbose=verbose,
-            llm=llm
-        )
-        agents.append(agent)
-    
-    # Load tasks from files
+        agents.append(default_agent(verbose=verbose))
+
     tasks = []
-    for task_id in task_ids:
-        task_file = storage_dir / f"task_{task_id}.pkl"
-        if task_file.exists():
-            try:
-                with open(task_file, 'rb') as f:
-                    task = pickle.load(f)
-                    tasks.append(task)
-            except Exception as e:
-                print(f"Warning: Could not load task {task_id}: {e}", file=sys.stderr)
-    
-    # Create the crew
-    crew = Crew(
+    for task_id in spec.get('task_ids', []):
+        entry = artifacts.get(task_id)
+        if entry is None or entry[0] != 'task':
+            print(f"Warning: Could not load task {task_id}", file=sys.stderr)
+            continue
+        tasks.append(build_task(entry[1], agent_for(entry[1].get('agent_id'))))
+
+    return Crew(
         agents=agents,
         tasks=tasks,
         verbose=verbose
     )
-    
+
+def create_crew(crew_data):
+    """Create a crew from stored agents and tasks and return the result envelope"""
+    agent_ids = crew_data.get('agents', [])
+    task_ids = crew_data.get('tasks', [])
+    spec = {
+        'agent_ids': agent_ids,
+        'task_ids': task_ids,
+        'verbose': crew_data.get('verbose', False),
+    }
+
     # Generate a unique ID for the crew to reference it later
     crew_id = str(uuid.uuid4())
-    
-    # Store the crew in a file for persistence
-    crew_file = storage_dir / f"crew_{crew_id}.pkl"
-    with open(crew_file, 'wb') as f:
-        pickle.dump(crew, f)
-    
+
+    store = get_store()
+    with span('store.put'):
+        store.put(crew_id, 'crew', spec, refs=agent_ids + task_ids)
+
+    # Count the members that actually resolve, falling back to the default agent
+    with span('store.load'):
+        artifacts = store.load(crew_id)
+    agent_count = sum(1 for agent_id in agent_ids if agent_id in artifacts) or 1
+    task_count = sum(1 for task_id in task_ids if task_id in artifacts)
+
     # Return the crew ID
-    result = {
+    return {
         "status": "success",
         "message": "Crew created successfully",
         "crew_id": crew_id,
-        "agent_count": len(agents),
-        "task_count": len(tasks)
-    }
-    print(json.dumps(result))
-    
-except ImportError as e:
-    error = {
-        "status": "error",
-        "message": f"Error importing required Python modules: {str(e)}"
+        "agent_count": agent_count,
+        "task_count": task_count
     }
-    print(json.dumps(error), file=sys.stderr)
-    sys.exit(1)
-    
-except Exception as e:
-    error = {
-        "status": "error",
-        "message": f"Error creating crew: {str(e)}"
-    }
-    print(json.dumps(error), file=sys.stderr)
-    sys.exit(1) 
\ No newline at end of file
+
+def main():
+    try:
+        # Load crew data from command line argument
+        crew_data = load_payload(sys.argv[1] if len(sys.argv) > 1 else None)
+        with trace('create_crew'):
+            result = create_crew(crew_data)
+        print(json.dumps(result))
+    except Exception as e:
+        print(json.dumps(error_response(ERROR_PREFIX, e)), file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
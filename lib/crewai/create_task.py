@@ -4,90 +4,63 @@ import os
 import sys
 import json
 import uuid
-import pickle
-import tempfile
-from pathlib import Path
 
-try:
-    from crewai import Task, Agent
-    from langchain_ollama import ChatOllama
-    
-    # Create a persistent storage directory
-    storage_dir = Path(tempfile.gettempdir()) / "crewai_storage"
-    storage_dir.mkdir(exist_ok=True)
-    
-    # Load task data from command line argument
-    task_data = json.loads(sys.argv[1]) if len(sys.argv) > 1 else {}
-    
-    # Extract task parameters
-    description = task_data.get('description', 'Default task description')
-    expected_output = task_data.get('expected_output', 'text')
-    agent_id = task_data.get('agent_id')
-    tools = task_data.get('tools', [])
-    
-    # Load the agent from file if it exists
-    agent = None
-    agent_file = storage_dir / f"agent_{agent_id}.pkl"
-    
-    if agent_file.exists():
-        try:
-            with open(agent_file, 'rb') as f:
-                agent = pickle.load(f)
-        except Exception as e:
-            print(f"Warning: Could not load agent from file: {e}", file=sys.stderr)
-    
-    # Create a default agent if we couldn't load the specified one
+from common import load_payload, error_response
+from create_agent import default_agent
+from store import get_store
+from tracing import trace, span
+
+ERROR_PREFIX = "Error creating task"
+
+def build_task(spec, agent=None):
+    """Build a CrewAI Task from a stored spec and its (already built) agent"""
+    from crewai import Task
+
+    # Fall back to a default agent if the referenced one could not be loaded
     if agent is None:
-        # Create a default agent
-        llm = ChatOllama(
-            model=os.environ.get('OLLAMA_MODEL', 'phi3'),
-            temperature=0.7,
-            base_url=os.environ.get('OLLAMA_HOST', 'http://localhost:11434'),
-        )
-        
-        agent = Agent(
-            role="Assistant",
-            goal="Help complete tasks",
-            verbose=os.environ.get('RAILS_ENV') == 'development',
-            llm=llm
-        )
-    
-    # Create the task
-    task = Task(
-        description=description,
-        expected_output=expected_output,
+        agent = default_agent(verbose=os.environ.get('RAILS_ENV') == 'development')
+
+    return Task(
+        description=spec.get('description', 'Default task description'),
+        expected_output=spec.get('expected_output', 'text'),
         agent=agent,
-        tools=tools
+        tools=spec.get('tools', [])
     )
-    
+
+def create_task(task_data):
+    """Create a task from its JSON description and return the result envelope"""
+    # The agent is stored by reference rather than embedded in the task
+    agent_id = task_data.get('agent_id')
+    spec = {
+        'description': task_data.get('description', 'Default task description'),
+        'expected_output': task_data.get('expected_output', 'text'),
+        'agent_id': agent_id,
+        'tools': task_data.get('tools', []),
+    }
+
     # Generate a unique ID for the task to reference it later
     task_id = str(uuid.uuid4())
-    
-    # Store the task in a file for persistence
-    task_file = storage_dir / f"task_{task_id}.pkl"
-    with open(task_file, 'wb') as f:
-        pickle.dump(task, f)
-    
+
+    with span('store.put'):
+        get_store().put(task_id, 'task', spec, refs=[agent_id])
+
     # Return the task ID
-    result = {
+    return {
         "status": "success",
         "message": "Task created successfully",
         "task_id": task_id
     }
-    print(json.dumps(result))
-    
-except ImportError as e:
-    error = {
-        "status": "error",
-        "message": f"Error importing required Python modules: {str(e)}"
-    }
-    print(json.dumps(error), file=sys.stderr)
-    sys.exit(1)
-    
-except Exception as e:
-    error = {
-        "status": "error",
-        "message": f"Error creating task: {str(e)}"
-    }
-    print(json.dumps(error), file=sys.stderr)
-    sys.exit(1) 
\ No newline at end of file
+
+def main():
+    try:
+        # Load task data from command line argument
+        task_data = load_payload(sys.argv[1] if len(sys.argv) > 1 else None)
+        with trace('create_task'):
+            result = create_task(task_data)
+        print(json.dumps(result))
+    except Exception as e:
+        print(json.dumps(error_response(ERROR_PREFIX, e)), file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
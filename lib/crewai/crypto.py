@@ -0,0 +1,88 @@
+import logging
+import threading
+from collections import OrderedDict
+
+from cryptography.fernet import Fernet
+
+MAX_CACHED_KEYS = 1024
+
+_fernets = OrderedDict()
+_fernets_lock = threading.Lock()
+
+def get_fernet(key):
+    """Return a cached Fernet instance for a room key"""
+    if isinstance(key, str):
+        key = key.encode()
+
+    with _fernets_lock:
+        fernet = _fernets.get(key)
+        if fernet is not None:
+            _fernets.move_to_end(key)
+            return fernet
+
+    fernet = Fernet(key)
+    with _fernets_lock:
+        _fernets[key] = fernet
+        if len(_fernets) > MAX_CACHED_KEYS:
+            _fernets.popitem(last=False)
+    return fernet
+
+def _as_token(value):
+    # psycopg2 returns bytea columns as memoryview
+    if isinstance(value, memoryview):
+        return value.tobytes()
+    return value
+
+def _decrypt_all(fernet, tokens, keep_failures=False):
+    plaintexts = []
+    failures = 0
+    last_error = None
+    for token in tokens:
+        try:
+            plaintexts.append(fernet.decrypt(_as_token(token)).decode())
+        except Exception as e:
+            failures += 1
+            last_error = e
+            if keep_failures:
+                plaintexts.append(None)
+    return plaintexts, failures, last_error
+
+class DecryptionStage:
+    """
+    Decrypts batches of Fernet tokens.
+
+    Failed tokens are skipped and reported as a single aggregated count
+    instead of one log line per message. Decryption runs inline on the
+    calling thread: Fernet holds the GIL, so spreading a batch over threads
+    does not make it any faster.
+    """
+    def __init__(self):
+        self.logger = logging.getLogger('crypto')
+
+    def decrypt_batch(self, fernet, tokens, label=None, keep_failures=False):
+        """
+        Decrypt tokens in order, returning (plaintexts, failure_count).
+
+        Failed tokens are dropped, or kept as None when keep_failures is set so
+        the result lines up with the input. label identifies the batch (e.g.
+        the room) in the aggregated failure log.
+        """
+        tokens = list(tokens)
+        plaintexts, failures, last_error = _decrypt_all(fernet, tokens, keep_failures)
+        if failures:
+            self.logger.error(
+                f"Failed to decrypt {failures} of {len(tokens)} messages"
+                f"{f' for {label}' if label is not None else ''}: {last_error}"
+            )
+        return plaintexts, failures
+
+_stage = None
+_stage_lock = threading.Lock()
+
+def get_decryption_stage():
+    """Return the process-wide decryption stage"""
+    global _stage
+    with _stage_lock:
+        if _stage is None:
+            _stage = DecryptionStage()
+        return _stage
@@ -0,0 +1,266 @@
+import time
+import asyncio
+import logging
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of psycopg2 connections.
+
+    Callers block (up to a timeout) when every connection is checked out
+    instead of opening new ones. Connections that have been idle longer than
+    health_check_interval are pinged before being handed out, and broken
+    connections are replaced. Each connection remembers which statements it
+    has prepared, so execute_prepared only PREPAREs once per connection.
+
+    connect_timeout (seconds) bounds opening a connection and
+    statement_timeout (milliseconds) is set server-side on every connection.
+    """
+    def __init__(self, db_url, max_size=10, timeout=30, health_check_interval=30,
+                 connect_timeout=None, statement_timeout=None):
+        self.db_url = db_url
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.connect_kwargs = {}
+        if connect_timeout:
+            self.connect_kwargs['connect_timeout'] = int(connect_timeout)
+        if statement_timeout:
+            self.connect_kwargs['options'] = f"-c statement_timeout={int(statement_timeout)}"
+        self.idle = []  # (connection, returned_at)
+        self.size = 0
+        self.prepared = {}  # id(connection) -> set of statement names
+        self.condition = threading.Condition()
+        self.logger = logging.getLogger('db')
+        self.stats = {
+            'checkouts': 0,
+            'timeouts': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+            'connections_opened': 0,
+            'connections_discarded': 0,
+            'health_check_failures': 0,
+        }
+
+    def _connect(self):
+        conn = psycopg2.connect(self.db_url, **self.connect_kwargs)
+        with self.condition:
+            self.stats['connections_opened'] += 1
+        return conn
+
+    def _healthy(self, conn, idle_since):
+        if conn.closed:
+            return False
+        if time.monotonic() - idle_since < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            with self.condition:
+                self.stats['health_check_failures'] += 1
+            return False
+
+    def _discard(self, conn):
+        self.prepared.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+        self.size -= 1
+        self.stats['connections_discarded'] += 1
+        self.condition.notify()
+
+    def getconn(self):
+        """Check out a healthy connection, waiting for one if the pool is full"""
+        start = time.monotonic()
+        with self.condition:
+            while True:
+                if self.idle:
+                    conn, idle_since = self.idle.pop()
+                    break
+                if self.size < self.max_size:
+                    self.size += 1
+                    conn, idle_since = None, None
+                    break
+                remaining = self.timeout - (time.monotonic() - start)
+                if remaining <= 0 or not self.condition.wait(remaining):
+                    if self.idle or self.size < self.max_size:
+                        continue
+                    self.stats['timeouts'] += 1
+                    raise TimeoutError(f"Timed out waiting for a database connection after {self.timeout}s")
+
+        # Connect and health-check outside the lock
+        try:
+            if conn is None:
+                conn = self._connect()
+            elif not self._healthy(conn, idle_since):
+                with self.condition:
+                    self._discard(conn)
+                    self.size += 1
+                conn = self._connect()
+        except Exception:
+            with self.condition:
+                self.size -= 1
+                self.condition.notify()
+            raise
+
+        waited = time.monotonic() - start
+        with self.condition:
+            self.stats['checkouts'] += 1
+            self.stats['wait_time_total'] += waited
+            self.stats['wait_time_max'] = max(self.stats['wait_time_max'], waited)
+        return conn
+
+    def putconn(self, conn, discard=False):
+        """Return a connection to the pool"""
+        if not discard and not conn.closed:
+            try:
+                # Never hand out a connection with an open transaction
+                conn.rollback()
+            except Exception:
+                discard = True
+
+        with self.condition:
+            if discard or conn.closed:
+                self._discard(conn)
+                return
+            self.idle.append((conn, time.monotonic()))
+            self.condition.notify()
+
+    @contextmanager
+    def connection(self):
+        """Context manager that checks a connection out and always returns it"""
+        conn = self.getconn()
+        discard = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            discard = True
+            raise
+        finally:
+            self.putconn(conn, discard=discard)
+
+    def execute_prepared(self, conn, cursor, name, sql, params=()):
+        """
+        Execute a server-side prepared statement, preparing it on first use.
+
+        sql uses $1, $2, ... placeholders as required by PREPARE.
+        """
+        prepared = self.prepared.setdefault(id(conn), set())
+        if name not in prepared:
+            cursor.execute(f"PREPARE {name} AS {sql}")
+            prepared.add(name)
+        if params:
+            placeholders = ", ".join(["%s"] * len(params))
+            cursor.execute(f"EXECUTE {name} ({placeholders})", params)
+        else:
+            cursor.execute(f"EXECUTE {name}")
+
+    def get_metrics(self):
+        """Pool size and checkout statistics"""
+        with self.condition:
+            metrics = dict(self.stats)
+            metrics['size'] = self.size
+            metrics['idle'] = len(self.idle)
+            metrics['in_use'] = self.size - len(self.idle)
+            metrics['max_size'] = self.max_size
+            metrics['avg_wait_time'] = (
+                metrics['wait_time_total'] / metrics['checkouts'] if metrics['checkouts'] else 0.0
+            )
+            return metrics
+
+    def closeall(self):
+        """Close every idle connection"""
+        with self.condition:
+            for conn, _ in self.idle:
+                self.prepared.pop(id(conn), None)
+                conn.close()
+                self.size -= 1
+            self.idle.clear()
+
+class AsyncDatabase:
+    """
+    Runs blocking database work for asyncio code on a dedicated executor.
+
+    Event-loop code never touches a connection itself: it hands a function
+    to run(), which executes it on one of the executor's threads and waits
+    at most timeout seconds for the result. A timed-out call raises
+    asyncio.TimeoutError on the loop while its thread finishes in the
+    background, bounded by the pool's statement_timeout.
+    """
+    def __init__(self, pool, workers=None, timeout=10.0):
+        self.pool = pool
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=workers or pool.max_size, thread_name_prefix='db')
+        self.stats = {
+            'calls': 0,
+            'errors': 0,
+            'timeouts': 0,
+        }
+        self.logger = logging.getLogger('db')
+
+    async def run(self, func, *args, timeout=None):
+        """Run func(*args) on the database executor and await its result"""
+        self.stats['calls'] += 1
+        context = contextvars.copy_context()
+        future = asyncio.get_running_loop().run_in_executor(
+            self.executor, functools.partial(context.run, func, *args)
+        )
+        try:
+            return await asyncio.wait_for(future, timeout or self.timeout)
+        except asyncio.TimeoutError:
+            self.stats['timeouts'] += 1
+            self.logger.error(f"Database call {getattr(func, '__qualname__', func)} timed out")
+            raise
+        except Exception:
+            self.stats['errors'] += 1
+            raise
+
+    async def fetchall(self, sql, params=(), timeout=None):
+        """Run a query on a pooled connection and return all rows"""
+        return await self.run(self._fetchall, sql, params, timeout=timeout)
+
+    def _fetchall(self, sql, params):
+        with self.pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(sql, params)
+                return cursor.fetchall()
+
+    async def execute(self, sql, params=(), timeout=None):
+        """Run a statement on a pooled connection and commit it"""
+        return await self.run(self._execute, sql, params, timeout=timeout)
+
+    def _execute(self, sql, params):
+        with self.pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(sql, params)
+                rowcount = cursor.rowcount
+            conn.commit()
+            return rowcount
+
+    def get_stats(self):
+        return dict(self.stats)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(db_url, **kwargs):
+    """Return the process-wide pool for a database URL"""
+    with _pools_lock:
+        pool = _pools.get(db_url)
+        if pool is None:
+            pool = ConnectionPool(db_url, **kwargs)
+            _pools[db_url] = pool
+        return pool
@@ -0,0 +1,80 @@
+import os
+import threading
+from collections import deque, OrderedDict
+
+DEFAULT_WINDOW_SIZE = 100
+MAX_CACHED_ROOMS = 1024
+
+class HistoryWindow:
+    """
+    Ring buffer of a room's most recent decrypted messages, each stored with
+    its (created_at, id) key and token count.
+
+    The window remembers the (created_at, id) key of the newest row it has
+    read, so a refresh only fetches rows newer than that. Messages saved by
+    this process are appended directly and skipped when the refresh sees
+    their rows.
+    """
+    def __init__(self, room_id, size=DEFAULT_WINDOW_SIZE):
+        self.room_id = room_id
+        self.size = size
+        self.messages = deque(maxlen=size)
+        self.last_key = None
+        self.local_ids = set()
+        self.loaded = False
+        self.lock = threading.Lock()
+
+    def reset(self, rows):
+        """Replace the window with rows of (id, created_at, text, tokens), oldest first"""
+        self.messages.clear()
+        self.local_ids.clear()
+        self.last_key = None
+        self.extend(rows)
+        self.loaded = True
+
+    def extend(self, rows):
+        """Append rows of (id, created_at, text, tokens) read from the database"""
+        for message_id, created_at, text, tokens in rows:
+            self.last_key = (created_at, message_id)
+            if message_id in self.local_ids:
+                self.local_ids.discard(message_id)
+                continue
+            if text is not None:
+                self.messages.append(((created_at, message_id), text, tokens))
+
+    def append_local(self, message_id, created_at, text, tokens):
+        """Append a message this process just saved"""
+        self.messages.append(((created_at, message_id), text, tokens))
+        if message_id is not None:
+            self.local_ids.add(message_id)
+            # Rows the refresh never sees would otherwise pile up here
+            if len(self.local_ids) > self.size:
+                self.local_ids.pop()
+
+    def texts(self):
+        return [text for _key, text, _tokens in self.messages]
+
+    def entries(self):
+        """(key, text, tokens) tuples, oldest first"""
+        return list(self.messages)
+
+_windows = OrderedDict()
+_windows_lock = threading.Lock()
+
+def get_window(room_id):
+    """Return the shared history window for a room"""
+    with _windows_lock:
+        window = _windows.get(room_id)
+        if window is None:
+            window = HistoryWindow(room_id, int(os.environ.get('CREWAI_HISTORY_WINDOW', DEFAULT_WINDOW_SIZE)))
+            _windows[room_id] = window
+            if len(_windows) > MAX_CACHED_ROOMS:
+                _windows.popitem(last=False)
+        else:
+            _windows.move_to_end(room_id)
+        return window
+
+def drop_window(room_id):
+    """Forget a room's window, e.g. after its history was cleared"""
+    with _windows_lock:
+        _windows.pop(room_id, None)
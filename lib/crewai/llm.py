@@ -0,0 +1,483 @@
+import os
+import json
+import time
+import logging
+import threading
+import http.client
+import urllib.error
+from datetime import datetime
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+_clients = {}
+_clients_lock = threading.Lock()
+_timing_listeners = []
+_timings_handler = None
+
+logger = logging.getLogger('llm')
+
+def default_base_url():
+    """Ollama endpoint used when a caller does not specify one"""
+    return os.environ.get('OLLAMA_HOST', 'http://localhost:11434')
+
+def default_hosts():
+    """Ollama endpoints from OLLAMA_HOSTS (comma-separated), else OLLAMA_HOST"""
+    hosts = [host.strip().rstrip('/') for host in os.environ.get('OLLAMA_HOSTS', '').split(',') if host.strip()]
+    return hosts or [default_base_url().rstrip('/')]
+
+def default_model():
+    """Model used when a caller does not specify one"""
+    return os.environ.get('OLLAMA_MODEL', 'phi3')
+
+# Exception classes (by name, anywhere in the MRO) raised by the HTTP and
+# LLM client libraries when a server cannot be reached or fails to answer
+ENDPOINT_ERROR_NAMES = frozenset({
+    'TransportError',  # httpx: connect, read and write errors and timeouts
+    'APIConnectionError',  # litellm, as used by CrewAI
+    'ServiceUnavailableError',
+    'InternalServerError',
+    'Timeout',
+})
+
+def _status_code(exc):
+    """HTTP status carried by a client library's error, if any"""
+    if isinstance(exc, urllib.error.HTTPError):
+        return exc.code
+    status = getattr(exc, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(exc, 'response', None), 'status_code', None)
+    return status if isinstance(status, int) else None
+
+def is_endpoint_error(exc):
+    """
+    True if exc, or an exception it was raised from, means the Ollama
+    endpoint failed: a transport error or an HTTP 5xx. Errors in the request
+    itself or in our own code do not count against the endpoint.
+    """
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        status = _status_code(exc)
+        if status is not None:
+            if status >= 500:
+                return True
+        elif isinstance(exc, (ConnectionError, TimeoutError, http.client.HTTPException, urllib.error.URLError)):
+            return True
+        elif any(cls.__name__ in ENDPOINT_ERROR_NAMES for cls in type(exc).__mro__):
+            return True
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+def _connect(url, timeout):
+    parts = urlsplit(url)
+    connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+    return connection_class(parts.hostname, parts.port, timeout=timeout)
+
+class Endpoint:
+    """One Ollama server and its load and health state"""
+    __slots__ = ('url', 'outstanding', 'failures', 'ejected_until', 'healthy', 'requests', 'errors', 'conn')
+
+    def __init__(self, url):
+        self.url = url
+        self.outstanding = 0
+        self.failures = 0  # consecutive
+        self.ejected_until = 0.0
+        self.healthy = True
+        self.requests = 0
+        self.errors = 0
+        self.conn = None  # persistent connection for health checks
+
+    def available(self, now):
+        return self.healthy and now >= self.ejected_until
+
+class EndpointPool:
+    """
+    Routes LLM requests over several Ollama endpoints.
+
+    Each request goes to the available endpoint with the fewest outstanding
+    requests, ties going round-robin. An endpoint is ejected for
+    eject_seconds after eject_after consecutive failed requests or a failed
+    health check, and readmitted once a health check (GET health_path) passes
+    again. Health checks run from a background thread over persistent HTTP
+    connections. If every endpoint is out, requests still go to the least
+    loaded one rather than failing outright.
+    """
+    def __init__(self, urls, health_path='/api/tags', health_interval=10.0, eject_after=3,
+                 eject_seconds=30.0, check_timeout=2.0):
+        self.endpoints = [Endpoint(url) for url in dict.fromkeys(url.rstrip('/') for url in urls)]
+        self.health_path = health_path
+        self.health_interval = health_interval
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self.check_timeout = check_timeout
+        self.turn = 0
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stopped = threading.Event()
+
+    def _pick_locked(self):
+        now = time.monotonic()
+        candidates = [endpoint for endpoint in self.endpoints if endpoint.available(now)] or self.endpoints
+        self.turn = (self.turn + 1) % len(self.endpoints)
+        rotated = candidates[self.turn % len(candidates):] + candidates[:self.turn % len(candidates)]
+        return min(rotated, key=lambda candidate: candidate.outstanding)
+
+    def choose(self):
+        """Pick the endpoint a request would go to, without counting one"""
+        with self.lock:
+            return self._pick_locked()
+
+    def acquire(self):
+        """Pick an endpoint for one request and count it as outstanding"""
+        with self.lock:
+            endpoint = self._pick_locked()
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+            return endpoint
+
+    def release(self, endpoint, ok=True):
+        """Finish a request, ejecting the endpoint after repeated failures"""
+        with self.lock:
+            endpoint.outstanding -= 1
+            if ok:
+                endpoint.failures = 0
+                return
+            endpoint.errors += 1
+            endpoint.failures += 1
+            if endpoint.failures >= self.eject_after:
+                self._eject(endpoint, f"{endpoint.failures} consecutive failures")
+
+    def _eject(self, endpoint, reason):
+        if endpoint.ejected_until <= time.monotonic():
+            logger.warning(f"Ejecting Ollama endpoint {endpoint.url}: {reason}")
+        endpoint.ejected_until = time.monotonic() + self.eject_seconds
+
+    @contextmanager
+    def lease(self):
+        """
+        Hold an endpoint for the duration of a request. Only endpoint errors
+        (see is_endpoint_error) count as failures of the endpoint.
+        """
+        endpoint = self.acquire()
+        ok = True
+        try:
+            yield endpoint
+        except Exception as e:
+            ok = not is_endpoint_error(e)
+            raise
+        finally:
+            self.release(endpoint, ok)
+
+    def check(self, endpoint):
+        """Run one health check against an endpoint; returns True if it passed"""
+        try:
+            if endpoint.conn is None:
+                endpoint.conn = _connect(endpoint.url, self.check_timeout)
+            endpoint.conn.request('GET', urlsplit(endpoint.url).path.rstrip('/') + self.health_path)
+            response = endpoint.conn.getresponse()
+            response.read()
+            ok = response.status == 200
+        except Exception as e:
+            logger.debug(f"Health check for {endpoint.url} failed: {e}")
+            if endpoint.conn is not None:
+                endpoint.conn.close()
+                endpoint.conn = None
+            ok = False
+
+        with self.lock:
+            if ok:
+                if not endpoint.healthy or endpoint.ejected_until > time.monotonic():
+                    logger.info(f"Ollama endpoint {endpoint.url} is healthy again")
+                endpoint.healthy = True
+                endpoint.failures = 0
+                endpoint.ejected_until = 0.0
+            else:
+                endpoint.healthy = False
+                self._eject(endpoint, "health check failed")
+        return ok
+
+    def check_all(self):
+        for endpoint in self.endpoints:
+            self.check(endpoint)
+
+    def start(self):
+        """Start background health checks; idempotent"""
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.stopped.clear()
+
+        def run():
+            while not self.stopped.is_set():
+                self.check_all()
+                self.stopped.wait(self.health_interval)
+
+        self.thread = threading.Thread(target=run, name='ollama-health', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def get_stats(self):
+        """Pool totals, with per-endpoint detail under 'hosts'"""
+        now = time.monotonic()
+        with self.lock:
+            hosts = {
+                endpoint.url: {
+                    'outstanding': endpoint.outstanding,
+                    'requests': endpoint.requests,
+                    'errors': endpoint.errors,
+                    'available': endpoint.available(now),
+                }
+                for endpoint in self.endpoints
+            }
+        return {
+            'endpoints': len(hosts),
+            'available': sum(1 for host in hosts.values() if host['available']),
+            'outstanding': sum(host['outstanding'] for host in hosts.values()),
+            'requests': sum(host['requests'] for host in hosts.values()),
+            'errors': sum(host['errors'] for host in hosts.values()),
+            'hosts': hosts,
+        }
+
+_endpoint_pool = None
+_endpoint_pool_lock = threading.Lock()
+
+def get_endpoint_pool():
+    """Return the process-wide endpoint pool, health-checked when there are several"""
+    global _endpoint_pool
+    with _endpoint_pool_lock:
+        if _endpoint_pool is None:
+            _endpoint_pool = EndpointPool(
+                default_hosts(),
+                health_interval=float(os.environ.get('OLLAMA_HEALTH_INTERVAL', 10)),
+                eject_seconds=float(os.environ.get('OLLAMA_EJECT_SECONDS', 30))
+            )
+            if len(_endpoint_pool.endpoints) > 1:
+                _endpoint_pool.start()
+        return _endpoint_pool
+
+def add_timing_listener(listener):
+    """
+    Call listener(metadata, prompt_text) after every reply from a get_llm
+    client, with Ollama's response metadata (load_duration,
+    prompt_eval_duration, eval_duration, prompt_eval_count) and the prompt.
+    This covers requests made by CrewAI agents, not just our own calls.
+    """
+    _timing_listeners.append(listener)
+
+def _get_timings_handler():
+    global _timings_handler
+    if _timings_handler is None:
+        from langchain_core.callbacks import BaseCallbackHandler
+
+        class OllamaTimings(BaseCallbackHandler):
+            """Passes Ollama's timings for each finished reply to the timing listeners"""
+            def __init__(self):
+                self.prompts = {}  # run_id -> prompt text, until the reply ends
+
+            def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+                self.prompts[run_id] = "".join(
+                    message.content for message in messages[0] if isinstance(message.content, str)
+                )
+
+            def on_llm_error(self, error, *, run_id, **kwargs):
+                self.prompts.pop(run_id, None)
+
+            def on_llm_end(self, response, *, run_id, **kwargs):
+                prompt_text = self.prompts.pop(run_id, None)
+                if not response.generations or not response.generations[0]:
+                    return
+                generation = response.generations[0][0]
+                metadata = generation.generation_info or getattr(
+                    getattr(generation, 'message', None), 'response_metadata', None
+                ) or {}
+                for listener in _timing_listeners:
+                    try:
+                        listener(metadata, prompt_text)
+                    except Exception as e:
+                        logger.warning(f"Timing listener failed: {e!r}")
+
+        _timings_handler = OllamaTimings()
+    return _timings_handler
+
+def get_llm(model=None, temperature=0.7, base_url=None, **kwargs):
+    """
+    Return a shared ChatOllama client for the given settings.
+
+    Clients are cached per parameter set so long-lived processes (the worker
+    daemon, the XMPP bot) reuse the same HTTP client, and its keep-alive
+    connections, instead of building a new one for every agent. Without a
+    base_url the least loaded available endpoint is used. Every client
+    reports its replies' timings to the listeners from add_timing_listener().
+    """
+    from langchain_ollama import ChatOllama
+
+    model = model or default_model()
+    if base_url is None:
+        base_url = get_endpoint_pool().choose().url
+    key = (model, float(temperature), base_url, tuple(sorted(kwargs.items())))
+
+    with _clients_lock:
+        llm = _clients.get(key)
+        if llm is None:
+            llm = ChatOllama(
+                model=model,
+                temperature=float(temperature),
+                base_url=base_url,
+                callbacks=[_get_timings_handler()],
+                **kwargs
+            )
+            _clients[key] = llm
+        return llm
+
+@contextmanager
+def llm_lease(model=None, temperature=0.7, **kwargs):
+    """
+    Yield a ChatOllama client on the least loaded endpoint for one request.
+
+    The endpoint counts the request as outstanding until the block exits,
+    and a request that fails with an endpoint error counts towards ejecting
+    it.
+    """
+    pool = get_endpoint_pool()
+    with pool.lease() as endpoint:
+        yield get_llm(model=model, temperature=temperature, base_url=endpoint.url, **kwargs)
+
+def parse_hours(spec):
+    """Parse 'START-END' local hours (e.g. '7-23' or '0-24', may wrap midnight); None if unset"""
+    if not spec:
+        return None
+    try:
+        start, end = (int(hour) for hour in spec.split('-'))
+    except ValueError:
+        start = end = None
+    if start is None or not 0 <= start <= 23 or not 0 <= end <= 24:
+        raise ValueError(f"CREWAI_MODEL_HOURS must look like 'START-END' with hours 0-24 (e.g. '7-23'), got {spec!r}")
+    return start, end
+
+class ModelManager:
+    """
+    Keeps the models the agents use loaded in Ollama.
+
+    start() loads every model on every endpoint in the background (an empty
+    /api/generate request loads a model without generating anything), then
+    pings each one every ping_interval seconds with keep_alive so Ollama
+    does not unload it. Pings only happen within the configured hours;
+    outside them the models are left to expire. Without configured hours
+    the models are only warmed once.
+
+    Load times are passed to on_load(model, url, seconds, cold), using
+    Ollama's load_duration so they exclude the request overhead. cold is
+    False for pings that found the model still loaded (load_duration under
+    RESIDENT_SECONDS), so they can be kept apart from real loads.
+    """
+    # Ollama reports a few milliseconds of load_duration for a resident model
+    RESIDENT_SECONDS = 0.25
+
+    def __init__(self, models, pool=None, keep_alive=None, ping_interval=None, hours=None, timeout=300.0,
+                 on_load=None):
+        self.models = sorted(set(model for model in models if model))
+        self.pool = pool or get_endpoint_pool()
+        self.keep_alive = keep_alive or os.environ.get('CREWAI_MODEL_KEEP_ALIVE', '10m')
+        self.ping_interval = ping_interval or float(os.environ.get('CREWAI_MODEL_PING_INTERVAL', 240))
+        self.hours = hours if hours is not None else parse_hours(os.environ.get('CREWAI_MODEL_HOURS'))
+        self.timeout = timeout  # loading a model on CPU can take a while
+        self.on_load = on_load
+        self.conns = {}  # url -> persistent connection, used from the manager thread only
+        self.thread = None
+        self.stopped = threading.Event()
+        self.stats = {
+            'models': len(self.models),
+            'loads': 0,
+            'pings': 0,
+            'load_errors': 0,
+            'last_load_seconds': 0.0,
+        }
+        self.stats_lock = threading.Lock()
+        self.logger = logging.getLogger('models')
+
+    def in_hours(self, now=None):
+        if self.hours is None:
+            return False
+        hour = (now or datetime.now()).hour
+        start, end = self.hours
+        if start <= end:
+            return start <= hour < end
+        return hour >= start or hour < end
+
+    def load(self, model, url):
+        """Load (or keep loaded) one model on one endpoint; returns the load time in seconds"""
+        body = json.dumps({'model': model, 'keep_alive': self.keep_alive, 'stream': False})
+        started = time.monotonic()
+        try:
+            conn = self.conns.get(url)
+            if conn is None:
+                conn = self.conns[url] = _connect(url, self.timeout)
+            conn.request(
+                'POST', urlsplit(url).path.rstrip('/') + '/api/generate', body=body,
+                headers={'Content-Type': 'application/json'}
+            )
+            response = conn.getresponse()
+            payload = response.read()
+            if response.status != 200:
+                raise RuntimeError(f"HTTP {response.status}: {payload[:200]!r}")
+        except Exception:
+            conn = self.conns.pop(url, None)
+            if conn is not None:
+                conn.close()
+            with self.stats_lock:
+                self.stats['load_errors'] += 1
+            raise
+
+        load_duration = json.loads(payload).get('load_duration')
+        seconds = load_duration / 1e9 if load_duration is not None else time.monotonic() - started
+        cold = seconds >= self.RESIDENT_SECONDS
+        with self.stats_lock:
+            if cold:
+                self.stats['loads'] += 1
+                self.stats['last_load_seconds'] = seconds
+            else:
+                self.stats['pings'] += 1
+        if self.on_load is not None:
+            self.on_load(model, url, seconds, cold)
+        return seconds
+
+    def load_all(self):
+        now = time.monotonic()
+        for endpoint in self.pool.endpoints:
+            if not endpoint.available(now):
+                continue
+            for model in self.models:
+                if self.stopped.is_set():
+                    return
+                try:
+                    seconds = self.load(model, endpoint.url)
+                    self.logger.debug(f"{model} on {endpoint.url} ready ({seconds:.2f}s load)")
+                except Exception as e:
+                    self.logger.warning(f"Could not load {model} on {endpoint.url}: {e}")
+
+    def start(self):
+        """Warm the models now and keep them loaded; idempotent"""
+        if not self.models or (self.thread is not None and self.thread.is_alive()):
+            return
+        self.stopped.clear()
+
+        def run():
+            started = time.monotonic()
+            self.load_all()
+            self.logger.info(f"Warmed {', '.join(self.models)} in {time.monotonic() - started:.1f}s")
+            while not self.stopped.wait(self.ping_interval):
+                if self.in_hours():
+                    self.load_all()
+
+        self.thread = threading.Thread(target=run, name='model-keepalive', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def get_stats(self):
+        with self.stats_lock:
+            stats = dict(self.stats)
+        stats['pinning'] = int(self.in_hours())
+        return stats
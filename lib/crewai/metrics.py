@@ -1,67 +1,275 @@
+import re
+import math
 import time
 import logging
 import functools
 import threading
 from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class Histogram:
+    """
+    Fixed-memory latency histogram with logarithmic buckets.
+
+    Bucket i covers (min_value * growth**(i-1), min_value * growth**i], so
+    recording is one log() and an increment regardless of how many values
+    have been seen, and quantiles are accurate to within one bucket (about
+    19% with the default growth of 2**0.25). Values are in seconds.
+    """
+    def __init__(self, min_value=0.0001, max_value=3600.0, growth=2 ** 0.25):
+        self.min_value = min_value
+        self.growth = growth
+        self.log_growth = math.log(growth)
+        self.size = int(math.ceil(math.log(max_value / min_value) / self.log_growth)) + 1
+        self.counts = [0] * (self.size + 1)  # last bucket is overflow
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def bound(self, index):
+        """Upper bound of a bucket"""
+        return self.min_value * self.growth ** index
+
+    def index(self, value):
+        if value <= self.min_value:
+            return 0
+        # Small epsilon keeps exact bucket bounds in their own bucket
+        return min(self.size, int(math.ceil(math.log(value / self.min_value) / self.log_growth - 1e-9)))
+
+    def record(self, value):
+        self.counts[self.index(value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile, capped at the max seen"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(self.bound(index), self.max)
+        return self.max
+
+    def cumulative(self, step=4):
+        """(upper_bound, cumulative_count) for every step-th bucket, for export"""
+        buckets = []
+        seen = 0
+        for index in range(self.size):
+            seen += self.counts[index]
+            if index % step == 0:
+                buckets.append((self.bound(index), seen))
+        return buckets
 
 class Metrics:
     """
     Simple metrics collection for CrewAI bot performance monitoring
+
+    Latencies are kept per named operation in log-bucketed histograms
+    (record_time), alongside per-operation error counts and free-form
+    counters. Components with their own stats (caches, pools) can be added
+    as collectors and are exported as gauges by render_prometheus().
     """
     def __init__(self):
         self.metrics = {
             'request_count': 0,
             'error_count': 0,
-            'response_times': [],
             'last_request_time': None,
             'avg_response_time': 0
         }
+        self.histograms = {}
+        self.errors = {}
+        self.counters = {}
+        self.collectors = {}
         self.metrics_lock = threading.Lock()
         self.logger = logging.getLogger('metrics')
-    
+
     def increment_request(self):
         """Increment request counter"""
         with self.metrics_lock:
             self.metrics['request_count'] += 1
             self.metrics['last_request_time'] = datetime.now()
-    
+
     def increment_error(self):
         """Increment error counter"""
         with self.metrics_lock:
             self.metrics['error_count'] += 1
-    
+
+    def increment(self, name, value=1):
+        """Increment a named counter"""
+        with self.metrics_lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def record_time(self, name, seconds, error=False):
+        """Record the duration of one named operation in seconds"""
+        with self.metrics_lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+                self.errors[name] = 0
+            histogram.record(seconds)
+            if error:
+                self.errors[name] += 1
+
     def record_response_time(self, time_ms):
         """Record response time in milliseconds"""
+        self.record_time('response', time_ms / 1000.0)
+
+    def add_collector(self, name, func):
+        """Export the numeric values of func() (a dict) as gauges under name"""
+        with self.metrics_lock:
+            self.collectors[name] = func
+
+    def get_operation(self, name):
+        """Count, error rate and latency percentiles (seconds) for an operation"""
         with self.metrics_lock:
-            self.metrics['response_times'].append(time_ms)
-            # Keep only last 100 response times
-            if len(self.metrics['response_times']) > 100:
-                self.metrics['response_times'].pop(0)
-            
-            # Calculate average
-            self.metrics['avg_response_time'] = sum(self.metrics['response_times']) / len(self.metrics['response_times'])
-    
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                return None
+            return self._summarize(name, histogram)
+
+    def _summarize(self, name, histogram):
+        errors = self.errors[name]
+        return {
+            'count': histogram.count,
+            'errors': errors,
+            'error_rate': errors / histogram.count if histogram.count else 0.0,
+            'avg': histogram.sum / histogram.count if histogram.count else 0.0,
+            'p50': histogram.quantile(0.5),
+            'p90': histogram.quantile(0.9),
+            'p99': histogram.quantile(0.99),
+            'max': histogram.max,
+        }
+
     def get_metrics(self):
         """Get current metrics"""
         with self.metrics_lock:
-            return self.metrics.copy()
-    
+            metrics = self.metrics.copy()
+            response = self.histograms.get('response')
+            if response is not None and response.count:
+                metrics['avg_response_time'] = response.sum / response.count * 1000
+            metrics['operations'] = {
+                name: self._summarize(name, histogram) for name, histogram in self.histograms.items()
+            }
+            metrics['counters'] = dict(self.counters)
+            return metrics
+
+    def render_prometheus(self, prefix='crewai'):
+        """Render all metrics in the Prometheus text exposition format"""
+        with self.metrics_lock:
+            histograms = [
+                (name, histogram.cumulative(), histogram.count, histogram.sum, self.errors[name])
+                for name, histogram in self.histograms.items()
+            ]
+            counters = dict(self.counters)
+            collectors = dict(self.collectors)
+            request_count = self.metrics['request_count']
+            error_count = self.metrics['error_count']
+
+        lines = [
+            f"# TYPE {prefix}_requests_total counter",
+            f"{prefix}_requests_total {request_count}",
+            f"# TYPE {prefix}_errors_total counter",
+            f"{prefix}_errors_total {error_count}",
+        ]
+
+        if histograms:
+            duration = f"{prefix}_operation_duration_seconds"
+            errors = f"{prefix}_operation_errors_total"
+            lines.append(f"# TYPE {duration} histogram")
+            for name, buckets, count, total, _errors in histograms:
+                label = _label(name)
+                for bound, seen in buckets:
+                    lines.append(f'{duration}_bucket{{operation="{label}",le="{bound:.6g}"}} {seen}')
+                lines.append(f'{duration}_bucket{{operation="{label}",le="+Inf"}} {count}')
+                lines.append(f'{duration}_sum{{operation="{label}"}} {total:.6f}')
+                lines.append(f'{duration}_count{{operation="{label}"}} {count}')
+            lines.append(f"# TYPE {errors} counter")
+            for name, _buckets, _count, _total, error_total in histograms:
+                lines.append(f'{errors}{{operation="{_label(name)}"}} {error_total}')
+
+        for name, value in sorted(counters.items()):
+            metric = f"{prefix}_{_metric_name(name)}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+
+        for name, func in sorted(collectors.items()):
+            try:
+                values = func()
+            except Exception as e:
+                self.logger.error(f"Metrics collector {name} failed: {e}")
+                continue
+            for key, value in sorted(values.items()):
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                metric = f"{prefix}_{_metric_name(name)}_{_metric_name(key)}"
+                lines.append(f"# TYPE {metric} gauge")
+                lines.append(f"{metric} {value}")
+
+        return "\n".join(lines) + "\n"
+
     def time_function(self, name):
         """Decorator to time function execution"""
         def decorator(func):
             @functools.wraps(func)
             async def wrapper(*args, **kwargs):
                 start_time = time.time()
+                failed = False
                 try:
                     self.increment_request()
                     result = await func(*args, **kwargs)
                     return result
                 except Exception as e:
+                    failed = True
                     self.increment_error()
                     raise e
                 finally:
-                    elapsed_time = (time.time() - start_time) * 1000  # Convert to ms
-                    self.record_response_time(elapsed_time)
-                    self.logger.info(f"{name} took {elapsed_time:.2f}ms")
+                    elapsed_time = time.time() - start_time
+                    self.record_time(name, elapsed_time, error=failed)
+                    self.logger.info(f"{name} took {elapsed_time * 1000:.2f}ms")
             return wrapper
         return decorator
+
+def _metric_name(name):
+    return re.sub(r'[^a-zA-Z0-9_]', '_', name)
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class MetricsServer:
+    """Serves Metrics.render_prometheus() at /metrics from a daemon thread"""
+    def __init__(self, metrics, port, host='0.0.0.0'):
+        self.metrics = metrics
+        self.logger = logging.getLogger('metrics')
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                if handler.path.split('?', 1)[0] != '/metrics':
+                    handler.send_error(404)
+                    return
+                body = metrics.render_prometheus().encode()
+                handler.send_response(200)
+                handler.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                handler.send_header('Content-Length', str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name='metrics', daemon=True)
+
+    def start(self):
+        self.thread.start()
+        self.logger.info(f"Serving metrics on {self.server.server_address[0]}:{self.server.server_address[1]}/metrics")
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
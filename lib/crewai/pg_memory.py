@@ -1,59 +1,138 @@
+import os
 import psycopg2
-from cryptography.fernet import Fernet
 from langchain.memory.chat_memory import BaseChatMemory
 import logging
+from .db import get_pool
+from .crypto import get_fernet, get_decryption_stage
+from .history import get_window, drop_window
+from .summarizer import get_summarizer
+from .tokens import get_token_counter, ContextAssembler
+from .tracing import span
+from .writebehind import get_writer, write_behind_enabled
+
+DEFAULT_TOKEN_BUDGET = 2048
+
+# Newest rows first; the window reverses them. Both queries stop below the
+# oldest row still buffered by the write-behind writer, if any, so the
+# window never moves past a row that is yet to be inserted
+LOAD_RECENT_SQL = (
+    "SELECT id, created_at, encrypted_content, token_count FROM chat_messages WHERE room_id=$1 "
+    "AND ($3::timestamp IS NULL OR (created_at, id) < ($3, $4)) "
+    "ORDER BY created_at DESC, id DESC LIMIT $2"
+)
+# Keyset pagination on (created_at, id), served by the (room_id, created_at) index
+LOAD_NEWER_SQL = (
+    "SELECT id, created_at, encrypted_content, token_count FROM chat_messages WHERE room_id=$1 "
+    "AND (created_at, id) > ($2, $3) AND ($5::timestamp IS NULL OR (created_at, id) < ($5, $6)) "
+    "ORDER BY created_at ASC, id ASC LIMIT $4"
+)
+INSERT_SQL = (
+    "INSERT INTO chat_messages (room_id, encrypted_content, token_count) VALUES ($1, $2, $3) "
+    "RETURNING id, created_at"
+)
+CLEAR_SQL = "DELETE FROM chat_messages WHERE room_id=$1"
+CLEAR_SUMMARY_SQL = "DELETE FROM chat_room_summaries WHERE room_id=$1"
 
 class PostgresMemory(BaseChatMemory):
-    def __init__(self, db_url, room_id, encryption_key):
+    def __init__(self, db_url, room_id, encryption_key, fernet=None, token_budget=None):
         super().__init__()
         self.db_url = db_url
         self.room_id = room_id
-        self.fernet = Fernet(encryption_key)
-        self.conn = None
-        try:
-            self.conn = psycopg2.connect(db_url)
-        except Exception as e:
-            logging.error(f"Error connecting to database: {e}")
+        # Fernet instances are cached per room key
+        self.fernet = fernet or get_fernet(encryption_key)
+        self.decryption = get_decryption_stage()
+        # Recent history is shared by every memory for this room
+        self.window = get_window(room_id)
+        # All memories share one bounded pool per database
+        self.pool = get_pool(
+            db_url,
+            max_size=int(os.environ.get('CREWAI_DB_POOL_SIZE', 10)),
+            timeout=float(os.environ.get('CREWAI_DB_POOL_TIMEOUT', 30))
+        )
+        self.summarizer = get_summarizer(self.pool)
+        # Inserts can be buffered and batched off the request path
+        self.writer = get_writer(self.pool) if write_behind_enabled() else None
+        # Prompt history is packed into a token budget, set per agent
+        self.token_budget = token_budget or int(os.environ.get('CREWAI_CONTEXT_TOKENS', DEFAULT_TOKEN_BUDGET))
+        self.token_counter = get_token_counter()
+        self.assembler = ContextAssembler(self.token_counter)
+
+    def pool_metrics(self):
+        """Checkout, wait time and size metrics for the shared pool"""
+        return self.pool.get_metrics()
         
+    def refresh_window(self):
+        """Fetch and decrypt only the rows newer than the window's last one"""
+        window = self.window
+        with window.lock, span('memory.refresh') as refresh_span:
+            horizon = self.writer.oldest_unflushed(self.room_id) if self.writer is not None else None
+            before_at, before_id = horizon or (None, None)
+            with self.pool.connection() as conn:
+                with conn.cursor() as cur:
+                    if window.loaded:
+                        created_at, message_id = window.last_key or (None, None)
+                        if created_at is not None:
+                            self.pool.execute_prepared(
+                                conn, cur, "pg_memory_load_newer", LOAD_NEWER_SQL,
+                                (self.room_id, created_at, message_id, window.size, before_at, before_id)
+                            )
+                            rows = cur.fetchall()
+                            if len(rows) < window.size:
+                                refresh_span.set(rows=len(rows))
+                                self._extend_window(rows, reset=False)
+                                return
+                    # First load, or more new rows than fit: take the newest
+                    self.pool.execute_prepared(
+                        conn, cur, "pg_memory_load_recent", LOAD_RECENT_SQL,
+                        (self.room_id, window.size, before_at, before_id)
+                    )
+                    rows = cur.fetchall()
+            rows.reverse()
+            refresh_span.set(rows=len(rows), reset=True)
+            self._extend_window(rows, reset=True)
+
+    def _extend_window(self, rows, reset):
+        # Safely decrypt messages; failures stay as None and are skipped
+        with span('memory.decrypt', rows=len(rows)):
+            decrypted, _failures = self.decryption.decrypt_batch(
+                self.fernet, (row[2] for row in rows), label=f"room {self.room_id}", keep_failures=True
+            )
+        # Rows saved before token counts were stored are counted once here
+        entries = [
+            (row[0], row[1], text, row[3] if row[3] is not None or text is None else self.token_counter.count(text))
+            for row, text in zip(rows, decrypted)
+        ]
+        if reset:
+            self.window.reset(entries)
+        else:
+            self.window.extend(entries)
+
     def load_memory_variables(self, inputs):
-        conn = None
+        with span('memory.load'):
+            return self._load_memory_variables(inputs)
+
+    def _load_memory_variables(self, inputs):
         try:
-            conn = psycopg2.connect(self.db_url)
-            with conn.cursor() as cur:
-                cur.execute(
-                    "SELECT encrypted_content FROM chat_messages WHERE room_id=%s ORDER BY created_at ASC LIMIT 100",
-                    (self.room_id,)
-                )
-                rows = cur.fetchall()
-                
-                if not rows:
-                    return {"chat_history": ""}
-                    
-                # Safely decrypt messages
-                decrypted = []
-                for row in rows:
-                    try:
-                        decrypted.append(self.fernet.decrypt(row[0]).decode())
-                    except Exception as e:
-                        logging.error(f"Failed to decrypt message: {e}")
-                        # Skip this message
-                        
-                history = "\n".join(decrypted)
-                
-                # Summarize if needed
-                summarized_history = self.summarize_if_needed(history)
+            self.refresh_window()
+            entries = self.window.entries()
                 
-                return {"chat_history": summarized_history}
+            if not entries:
+                return {"chat_history": ""}
+            
+            # Summarize if needed
+            summarized_history = self.summarize_if_needed(entries)
+            
+            return {"chat_history": summarized_history}
         except Exception as e:
             logging.error(f"Error loading memory variables: {e}")
             # Return empty context so the conversation can still proceed
             return {"chat_history": ""}
-        finally:
-            if conn is not None and not conn.closed:
-                conn.close()
             
     def save_context(self, inputs, outputs):
-        conn = None
+        with span('memory.save'):
+            self._save_context(inputs, outputs)
+
+    def _save_context(self, inputs, outputs):
         try:
             # Get input content or use fallback
             input_content = inputs.get('input', '')
@@ -73,75 +152,78 @@ class PostgresMemory(BaseChatMemory):
                 # Fallback to simple encoding if encryption fails
                 encrypted = f"ERROR_ENCRYPTING: {message}".encode()
             
-            try:
-                conn = psycopg2.connect(self.db_url)
-                with conn.cursor() as cur:
-                    cur.execute(
-                        "INSERT INTO chat_messages (room_id, encrypted_content) VALUES (%s, %s)",
-                        (self.room_id, encrypted)
-                    )
-                    conn.commit()
-            except Exception as e:
-                logging.error(f"Database error when saving context: {e}")
-                # Try to reconnect if connection was lost
+            # Count tokens once, at write time, so loads never tokenize
+            tokens = self.token_counter.count(message)
+            
+            if self.writer is not None:
+                window = self.window
+
+                # Called once the row has its id, possibly later from the writer thread
+                def append(message_id, created_at):
+                    with window.lock:
+                        window.append_local(message_id, created_at, message, tokens)
+
+                self.writer.enqueue(self.room_id, encrypted, tokens, on_id=append)
+                return
+            
+            # A broken connection is discarded by the pool, so one retry
+            # picks up a fresh one
+            for attempt in range(2):
                 try:
-                    if conn is not None and not conn.closed:
-                        conn.close()
-                    conn = psycopg2.connect(self.db_url)
-                    with conn.cursor() as cur:
-                        cur.execute(
-                            "INSERT INTO chat_messages (room_id, encrypted_content) VALUES (%s, %s)",
-                            (self.room_id, encrypted)
-                        )
+                    with self.pool.connection() as conn:
+                        with conn.cursor() as cur:
+                            self.pool.execute_prepared(
+                                conn, cur, "pg_memory_insert", INSERT_SQL, (self.room_id, encrypted, tokens)
+                            )
+                            message_id, created_at = cur.fetchone()
                         conn.commit()
-                except Exception as reconnect_error:
-                    logging.error(f"Reconnection failed: {reconnect_error}")
+                    # Keep the window current without re-reading the row
+                    with self.window.lock:
+                        self.window.append_local(message_id, created_at, message, tokens)
+                    break
+                except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                    logging.error(f"Database error when saving context: {e}")
+                    if attempt == 1:
+                        logging.error(f"Reconnection failed: {e}")
         except Exception as e:
             logging.error(f"Unexpected error in save_context: {e}")
-        finally:
-            if conn is not None and not conn.closed:
-                conn.close()
             
     def clear(self):
-        conn = None
         try:
-            conn = psycopg2.connect(self.db_url)
-            with conn.cursor() as cur:
-                cur.execute("DELETE FROM chat_messages WHERE room_id=%s", (self.room_id,))
+            with self.pool.connection() as conn:
+                with conn.cursor() as cur:
+                    self.pool.execute_prepared(conn, cur, "pg_memory_clear", CLEAR_SQL, (self.room_id,))
+                    self.pool.execute_prepared(
+                        conn, cur, "pg_memory_clear_summary", CLEAR_SUMMARY_SQL, (self.room_id,)
+                    )
                 conn.commit()
+            self.summarizer.forget(self.room_id)
+            drop_window(self.room_id)
+            self.window = get_window(self.room_id)
         except Exception as e:
             logging.error(f"Error clearing memory: {e}")
-        finally:
-            if conn is not None and not conn.closed:
-                conn.close()
 
-    def summarize_if_needed(self, history, max_tokens=8000):
-        """Summarize history if it gets too long"""
-        # Estimate token count (rough approximation)
-        estimated_tokens = len(history.split()) * 1.3
+    def summarize_if_needed(self, entries):
+        """Pack history into the token budget, using the rolling summary if it is too long"""
+        total_tokens = sum(tokens for _key, _text, tokens in entries) + len(entries)
         
-        if estimated_tokens > max_tokens:
-            # Connect to Ollama for summarization
+        if total_tokens <= self.token_budget:
+            return "\n".join(text for _key, text, _tokens in entries)
+        
+        # Fold new messages into the summary in the background; the request
+        # only ever reads the stored summary
+        with span('memory.summary'):
+            self.summarizer.request(self.room_id, self.fernet)
             try:
-                from langchain_ollama import ChatOllama
-                
-                summarizer = ChatOllama(
-                    model="phi3:mini",
-                    temperature=0.3  # Lower temperature for more factual summary
-                )
-                
-                prompt = f"""
-                Summarize the following conversation history concisely, focusing on key points 
-                and preserving important information:
-                
-                {history}
-                """
-                
-                summary = summarizer.invoke(prompt).text
-                return f"[SUMMARY OF PREVIOUS CONVERSATION]: {summary}\n\n[RECENT MESSAGES]:\n"
+                summary, watermark = self.summarizer.get(self.room_id, self.fernet)
             except Exception as e:
-                logging.error(f"Failed to summarize history: {e}")
-                # If summarization fails, truncate instead
-                return "...[Earlier conversation omitted]...\n\n" + history[-4000:]
+                logging.error(f"Failed to load conversation summary: {e}")
+                summary, watermark = None, None
         
-        return history
\ No newline at end of file
+        # Without a summary, the newest messages that fit are kept
+        recent = [
+            (text, tokens) for key, text, tokens in entries
+            if summary is None or watermark is None or key > watermark
+        ]
+        history, _used = self.assembler.assemble(recent, self.token_budget, summary=summary)
+        return history
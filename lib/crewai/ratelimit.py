@@ -0,0 +1,137 @@
+import os
+import time
+import logging
+import threading
+from collections import namedtuple
+
+# rate is in tokens per second, burst is the bucket capacity
+Limit = namedtuple('Limit', ['rate', 'burst'])
+
+def limit_from_env(prefix, per_minute, burst):
+    """Read a Limit from <prefix>_PER_MIN and <prefix>_BURST; None if disabled"""
+    per_minute = float(os.environ.get(f'{prefix}_PER_MIN', per_minute))
+    burst = float(os.environ.get(f'{prefix}_BURST', burst))
+    if per_minute <= 0:
+        return None
+    return Limit(per_minute / 60.0, max(1.0, burst))
+
+class RateLimiter:
+    """
+    Token-bucket rate limiter with per-user, per-room and global tiers.
+
+    Buckets refill lazily: each check tops a bucket up by the time elapsed
+    since it was last touched, so checking is O(1) no matter how many users
+    are tracked. A request must find a token in every configured tier and
+    then takes one from each, all under one lock, so the limiter can be
+    called from any thread.
+
+    Idle buckets are dropped by a timing wheel. A bucket is filed under the
+    slot in which it would have refilled completely; as the clock passes a
+    slot, its buckets are either dropped (still idle, hence full, which is
+    the same as not tracking them) or filed again under their new deadline.
+    The wheel is advanced from check(), so expiry costs O(1) amortized.
+    """
+    TIERS = ('global', 'room', 'user')
+
+    def __init__(self, user=None, room=None, global_limit=None, tick=1.0, slots=512, clock=time.monotonic):
+        self.limits = {'user': user, 'room': room, 'global': global_limit}
+        self.tick = tick
+        self.clock = clock
+        self.buckets = {}  # (tier, key) -> [tokens, last_refill]
+        self.wheel = [set() for _ in range(slots)]
+        self.current_tick = int(clock() / tick)
+        self.stats = {
+            'allowed': 0,
+            'limited_user': 0,
+            'limited_room': 0,
+            'limited_global': 0,
+            'expired': 0,
+        }
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger('ratelimit')
+
+    def _refill_seconds(self, limit, tokens):
+        return (limit.burst - tokens) / limit.rate
+
+    def _schedule(self, bucket_key, deadline):
+        # Deadlines beyond one revolution land in an earlier slot and are
+        # simply filed again when it fires
+        slot = max(int(deadline / self.tick), self.current_tick + 1)
+        self.wheel[slot % len(self.wheel)].add(bucket_key)
+
+    def _advance(self, now):
+        target = int(now / self.tick)
+        if target <= self.current_tick:
+            return
+        # After a long pause every slot is due; visit each once
+        steps = min(target - self.current_tick, len(self.wheel))
+        start = target - steps + 1
+        self.current_tick = target
+        for tick in range(start, target + 1):
+            slot = self.wheel[tick % len(self.wheel)]
+            if not slot:
+                continue
+            due = list(slot)
+            slot.clear()
+            for bucket_key in due:
+                bucket = self.buckets.get(bucket_key)
+                if bucket is None:
+                    continue
+                limit = self.limits[bucket_key[0]]
+                deadline = bucket[1] + self._refill_seconds(limit, bucket[0])
+                if deadline <= now:
+                    del self.buckets[bucket_key]
+                    self.stats['expired'] += 1
+                else:
+                    self._schedule(bucket_key, deadline)
+
+    def _bucket(self, tier, key, limit, now):
+        bucket_key = (tier, key)
+        bucket = self.buckets.get(bucket_key)
+        if bucket is None:
+            bucket = self.buckets[bucket_key] = [limit.burst, now]
+            # Filed for the next tick, which files it again by its deadline
+            self._schedule(bucket_key, now)
+            return bucket
+        elapsed = now - bucket[1]
+        if elapsed > 0:
+            bucket[0] = min(limit.burst, bucket[0] + elapsed * limit.rate)
+            bucket[1] = now
+        return bucket
+
+    def check(self, user, room=None):
+        """
+        Take one token for a request.
+
+        Returns None if the request is allowed, otherwise the name of the
+        tier ('user', 'room' or 'global') that is out of tokens.
+        """
+        keys = {'user': user, 'room': room, 'global': None}
+        with self.lock:
+            now = self.clock()
+            self._advance(now)
+
+            buckets = []
+            for tier in self.TIERS:
+                limit = self.limits[tier]
+                if limit is None or (tier == 'room' and room is None):
+                    continue
+                bucket = self._bucket(tier, keys[tier], limit, now)
+                if bucket[0] < 1:
+                    self.stats[f'limited_{tier}'] += 1
+                    return tier
+                buckets.append(bucket)
+
+            for bucket in buckets:
+                bucket[0] -= 1
+            self.stats['allowed'] += 1
+            return None
+
+    def allow(self, user, room=None):
+        return self.check(user, room) is None
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['buckets'] = len(self.buckets)
+            return stats
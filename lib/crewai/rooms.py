@@ -0,0 +1,183 @@
+import json
+import logging
+import threading
+from collections import namedtuple
+
+import psycopg2
+
+from .crypto import get_fernet
+
+NOTIFY_CHANNEL = "chat_rooms_changed"
+
+ROOM_SQL = "SELECT id, xmpp_jid, room_key, active FROM chat_rooms WHERE {column} = %s"
+
+Room = namedtuple('Room', ['room_id', 'room_jid', 'room_key', 'fernet'])
+
+class RoomRegistry:
+    """
+    In-process map of chat rooms to their ID, key and Fernet instance.
+
+    Warmed from the chat_rooms query the bot runs at startup and kept coherent
+    through Postgres LISTEN/NOTIFY (see the chat_rooms_changed trigger), so
+    message handling never has to query chat_rooms. If the listening
+    connection drops, listen()'s on_disconnect callback lets the owner
+    reconnect and resync with load().
+    """
+    def __init__(self, on_added=None, on_removed=None):
+        self.by_jid = {}
+        self.by_id = {}
+        self.lock = threading.Lock()
+        self.on_added = on_added
+        self.on_removed = on_removed
+        self.listen_conn = None
+        self.listen_loop = None
+        self.on_change = None
+        self.on_disconnect = None
+        self.logger = logging.getLogger('rooms')
+
+    def get(self, room_jid):
+        return self.by_jid.get(room_jid)
+
+    def get_by_id(self, room_id):
+        return self.by_id.get(room_id)
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def add(self, room_id, room_jid, room_key):
+        """Register or update a room, rebuilding its Fernet only if the key changed"""
+        with self.lock:
+            previous = self.by_id.get(room_id)
+            if previous is not None and previous.room_key == room_key and previous.room_jid == room_jid:
+                return previous
+            moved = previous is not None and previous.room_jid != room_jid
+            if moved:
+                self.by_jid.pop(previous.room_jid, None)
+
+            room = Room(room_id, room_jid, room_key, get_fernet(room_key))
+            self.by_id[room_id] = room
+            self.by_jid[room_jid] = room
+
+        if moved and self.on_removed:
+            # The room moved to another MUC: leave the old one
+            self.on_removed(previous)
+        if (previous is None or moved) and self.on_added:
+            self.on_added(room)
+        return room
+
+    def remove(self, room_id):
+        with self.lock:
+            room = self.by_id.pop(room_id, None)
+            if room is not None:
+                self.by_jid.pop(room.room_jid, None)
+
+        if room is not None and self.on_removed:
+            self.on_removed(room)
+        return room
+
+    def load(self, rows):
+        """
+        Warm or resync the registry from the (id, xmpp_jid, room_key) rows
+        of all active rooms; rooms not among them are removed.
+        """
+        active = set()
+        for room_id, room_jid, room_key in rows:
+            active.add(room_id)
+            try:
+                self.add(room_id, room_jid, room_key)
+            except Exception as e:
+                self.logger.error(f"Invalid key for room {room_jid}: {e}")
+        for room_id in set(self.by_id) - active:
+            self.remove(room_id)
+
+    def refresh(self, conn, room_id=None, room_jid=None):
+        """Reload one room from the database; returns the room or None if gone"""
+        return self.apply(self.fetch(conn, room_id=room_id, room_jid=room_jid), room_id=room_id)
+
+    def fetch(self, conn, room_id=None, room_jid=None):
+        """Read one room's (id, xmpp_jid, room_key, active) row, without applying it"""
+        column, value = ("id", room_id) if room_id is not None else ("xmpp_jid", room_jid)
+        with conn.cursor() as cursor:
+            cursor.execute(ROOM_SQL.format(column=column), (value,))
+            row = cursor.fetchone()
+        if not conn.autocommit:
+            conn.rollback()
+        return row
+
+    def apply(self, row, room_id=None):
+        """Apply a row from fetch(): add or update the room, or remove it if gone"""
+        if row is None or not row[3]:
+            if room_id is None and row is not None:
+                room_id = row[0]
+            if room_id is not None:
+                self.remove(room_id)
+            return None
+        return self.add(row[0], row[1], row[2])
+
+    @staticmethod
+    def connect_listener(db_url, connect_timeout=None):
+        """Open a connection subscribed to chat_rooms changes (blocking)"""
+        kwargs = {'connect_timeout': int(connect_timeout)} if connect_timeout else {}
+        conn = psycopg2.connect(db_url, **kwargs)
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+        return conn
+
+    def listen(self, conn, loop, on_change=None, on_disconnect=None):
+        """
+        Follow chat_rooms changes on the given asyncio loop.
+
+        conn comes from connect_listener(). Changed rooms are passed to
+        on_change(room_id) when given, so the caller can reload them off the
+        loop; otherwise they are reloaded inline on the listening connection.
+        If the connection fails it is closed and on_disconnect() is called.
+        """
+        self.close()
+        self.listen_conn = conn
+        self.listen_loop = loop
+        self.on_disconnect = on_disconnect
+        self.on_change = on_change
+        loop.add_reader(conn.fileno(), self._on_notify)
+        self.logger.info(f"Listening for {NOTIFY_CHANNEL} notifications")
+
+    def _on_notify(self):
+        conn = self.listen_conn
+        try:
+            conn.poll()
+        except Exception as e:
+            self.logger.error(f"Room notification connection failed: {e}")
+            on_disconnect = self.on_disconnect
+            self.close()
+            if on_disconnect is not None:
+                on_disconnect()
+            return
+
+        while conn.notifies:
+            notify = conn.notifies.pop(0)
+            try:
+                payload = json.loads(notify.payload)
+                if payload.get('op') == 'DELETE':
+                    self.remove(payload['id'])
+                elif self.on_change is not None:
+                    self.on_change(payload['id'])
+                else:
+                    self.refresh(conn, room_id=payload['id'])
+            except Exception as e:
+                self.logger.error(f"Failed to apply room notification {notify.payload!r}: {e}")
+
+    def close(self):
+        """Stop listening and close the listening connection"""
+        if self.listen_conn is None:
+            return
+        try:
+            self.listen_loop.remove_reader(self.listen_conn.fileno())
+        except Exception:
+            pass  # the socket may already be gone
+        try:
+            self.listen_conn.close()
+        except Exception:
+            pass
+        self.listen_conn = None
+        self.listen_loop = None
+        self.on_disconnect = None
@@ -0,0 +1,100 @@
+import logging
+from collections import namedtuple
+
+class Route(namedtuple('Route', ['model', 'temperature', 'top_p', 'max_tokens', 'context_tokens', 'rule'])):
+    """Model settings chosen for one request; rule names the routing rule that matched, if any"""
+    __slots__ = ()
+
+    @property
+    def params(self):
+        """Model parameters, as used in response cache keys"""
+        return (self.model, self.temperature, self.top_p, self.max_tokens)
+
+# Rule conditions, tested against (prompt_tokens, queue_depth, agent_name, task_name)
+CONDITIONS = {
+    'min_prompt_tokens': lambda value, tokens, depth, agent, task: tokens >= value,
+    'max_prompt_tokens': lambda value, tokens, depth, agent, task: tokens <= value,
+    'min_queue_depth': lambda value, tokens, depth, agent, task: depth >= value,
+    'max_queue_depth': lambda value, tokens, depth, agent, task: depth <= value,
+    'agents': lambda value, tokens, depth, agent, task: agent in value,
+    'tasks': lambda value, tokens, depth, agent, task: task in value,
+}
+
+# Settings a rule can override
+OVERRIDES = ('model', 'temperature', 'max_tokens', 'context_tokens')
+
+class _Rule:
+    __slots__ = ('name', 'tests', 'overrides')
+
+    def __init__(self, name, spec):
+        unknown = set(spec) - set(CONDITIONS) - set(OVERRIDES) - {'name'}
+        if unknown:
+            raise ValueError(f"Unknown routing setting(s) in {name}: {', '.join(sorted(unknown))}")
+        self.name = spec.get('name', name)
+        self.tests = tuple(
+            (CONDITIONS[key], set(value) if key in ('agents', 'tasks') else value)
+            for key, value in spec.items() if key in CONDITIONS
+        )
+        self.overrides = {key: spec[key] for key in OVERRIDES if key in spec}
+
+    def matches(self, tokens, depth, agent, task):
+        return all(test(value, tokens, depth, agent, task) for test, value in self.tests)
+
+class RoutingPolicy:
+    """
+    Picks the model, token limit and context budget for each request.
+
+    Agents in config/agents.yaml and tasks in config/tasks.yaml may carry a
+    'routes' list. Each rule has conditions (min/max_prompt_tokens,
+    min/max_queue_depth, and 'tasks' or 'agents' lists) and the settings it
+    overrides (model, temperature, max_tokens, context_tokens). The first
+    matching agent rule applies on top of the agent's own settings, then the
+    first matching task rule on top of that. For example, to answer short
+    questions and requests made under load with a smaller model:
+
+        routes:
+          - {name: short, max_prompt_tokens: 40, max_tokens: 256}
+          - {name: busy, min_queue_depth: 4, model: 'phi3:mini', context_tokens: 800}
+
+    Rules are compiled at startup, so routing a request is a few comparisons.
+    """
+    def __init__(self, agents, task_configs):
+        self.base = {}
+        self.agent_rules = {}
+        self.task_rules = {}
+        for name, config in agents.agent_configs.items():
+            model, temperature, top_p, max_tokens = agents.params(name)
+            self.base[name] = Route(model, temperature, top_p, max_tokens, config.get('context_tokens'), None)
+            self.agent_rules[name] = self._compile(f"agent_{name}", config.get('routes'))
+        for name, config in task_configs.items():
+            self.task_rules[name] = self._compile(f"task_{name}", config.get('routes'))
+        self.logger = logging.getLogger('routing')
+
+        rules = sum(len(rules) for rules in self.agent_rules.values()) + sum(len(rules) for rules in self.task_rules.values())
+        if rules:
+            self.logger.info(f"Loaded {rules} routing rules")
+
+    def _compile(self, owner, specs):
+        return [_Rule(f"{owner}_{index}", spec) for index, spec in enumerate(specs or [])]
+
+    def _first(self, rules, tokens, depth, agent, task):
+        for rule in rules:
+            if rule.matches(tokens, depth, agent, task):
+                return rule
+        return None
+
+    def route(self, agent_name, task_name, prompt_tokens, queue_depth=0):
+        """Return the Route for a request"""
+        route = self.base[agent_name]
+        for rules in (self.agent_rules[agent_name], self.task_rules.get(task_name, ())):
+            rule = self._first(rules, prompt_tokens, queue_depth, agent_name, task_name)
+            if rule is not None:
+                route = route._replace(rule=rule.name, **rule.overrides)
+        return route
+
+    def models(self):
+        """Every model a request can be routed to"""
+        models = {route.model for route in self.base.values()}
+        for rules in list(self.agent_rules.values()) + list(self.task_rules.values()):
+            models.update(rule.overrides['model'] for rule in rules if 'model' in rule.overrides)
+        return models
@@ -1,58 +1,44 @@
 #!/usr/bin/env python
 
-import os
 import sys
 import json
-import pickle
-import tempfile
-from pathlib import Path
-
-try:
-    from crewai import Crew
-    
-    # Create a persistent storage directory
-    storage_dir = Path(tempfile.gettempdir()) / "crewai_storage"
-    storage_dir.mkdir(exist_ok=True)
-    
-    # Load crew ID from command line argument
-    crew_id = sys.argv[1] if len(sys.argv) > 1 else None
-    
+
+from common import error_response
+from create_crew import build_crew
+from tracing import trace, span
+
+ERROR_PREFIX = "Error running crew"
+
+def run_crew(crew_id):
+    """Run a stored crew's tasks and return the result envelope"""
     if not crew_id:
         raise ValueError("Crew ID must be provided as argument")
-    
-    # Load the crew from file
-    crew_file = storage_dir / f"crew_{crew_id}.pkl"
-    
-    if not crew_file.exists():
-        raise FileNotFoundError(f"Crew file not found: {crew_file}")
-    
-    # Load the crew
-    with open(crew_file, 'rb') as f:
-        crew = pickle.load(f)
-    
+
+    # Load the crew and its members from the store
+    with span('build_crew'):
+        crew = build_crew(crew_id)
+
     # Run the crew's tasks
-    result = crew.kickoff()
-    
-    # Return the result
-    output = {
+    with span('crew_kickoff', tasks=len(crew.tasks)):
+        result = crew.kickoff()
+
+    # Return the result (CrewOutput renders to its raw text)
+    return {
         "status": "success",
         "message": "Crew tasks completed successfully",
-        "result": result
-    }
-    print(json.dumps(output))
-    
-except ImportError as e:
-    error = {
-        "status": "error",
-        "message": f"Error importing required Python modules: {str(e)}"
-    }
-    print(json.dumps(error), file=sys.stderr)
-    sys.exit(1)
-    
-except Exception as e:
-    error = {
-        "status": "error",
-        "message": f"Error running crew: {str(e)}"
+        "result": str(result)
     }
-    print(json.dumps(error), file=sys.stderr)
-    sys.exit(1) 
\ No newline at end of file
+
+def main():
+    try:
+        # Load crew ID from command line argument
+        crew_id = sys.argv[1] if len(sys.argv) > 1 else None
+        with trace('run_crew', crew_id=crew_id or ''):
+            result = run_crew(crew_id)
+        print(json.dumps(result))
+    except Exception as e:
+        print(json.dumps(error_response(ERROR_PREFIX, e)), file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+import time
+import asyncio
+import logging
+from collections import deque, OrderedDict
+
+class SchedulerFull(Exception):
+    """Raised by submit() when the queue (or the room's share of it) is full"""
+
+class _Job:
+    __slots__ = ('room', 'priority', 'factory', 'enqueued')
+
+    def __init__(self, room, priority, factory):
+        self.room = room
+        self.priority = priority
+        self.factory = factory
+        self.enqueued = time.monotonic()
+
+class RequestScheduler:
+    """
+    Bounded, fair queue in front of crew execution.
+
+    Jobs wait in per-room FIFO queues grouped by priority. Workers always
+    serve the highest priority that has work and, within it, rotate over
+    the rooms round-robin, so one busy room cannot starve the others. The
+    number of workers bounds concurrent requests (and so the load on
+    Ollama); max_queue bounds the waiting jobs overall and max_per_room
+    per room, beyond which submit() raises SchedulerFull.
+    """
+    def __init__(self, workers=2, max_queue=50, max_per_room=10, on_wait=None):
+        self.worker_count = workers
+        self.max_queue = max_queue
+        self.max_per_room = max_per_room
+        self.on_wait = on_wait  # called with the seconds each job waited
+        self.levels = {}  # priority -> OrderedDict(room -> deque of jobs)
+        self.room_counts = {}
+        self.queued = 0
+        self.running = 0
+        self.ready = asyncio.Semaphore(0)
+        self.workers = []
+        self.stats = {
+            'submitted': 0,
+            'rejected': 0,
+            'completed': 0,
+            'failed': 0,
+        }
+        self.logger = logging.getLogger('scheduler')
+
+    def start(self):
+        """Start the worker tasks on the running loop; idempotent"""
+        if self.workers:
+            return
+        self.workers = [
+            asyncio.ensure_future(self._worker(index)) for index in range(self.worker_count)
+        ]
+        self.logger.info(f"Scheduler started with {self.worker_count} workers")
+
+    async def stop(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    def submit(self, room, factory, priority=0):
+        """
+        Queue factory() (returning an awaitable) for a room.
+
+        Returns the job's position in line, where 1 means it is next to run.
+        """
+        if self.queued >= self.max_queue or self.room_counts.get(room, 0) >= self.max_per_room:
+            self.stats['rejected'] += 1
+            raise SchedulerFull(room)
+
+        rooms = self.levels.setdefault(priority, OrderedDict())
+        queue = rooms.get(room)
+        if queue is None:
+            queue = rooms[room] = deque()
+        queue.append(_Job(room, priority, factory))
+        self.room_counts[room] = self.room_counts.get(room, 0) + 1
+        self.queued += 1
+        self.stats['submitted'] += 1
+        position = self._position(priority, room, len(queue) - 1)
+        self.ready.release()
+        return position
+
+    def _position(self, priority, room, index):
+        """Estimated place in line for the index-th job of a room's queue"""
+        ahead = 0
+        for level, rooms in self.levels.items():
+            if level > priority:
+                ahead += sum(len(queue) for queue in rooms.values())
+            elif level == priority:
+                # Round-robin serves about one job per room per turn
+                ahead += sum(min(len(queue), index + 1) for other, queue in rooms.items() if other != room)
+        return ahead + index + 1
+
+    def _next_job(self):
+        priority = max(level for level, rooms in self.levels.items() if rooms)
+        rooms = self.levels[priority]
+        room, queue = next(iter(rooms.items()))
+        job = queue.popleft()
+        if queue:
+            rooms.move_to_end(room)
+        else:
+            del rooms[room]
+        if not rooms:
+            del self.levels[priority]
+
+        self.queued -= 1
+        remaining = self.room_counts[room] - 1
+        if remaining:
+            self.room_counts[room] = remaining
+        else:
+            del self.room_counts[room]
+        return job
+
+    async def _worker(self, index):
+        while True:
+            await self.ready.acquire()
+            job = self._next_job()
+            if self.on_wait is not None:
+                self.on_wait(time.monotonic() - job.enqueued)
+            self.running += 1
+            try:
+                await job.factory()
+                self.stats['completed'] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats['failed'] += 1
+                self.logger.error(f"Scheduled request for room {job.room} failed: {e}")
+            finally:
+                self.running -= 1
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['queued'] = self.queued
+        stats['running'] = self.running
+        stats['workers'] = self.worker_count
+        stats['rooms_waiting'] = len(self.room_counts)
+        return stats
@@ -0,0 +1,225 @@
+import os
+import re
+import time
+import zlib
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .cache import normalize_content
+from .llm import get_endpoint_pool
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+class HashingEmbedder:
+    """
+    Deterministic local embedder using feature hashing.
+
+    Hashes word unigrams and bigrams plus character trigrams into a fixed
+    number of buckets and L2-normalizes the result. Needs no model server,
+    so it is the fallback when Ollama embeddings are unavailable and what
+    tests and benchmarks use.
+    """
+    WORD_RE = re.compile(r"\w+")
+
+    def __init__(self, dim=512):
+        self.dim = dim
+
+    def _features(self, text):
+        words = self.WORD_RE.findall(text)
+        features = list(words)
+        features.extend(f"{a} {b}" for a, b in zip(words, words[1:]))
+        for word in words:
+            padded = f" {word} "
+            features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+        return features
+
+    def embed(self, texts):
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = zlib.crc32(feature.encode())
+                sign = 1.0 if digest & 0x80000000 else -1.0
+                matrix[row, digest % self.dim] += sign
+        return _normalize_rows(matrix)
+
+class OllamaEmbedder:
+    """
+    Embeds text with an Ollama embedding model.
+
+    Each request leases the least loaded endpoint from the shared
+    EndpointPool, like chat requests do, so embeddings follow OLLAMA_HOSTS
+    and stay off ejected hosts. One client is kept per endpoint.
+    """
+    def __init__(self, model=None, pool=None):
+        from langchain_ollama import OllamaEmbeddings
+
+        self.client_class = OllamaEmbeddings
+        self.model = model or os.environ.get('CREWAI_EMBED_MODEL', 'nomic-embed-text')
+        self.pool = pool or get_endpoint_pool()
+        self.clients = {}
+        self.lock = threading.Lock()
+
+    def _client(self, base_url):
+        with self.lock:
+            client = self.clients.get(base_url)
+            if client is None:
+                client = self.clients[base_url] = self.client_class(model=self.model, base_url=base_url)
+            return client
+
+    def embed(self, texts):
+        with self.pool.lease() as endpoint:
+            vectors = self._client(endpoint.url).embed_documents(list(texts))
+        return np.asarray(vectors, dtype=np.float32)
+
+def get_embedder(name=None):
+    """Build the embedder named by CREWAI_SEMANTIC_EMBEDDER (ollama or hashing)"""
+    name = name or os.environ.get('CREWAI_SEMANTIC_EMBEDDER', 'ollama')
+    if name == 'hashing':
+        return HashingEmbedder()
+    return OllamaEmbedder()
+
+class _Partition:
+    """Fixed-capacity embedding matrix and answers for one room/agent/task/params"""
+    def __init__(self, capacity, dim):
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.responses = [None] * capacity
+        self.stored_at = np.zeros(capacity, dtype=np.float64)
+        self.last_used = np.zeros(capacity, dtype=np.float64)
+        self.count = 0
+
+    def slot_for_insert(self):
+        """Next free slot, or the least recently used one when full"""
+        if self.count < len(self.responses):
+            slot = self.count
+            self.count += 1
+            return slot, False
+        return int(np.argmin(self.last_used)), True
+
+class SemanticCache:
+    """
+    Near-duplicate response cache keyed by embedding similarity.
+
+    Normalized request content is embedded and stored in a per room and
+    agent/task matrix of unit vectors; answers come from a room's private
+    memory, so one room is never served another's, and get()/set() without
+    a room bypass the cache. A lookup is one matrix-vector product (cosine
+    similarity) over that partition; the best match is reused when it is
+    at or above threshold and not older than ttl. Each partition holds at
+    most capacity entries, evicting the least recently used, and at most
+    max_partitions partitions are kept.
+    """
+    def __init__(self, embedder, threshold=0.92, capacity=256, max_partitions=64, ttl=3600):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.capacity = capacity
+        self.max_partitions = max_partitions
+        self.ttl = ttl
+        self.partitions = OrderedDict()
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'embed_errors': 0,
+        }
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger('semantic_cache')
+
+    def _embed(self, content):
+        try:
+            vector = self.embedder.embed([normalize_content(content)])
+        except Exception as e:
+            self.logger.error(f"Embedding failed: {e}")
+            with self.lock:
+                self.stats['embed_errors'] += 1
+            return None
+        return _normalize_rows(np.asarray(vector, dtype=np.float32))[0]
+
+    def get(self, agent_name, task_name, content, params=None, room=None):
+        """Return the stored answer to the room's most similar earlier request, if close enough"""
+        if room is None:
+            return None
+        key = (room.room_id, agent_name, task_name, params)
+        with self.lock:
+            if key not in self.partitions:
+                self.stats['misses'] += 1
+                return None
+
+        vector = self._embed(content)
+        if vector is None:
+            return None
+
+        now = time.time()
+        with self.lock:
+            partition = self.partitions.get(key)
+            if partition is None or partition.count == 0 or partition.vectors.shape[1] != vector.shape[0]:
+                self.stats['misses'] += 1
+                return None
+            self.partitions.move_to_end(key)
+
+            n = partition.count
+            scores = partition.vectors[:n] @ vector
+            scores[now - partition.stored_at[:n] >= self.ttl] = -1.0
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.stats['misses'] += 1
+                return None
+
+            partition.last_used[best] = now
+            self.stats['hits'] += 1
+            self.logger.debug(f"Semantic cache hit for {agent_name}/{task_name} (similarity {scores[best]:.3f})")
+            return partition.responses[best]
+
+    def set(self, agent_name, task_name, content, response, params=None, room=None):
+        """Store a room's response under the embedding of its request"""
+        if room is None:
+            return
+        vector = self._embed(content)
+        if vector is None:
+            return
+
+        key = (room.room_id, agent_name, task_name, params)
+        now = time.time()
+        with self.lock:
+            partition = self.partitions.get(key)
+            if partition is None or partition.vectors.shape[1] != vector.shape[0]:
+                partition = _Partition(self.capacity, vector.shape[0])
+                self.partitions[key] = partition
+                if len(self.partitions) > self.max_partitions:
+                    self.partitions.popitem(last=False)
+            self.partitions.move_to_end(key)
+
+            # Replace an entry for practically the same request instead of
+            # storing a second copy
+            n = partition.count
+            slot = None
+            if n:
+                scores = partition.vectors[:n] @ vector
+                best = int(np.argmax(scores))
+                if scores[best] >= 0.999:
+                    slot = best
+            if slot is None:
+                slot, evicted = partition.slot_for_insert()
+                if evicted:
+                    self.stats['evictions'] += 1
+
+            partition.vectors[slot] = vector
+            partition.responses[slot] = response
+            partition.stored_at[slot] = now
+            partition.last_used[slot] = now
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['partitions'] = len(self.partitions)
+            stats['entries'] = sum(p.count for p in self.partitions.values())
+            return stats
+
+    def clear(self):
+        with self.lock:
+            self.partitions.clear()
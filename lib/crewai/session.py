@@ -1,4 +1,6 @@
 import time
+import heapq
+import itertools
 import threading
 import logging
 import uuid
@@ -6,88 +8,187 @@ import uuid
 class Session:
     """
     Represents a single user session with the bot
+
+    Sessions are compact: attributes live in __slots__, and the id string and
+    the metadata and context dicts are only created when first used.
     """
+    __slots__ = ('user_jid', 'room_jid', 'created_at', 'last_activity', '_id', '_metadata', '_context')
+
     def __init__(self, user_jid, room_jid):
-        self.id = str(uuid.uuid4())
         self.user_jid = user_jid
         self.room_jid = room_jid
-        self.created_at = time.time()
-        self.last_activity = time.time()
-        self.metadata = {}
-        self.context = {}
-    
+        self.created_at = self.last_activity = time.time()
+        self._id = None
+        self._metadata = None
+        self._context = None
+
+    @property
+    def id(self):
+        if self._id is None:
+            self._id = str(uuid.uuid4())
+        return self._id
+
+    @property
+    def metadata(self):
+        if self._metadata is None:
+            self._metadata = {}
+        return self._metadata
+
+    @property
+    def context(self):
+        if self._context is None:
+            self._context = {}
+        return self._context
+
     def update_activity(self):
         """Update last activity timestamp"""
         self.last_activity = time.time()
-    
+
     def is_expired(self, timeout=3600):
         """Check if session is expired based on inactivity"""
         return time.time() - self.last_activity > timeout
 
+class _Stripe:
+    __slots__ = ('sessions', 'deadlines', 'lock')
+
+    def __init__(self):
+        self.sessions = {}
+        self.deadlines = []  # heap of (deadline, sequence, key, session)
+        self.lock = threading.Lock()
+
 class SessionManager:
     """
     Manages user sessions for maintaining context between interactions
+
+    Sessions are spread over lock stripes by key. Looking up a live session
+    takes no lock at all; only creating or removing one locks its stripe.
+
+    Each stripe keeps a heap of expiry deadlines. A session is pushed once
+    when created; activity only updates its timestamp, and when its old
+    deadline comes up it is pushed again with the new one instead of being
+    dropped. The expiry pass therefore only touches sessions whose deadline
+    has passed, never the whole table, and runs from a background thread
+    started with start().
     """
-    def __init__(self, session_timeout=3600):
-        self.sessions = {}
+    def __init__(self, session_timeout=3600, stripes=16):
         self.session_timeout = session_timeout  # Session timeout in seconds
-        self.lock = threading.Lock()
+        self.stripes = [_Stripe() for _ in range(stripes)]
+        self.sequence = itertools.count()
+        self.thread = None
+        self.stopped = threading.Event()
         self.logger = logging.getLogger('session')
-    
+
+    @property
+    def sessions(self):
+        """Snapshot of all sessions, keyed by (user_jid, room_jid)"""
+        sessions = {}
+        for stripe in self.stripes:
+            sessions.update(stripe.sessions)
+        return sessions
+
+    def _stripe(self, key):
+        return self.stripes[hash(key) % len(self.stripes)]
+
     def get_session(self, user_jid, room_jid):
         """Get an existing session or create a new one"""
-        session_key = f"{user_jid}:{room_jid}"
-        
-        with self.lock:
-            # Check if session exists and is not expired
-            if session_key in self.sessions:
-                session = self.sessions[session_key]
-                if not session.is_expired(self.session_timeout):
-                    session.update_activity()
+        session_key = (user_jid, room_jid)
+        stripe = self._stripe(session_key)
+
+        # Lock-free fast path for a live session
+        session = stripe.sessions.get(session_key)
+        now = time.time()
+        if session is not None and now - session.last_activity <= self.session_timeout:
+            session.last_activity = now
+            return session
+
+        with stripe.lock:
+            session = stripe.sessions.get(session_key)
+            if session is not None:
+                if now - session.last_activity <= self.session_timeout:
+                    session.last_activity = now
                     return session
-                else:
-                    # Session expired, remove it
-                    self.logger.debug(f"Session expired for {user_jid} in {room_jid}")
-                    del self.sessions[session_key]
-            
+                # Session expired, remove it
+                self.logger.debug(f"Session expired for {user_jid} in {room_jid}")
+
             # Create new session
             session = Session(user_jid, room_jid)
-            self.sessions[session_key] = session
+            stripe.sessions[session_key] = session
+            heapq.heappush(stripe.deadlines, (now + self.session_timeout, next(self.sequence), session_key, session))
             self.logger.debug(f"Created new session for {user_jid} in {room_jid}")
             return session
-    
+
     def update_session_context(self, user_jid, room_jid, key, value):
         """Update context for a specific session"""
         session = self.get_session(user_jid, room_jid)
-        
-        with self.lock:
+
+        with self._stripe((user_jid, room_jid)).lock:
             session.context[key] = value
             session.update_activity()
-    
+
     def get_session_context(self, user_jid, room_jid, key, default=None):
         """Get context value from a session"""
         session = self.get_session(user_jid, room_jid)
-        return session.context.get(key, default)
-    
+        if session._context is None:
+            return default
+        return session._context.get(key, default)
+
     def clear_session(self, user_jid, room_jid):
         """Clear a specific session"""
-        session_key = f"{user_jid}:{room_jid}"
-        
-        with self.lock:
-            if session_key in self.sessions:
-                del self.sessions[session_key]
+        session_key = (user_jid, room_jid)
+        stripe = self._stripe(session_key)
+
+        with stripe.lock:
+            # Its heap entry is skipped when it comes up
+            if stripe.sessions.pop(session_key, None) is not None:
                 self.logger.debug(f"Cleared session for {user_jid} in {room_jid}")
-    
+
     def cleanup_expired_sessions(self):
-        """Remove all expired sessions"""
-        with self.lock:
-            expired_keys = []
-            for key, session in self.sessions.items():
-                if session.is_expired(self.session_timeout):
-                    expired_keys.append(key)
-            
-            for key in expired_keys:
-                del self.sessions[key]
-            
-            if expired_keys:
-                self.logger.debug(f"Cleaned up {len(expired_keys)} expired sessions") 
\ No newline at end of file
+        """Remove expired sessions whose deadline has passed; returns the count"""
+        now = time.time()
+        removed = 0
+        for stripe in self.stripes:
+            with stripe.lock:
+                deadlines = stripe.deadlines
+                while deadlines and deadlines[0][0] <= now:
+                    _deadline, _sequence, key, session = heapq.heappop(deadlines)
+                    if stripe.sessions.get(key) is not session:
+                        # Cleared or replaced since it was scheduled
+                        continue
+                    deadline = session.last_activity + self.session_timeout
+                    if deadline <= now:
+                        del stripe.sessions[key]
+                        removed += 1
+                    else:
+                        # Active since it was scheduled; follow the new deadline
+                        heapq.heappush(deadlines, (deadline, next(self.sequence), key, session))
+
+        if removed:
+            self.logger.debug(f"Cleaned up {removed} expired sessions")
+        return removed
+
+    def next_deadline(self):
+        """Earliest scheduled expiry, or None without sessions"""
+        deadlines = [stripe.deadlines[0][0] for stripe in self.stripes if stripe.deadlines]
+        return min(deadlines) if deadlines else None
+
+    def start(self, max_interval=60):
+        """Expire sessions from a background thread, waking at the next deadline"""
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.stopped.clear()
+
+        def run():
+            while not self.stopped.is_set():
+                try:
+                    self.cleanup_expired_sessions()
+                except Exception as e:
+                    self.logger.error(f"Error expiring sessions: {e}")
+                deadline = self.next_deadline()
+                wait = max_interval if deadline is None else min(max_interval, max(0.0, deadline - time.time()))
+                self.stopped.wait(wait)
+
+        self.thread = threading.Thread(target=run, name='session-expiry', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
@@ -0,0 +1,58 @@
+import asyncio
+import logging
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight requests on the event loop.
+
+    The first caller for a key (the leader) runs the work; callers arriving
+    while it is still running (followers) await the leader's future instead
+    of starting their own. Nothing is cached once the leader finishes.
+    """
+    def __init__(self):
+        self.inflight = {}
+        self.stats = {
+            'leaders': 0,
+            'coalesced': 0,
+            'errors': 0,
+        }
+        self.logger = logging.getLogger('singleflight')
+
+    async def do(self, key, func):
+        """
+        Run func() once for all concurrent callers with the same key.
+
+        Returns (result, coalesced) where coalesced is True for followers.
+        """
+        future = self.inflight.get(key)
+        if future is not None:
+            self.stats['coalesced'] += 1
+            self.logger.debug(f"Coalesced request for {key!r}")
+            # Shield so a cancelled follower does not cancel the leader's work
+            return await asyncio.shield(future), True
+
+        future = asyncio.get_running_loop().create_future()
+        # Followers retrieve the exception; avoid "never retrieved" warnings
+        # when there are none
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self.inflight[key] = future
+        self.stats['leaders'] += 1
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            self.stats['errors'] += 1
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            del self.inflight[key]
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['in_flight'] = len(self.inflight)
+        return stats
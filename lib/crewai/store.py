@@ -0,0 +1,224 @@
+import os
+import json
+import time
+import heapq
+import sqlite3
+import logging
+import threading
+from collections import defaultdict
+
+from common import storage_dir
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_GRACE_SECONDS = 600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    spec TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS index_artifacts_on_last_access ON artifacts (last_access);
+
+CREATE TABLE IF NOT EXISTS artifact_refs (
+    parent_id TEXT NOT NULL REFERENCES artifacts (id) ON DELETE CASCADE,
+    child_id TEXT NOT NULL,
+    PRIMARY KEY (parent_id, child_id)
+);
+CREATE INDEX IF NOT EXISTS index_artifact_refs_on_child_id ON artifact_refs (child_id);
+
+CREATE TABLE IF NOT EXISTS store_meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO store_meta (key, value) VALUES ('total_bytes', 0);
+
+CREATE TRIGGER IF NOT EXISTS artifacts_size_insert AFTER INSERT ON artifacts BEGIN
+    UPDATE store_meta SET value = value + NEW.size WHERE key = 'total_bytes';
+END;
+CREATE TRIGGER IF NOT EXISTS artifacts_size_delete AFTER DELETE ON artifacts BEGIN
+    UPDATE store_meta SET value = value - OLD.size WHERE key = 'total_bytes';
+END;
+CREATE TRIGGER IF NOT EXISTS artifacts_size_update AFTER UPDATE OF size ON artifacts BEGIN
+    UPDATE store_meta SET value = value - OLD.size + NEW.size WHERE key = 'total_bytes';
+END;
+"""
+
+# Every artifact with the IDs it references, to plan an eviction in one pass
+EVICTION_QUERY = """
+SELECT artifacts.id, artifacts.size, artifacts.last_access, artifacts.created_at, artifact_refs.child_id
+FROM artifacts LEFT JOIN artifact_refs ON artifact_refs.parent_id = artifacts.id
+"""
+
+GRAPH_QUERY = """
+WITH RECURSIVE graph(id) AS (
+    SELECT ?
+    UNION
+    SELECT artifact_refs.child_id FROM artifact_refs JOIN graph ON artifact_refs.parent_id = graph.id
+)
+SELECT artifacts.id, artifacts.kind, artifacts.spec FROM artifacts JOIN graph ON artifacts.id = graph.id
+"""
+
+class ArtifactStore:
+    """
+    Size-bounded SQLite store for agent, task and crew specs.
+
+    Artifacts are stored as JSON specs rather than pickled objects. Tasks and
+    crews reference their agents and tasks by ID, so a shared agent is stored
+    once no matter how many tasks and crews use it, and the LLM client is
+    rebuilt from the shared client cache instead of being copied into every
+    artifact. When the store grows past max_bytes, the least recently used
+    artifacts are evicted and the freed pages are reclaimed. An artifact
+    that another artifact still references is never evicted on its own; it
+    becomes evictable once everything referencing it is gone, so a crew
+    never loses its agents or tasks. Nothing created in the last
+    grace_seconds is evicted either, so an agent or task survives until the
+    task or crew that will reference it has been created.
+    """
+    def __init__(self, path=None, max_bytes=None, grace_seconds=None):
+        self.path = str(path or storage_dir() / "artifacts.sqlite3")
+        if max_bytes is None:
+            max_bytes = int(os.environ.get('CREWAI_STORAGE_MAX_BYTES', DEFAULT_MAX_BYTES))
+        if grace_seconds is None:
+            grace_seconds = float(os.environ.get('CREWAI_STORAGE_GRACE_SECONDS', DEFAULT_GRACE_SECONDS))
+        self.max_bytes = max_bytes
+        self.grace_seconds = grace_seconds
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger('store')
+
+        self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        # auto_vacuum only takes effect on a fresh database, before any table exists
+        self.conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        resync = self.conn.execute(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'table' AND name = 'artifacts'"
+        ).fetchone()[0] and not self.conn.execute(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name = 'artifacts_size_update'"
+        ).fetchone()[0]
+        self.conn.executescript(SCHEMA)
+        if resync:
+            # Stores written before the update trigger existed may have drifted
+            self.conn.execute(
+                "UPDATE store_meta SET value = (SELECT COALESCE(SUM(size), 0) FROM artifacts) WHERE key = 'total_bytes'"
+            )
+
+    def put(self, artifact_id, kind, spec, refs=()):
+        """Store an artifact and the IDs of the artifacts it references"""
+        data = json.dumps(spec)
+        now = time.time()
+
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                # An upsert, so replacing an artifact keeps total_bytes exact
+                self.conn.execute(
+                    "INSERT INTO artifacts (id, kind, spec, size, created_at, last_access) "
+                    "VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (id) DO UPDATE SET kind = excluded.kind, spec = excluded.spec, "
+                    "size = excluded.size, last_access = excluded.last_access",
+                    (artifact_id, kind, data, len(data), now, now)
+                )
+                self.conn.execute("DELETE FROM artifact_refs WHERE parent_id = ?", (artifact_id,))
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO artifact_refs (parent_id, child_id) VALUES (?, ?)",
+                    [(artifact_id, ref) for ref in refs if ref]
+                )
+                evicted = self._evict_locked()
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+            if evicted:
+                self._compact_locked()
+
+    def load(self, artifact_id):
+        """
+        Load an artifact and everything it references in a single query.
+
+        Returns a dict mapping ID to (kind, spec). Missing artifacts are simply
+        absent from the result.
+        """
+        with self.lock:
+            rows = self.conn.execute(GRAPH_QUERY, (artifact_id,)).fetchall()
+            if rows:
+                ids = [row[0] for row in rows]
+                placeholders = ",".join("?" * len(ids))
+                self.conn.execute(
+                    f"UPDATE artifacts SET last_access = ? WHERE id IN ({placeholders})",
+                    [time.time()] + ids
+                )
+
+        return {row[0]: (row[1], json.loads(row[2])) for row in rows}
+
+    def total_bytes(self):
+        """Total size of all stored specs"""
+        with self.lock:
+            return self.conn.execute("SELECT value FROM store_meta WHERE key = 'total_bytes'").fetchone()[0]
+
+    def _evict_locked(self):
+        """Delete least recently used unreferenced artifacts until the store fits its quota"""
+        total = self.conn.execute("SELECT value FROM store_meta WHERE key = 'total_bytes'").fetchone()[0]
+        if total <= self.max_bytes:
+            return 0
+
+        artifacts = {}  # id -> (size, last_access, created_at, referenced ids)
+        holders = defaultdict(int)  # id -> number of artifacts referencing it
+        for artifact_id, size, last_access, created_at, child_id in self.conn.execute(EVICTION_QUERY):
+            entry = artifacts.get(artifact_id)
+            if entry is None:
+                entry = artifacts[artifact_id] = (size, last_access, created_at, [])
+            if child_id is not None:
+                entry[3].append(child_id)
+                holders[child_id] += 1
+
+        cutoff = time.time() - self.grace_seconds
+        candidates = [
+            (last_access, artifact_id) for artifact_id, (_size, last_access, created_at, _refs) in artifacts.items()
+            if not holders[artifact_id] and created_at <= cutoff
+        ]
+        heapq.heapify(candidates)
+        evicted = []
+        while total > self.max_bytes and candidates:
+            _last_access, artifact_id = heapq.heappop(candidates)
+            size, _last_access, _created_at, refs = artifacts[artifact_id]
+            evicted.append((artifact_id,))
+            total -= size
+            # What it referenced may be evictable now, and older than the
+            # remaining candidates
+            for child_id in refs:
+                holders[child_id] -= 1
+                child = artifacts.get(child_id)
+                if not holders[child_id] and child is not None and child[2] <= cutoff:
+                    heapq.heappush(candidates, (child[1], child_id))
+
+        self.conn.executemany("DELETE FROM artifacts WHERE id = ?", evicted)
+        if total > self.max_bytes:
+            self.logger.warning(
+                f"Store is over its {self.max_bytes} byte quota with only referenced or new artifacts left"
+            )
+        if evicted:
+            self.logger.info(f"Evicted {len(evicted)} artifacts to stay under {self.max_bytes} bytes")
+        return len(evicted)
+
+    def _compact_locked(self):
+        """Return pages freed by eviction to the filesystem"""
+        try:
+            self.conn.execute("PRAGMA incremental_vacuum").fetchall()
+        except sqlite3.Error as e:
+            self.logger.warning(f"Compaction failed: {e}")
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    """Return the process-wide artifact store"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ArtifactStore()
+        return _store
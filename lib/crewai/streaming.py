@@ -0,0 +1,87 @@
+import time
+import uuid
+import logging
+
+class StreamPublisher:
+    """
+    Delivers a reply to a MUC room while it is still being generated.
+
+    Text is fed in as it arrives and flushed at most once per interval. In
+    'correct' mode the first flush sends a message and later flushes replace
+    it with XEP-0308 last message corrections, so the room sees one message
+    that grows. In 'chunks' mode each flush sends the new text as its own
+    message, cut at the last whitespace so words are not split.
+    """
+    def __init__(self, xmpp, room_jid, mode='correct', interval=1.0, min_chars=20):
+        self.xmpp = xmpp
+        self.room_jid = room_jid
+        self.mode = mode
+        self.interval = interval
+        self.min_chars = min_chars
+        self.parts = []
+        self.length = 0
+        self.sent = 0  # characters delivered so far
+        self.message_id = None
+        self.last_flush = time.monotonic()
+        self.flushes = 0
+        self.logger = logging.getLogger('streaming')
+
+    def feed(self, text):
+        """Add newly generated text, flushing if the interval has passed"""
+        if not text:
+            return
+        self.parts.append(text)
+        self.length += len(text)
+        if self.length - self.sent >= self.min_chars and time.monotonic() - self.last_flush >= self.interval:
+            self._flush(final=False)
+
+    def text(self):
+        if len(self.parts) > 1:
+            self.parts = ["".join(self.parts)]
+        return self.parts[0] if self.parts else ""
+
+    def finish(self, text=None):
+        """
+        Deliver whatever has not been sent yet; returns the full text. A
+        final text that differs from the generated one replaces it: as the
+        last correction, or in 'chunks' mode as one message of its own.
+        """
+        if text is not None and text != self.text():
+            self.parts = [text]
+            self.length = len(text)
+            if self.mode == 'chunks':
+                self.sent = 0
+        # A correction always goes out, to drop the "still typing" ellipsis
+        if self.mode != 'chunks' or self.length > self.sent:
+            self._flush(final=True)
+        return self.text()
+
+    def _flush(self, final):
+        text = self.text()
+        if not text:
+            return
+        if self.mode == 'chunks':
+            end = len(text)
+            if not final:
+                # Hold back the partial word at the end
+                cut = max(text.rfind(' ', self.sent), text.rfind('\n', self.sent))
+                if cut <= self.sent:
+                    return
+                end = cut + 1
+            chunk = text[self.sent:end].strip()
+            if chunk:
+                self.xmpp.send_message(mto=self.room_jid, mbody=chunk, mtype='groupchat')
+            self.sent = end
+        else:
+            message = self.xmpp.make_message(mto=self.room_jid, mbody=text if final else text + " …", mtype='groupchat')
+            if self.message_id is not None:
+                message['replace']['id'] = self.message_id
+            # Corrections must name the id of the message they replace, which
+            # is the first one sent
+            message['id'] = uuid.uuid4().hex
+            if self.message_id is None:
+                self.message_id = message['id']
+            message.send()
+            self.sent = len(text)
+        self.flushes += 1
+        self.last_flush = time.monotonic()
@@ -0,0 +1,190 @@
+import os
+import time
+import queue
+import logging
+import threading
+
+from .crypto import get_decryption_stage
+from .llm import llm_lease
+from .writebehind import get_writer, write_behind_enabled
+
+LOAD_SUMMARY_SQL = (
+    "SELECT encrypted_summary, watermark_created_at, watermark_message_id "
+    "FROM chat_room_summaries WHERE room_id = %s"
+)
+# Stops below the oldest row still buffered by the write-behind writer, so
+# the watermark never moves past a row that is yet to be inserted
+LOAD_UNSUMMARIZED_SQL = (
+    "SELECT id, created_at, encrypted_content FROM chat_messages WHERE room_id = %s "
+    "AND (%s IS NULL OR (created_at, id) > (%s, %s)) "
+    "AND (%s IS NULL OR (created_at, id) < (%s, %s)) ORDER BY created_at ASC, id ASC LIMIT %s"
+)
+SAVE_SUMMARY_SQL = (
+    "INSERT INTO chat_room_summaries "
+    "(room_id, encrypted_summary, watermark_created_at, watermark_message_id, created_at, updated_at) "
+    "VALUES (%s, %s, %s, %s, now(), now()) "
+    "ON CONFLICT (room_id) DO UPDATE SET encrypted_summary = EXCLUDED.encrypted_summary, "
+    "watermark_created_at = EXCLUDED.watermark_created_at, "
+    "watermark_message_id = EXCLUDED.watermark_message_id, updated_at = now()"
+)
+
+FOLD_PROMPT = """
+Update the running summary of a conversation with the new messages below.
+Keep it concise, focus on key points and preserve important information
+such as decisions, names, dates and open questions.
+
+Current summary:
+{summary}
+
+New messages:
+{messages}
+
+Updated summary:
+"""
+
+class RoomSummarizer:
+    """
+    Maintains a stored rolling summary per room, off the request path.
+
+    The summary is kept in chat_room_summaries together with a watermark, the
+    (created_at, id) key of the newest message folded into it. Requests only
+    read the cached summary and ask for a fold; a background thread folds the
+    messages newer than the watermark into the summary, keeping the newest
+    keep_recent messages out so they stay verbatim in the prompt.
+    """
+    def __init__(self, pool, batch_size=None, keep_recent=None, min_interval=None):
+        self.pool = pool
+        self.batch_size = batch_size or int(os.environ.get('CREWAI_SUMMARY_BATCH', 200))
+        self.keep_recent = keep_recent if keep_recent is not None else int(os.environ.get('CREWAI_SUMMARY_KEEP_RECENT', 20))
+        self.min_interval = min_interval if min_interval is not None else float(os.environ.get('CREWAI_SUMMARY_INTERVAL', 60))
+        self.summaries = {}  # room_id -> (summary, watermark)
+        self.pending = set()
+        self.last_fold = {}
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.decryption = get_decryption_stage()
+        self.writer = get_writer(pool) if write_behind_enabled() else None
+        self.logger = logging.getLogger('summarizer')
+
+    def get(self, room_id, fernet):
+        """
+        Return (summary, watermark) for a room, or (None, None) if there is none.
+
+        Never calls the LLM; at most reads the stored row once per room.
+        """
+        with self.lock:
+            cached = self.summaries.get(room_id)
+        if cached is not None:
+            return cached
+
+        summary, watermark = None, None
+        with self.pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(LOAD_SUMMARY_SQL, (room_id,))
+                row = cursor.fetchone()
+        if row is not None:
+            summary = fernet.decrypt(bytes(row[0])).decode()
+            watermark = (row[1], row[2]) if row[1] is not None else None
+
+        with self.lock:
+            self.summaries.setdefault(room_id, (summary, watermark))
+            return self.summaries[room_id]
+
+    def request(self, room_id, fernet):
+        """Ask the background thread to fold new messages for a room"""
+        with self.lock:
+            if room_id in self.pending:
+                return
+            if time.monotonic() - self.last_fold.get(room_id, 0) < self.min_interval:
+                return
+            self.pending.add(room_id)
+            self._ensure_thread()
+        self.queue.put((room_id, fernet))
+
+    def _ensure_thread(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self._run, name='summarizer', daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        while True:
+            room_id, fernet = self.queue.get()
+            try:
+                self.fold(room_id, fernet)
+            except Exception as e:
+                self.logger.error(f"Failed to summarize room {room_id}: {e}")
+            finally:
+                with self.lock:
+                    self.pending.discard(room_id)
+                    self.last_fold[room_id] = time.monotonic()
+
+    def fold(self, room_id, fernet):
+        """Fold messages newer than the watermark into the room's summary"""
+        summary, watermark = self.get(room_id, fernet)
+        created_at, message_id = watermark or (None, None)
+        horizon = self.writer.oldest_unflushed(room_id) if self.writer is not None else None
+        before_at, before_id = horizon or (None, None)
+
+        with self.pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    LOAD_UNSUMMARIZED_SQL,
+                    (room_id, created_at, created_at, message_id, before_at, before_at, before_id,
+                     self.batch_size + self.keep_recent)
+                )
+                rows = cursor.fetchall()
+
+        # Leave the newest messages for the verbatim tail
+        rows = rows[:max(0, len(rows) - self.keep_recent)]
+        if not rows:
+            return
+
+        texts, _failures = self.decryption.decrypt_batch(
+            fernet, (row[2] for row in rows), label=f"room {room_id}"
+        )
+        prompt = FOLD_PROMPT.format(summary=summary or "(none yet)", messages="\n".join(texts))
+
+        started = time.monotonic()
+        with llm_lease(
+            model=summary_model(),
+            temperature=0.3  # Lower temperature for more factual summary
+        ) as summarizer:
+            response = summarizer.invoke(prompt)
+        new_summary = response.content.strip()
+        new_watermark = (rows[-1][1], rows[-1][0])
+
+        with self.pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    SAVE_SUMMARY_SQL,
+                    (room_id, fernet.encrypt(new_summary.encode()), new_watermark[0], new_watermark[1])
+                )
+            conn.commit()
+
+        with self.lock:
+            self.summaries[room_id] = (new_summary, new_watermark)
+        self.logger.info(
+            f"Folded {len(rows)} messages into summary for room {room_id} in {time.monotonic() - started:.1f}s"
+        )
+
+    def forget(self, room_id):
+        """Drop the cached summary, e.g. after the room history was cleared"""
+        with self.lock:
+            self.summaries.pop(room_id, None)
+
+def summary_model():
+    """Model used to fold history into room summaries"""
+    return os.environ.get('CREWAI_SUMMARY_MODEL', 'phi3:mini')
+
+_summarizers = {}
+_summarizers_lock = threading.Lock()
+
+def get_summarizer(pool):
+    """Return the process-wide summarizer for a connection pool"""
+    with _summarizers_lock:
+        summarizer = _summarizers.get(id(pool))
+        if summarizer is None:
+            summarizer = RoomSummarizer(pool)
+            _summarizers[id(pool)] = summarizer
+        return summarizer
@@ -0,0 +1,36 @@
+import os
+
+import pytest
+
+pytest.importorskip('slixmpp')
+pytest.importorskip('crewai')
+pytest.importorskip('langchain_ollama')
+
+from lib.crewai import llm
+from lib.crewai.xmpp_bot import TrueColorsBot
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+@pytest.fixture
+def default_env(monkeypatch):
+    for name in list(os.environ):
+        if name.startswith('CREWAI_') or name.startswith('OLLAMA_'):
+            monkeypatch.delenv(name)
+    # The bot reads config/agents.yaml and config/tasks.yaml from the repository root
+    monkeypatch.chdir(REPO_ROOT)
+    yield
+    llm._timing_listeners.clear()
+
+def test_constructs_with_default_settings(default_env):
+    # The pool connects lazily, so no database is needed to build the bot
+    bot = TrueColorsBot('bot@example.com', 'secret', 'postgresql://localhost/unused')
+
+    assert bot.models is not None
+    assert bot.models.pool is bot.llm_endpoints
+    assert bot.models.models == sorted(bot.routing.models() | {'phi3:mini'})
+    assert 'models' in bot.metrics.collectors
+
+    bot.models.on_load('phi3:mini', bot.llm_endpoints.endpoints[0].url, 3.5, True)
+    bot.models.on_load('phi3:mini', bot.llm_endpoints.endpoints[0].url, 0.002, False)
+    assert bot.metrics.get_operation('model_load')['count'] == 1
+    assert bot.metrics.get_operation('model_keepalive')['count'] == 1
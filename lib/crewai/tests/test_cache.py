@@ -0,0 +1,53 @@
+from types import SimpleNamespace
+
+from lib.crewai.cache import ResponseCache
+
+ROOM_A = SimpleNamespace(room_id=1)
+ROOM_B = SimpleNamespace(room_id=2)
+PARAMS = ('phi3:mini', 0.7, 0.9, 1024)
+
+def test_responses_are_scoped_to_their_room():
+    cache = ResponseCache()
+    cache.set('planner', 'default', 'what did we decide?', 'ROOM A PRIVATE ANSWER', PARAMS, ROOM_A)
+
+    assert cache.get('planner', 'default', 'what did we decide?', PARAMS, ROOM_A) == 'ROOM A PRIVATE ANSWER'
+    assert cache.get('planner', 'default', 'what did we decide?', PARAMS, ROOM_B) is None
+    assert cache.get('planner', 'default', 'what did we decide?', PARAMS) is None
+
+def test_uncached_without_a_room():
+    cache = ResponseCache()
+    cache.set('planner', 'default', 'hello', 'answer', PARAMS)
+
+    assert cache.get('planner', 'default', 'hello', PARAMS) is None
+    assert cache.get_stats()['entries'] == 0
+
+class FakeTier:
+    """Stands in for PostgresCacheTier: entries stored per room id"""
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, key, room):
+        return self.entries.get((room.room_id, key))
+
+    def set(self, key, room, response):
+        self.entries[(room.room_id, key)] = response
+
+def test_l2_hit_fills_only_that_rooms_l1():
+    l2 = FakeTier()
+    ResponseCache(l2=l2).set('planner', 'default', 'hello', 'room a answer', PARAMS, ROOM_A)
+
+    # A fresh process: empty L1, shared L2
+    cache = ResponseCache(l2=l2)
+    assert cache.get('planner', 'default', 'hello', PARAMS, ROOM_A) == 'room a answer'
+    assert cache.get_stats()['l2_hits'] == 1
+
+    cache.l2 = None
+    assert cache.get('planner', 'default', 'hello', PARAMS, ROOM_A) == 'room a answer'
+    assert cache.get('planner', 'default', 'hello', PARAMS, ROOM_B) is None
+
+def test_normalized_content_shares_an_entry():
+    cache = ResponseCache()
+    cache.set('planner', 'default', 'Plan a  bake sale', 'answer', PARAMS, ROOM_A)
+
+    assert cache.get('planner', 'default', 'plan a bake sale', PARAMS, ROOM_A) == 'answer'
+    assert cache.get('planner', 'default', 'plan a bake sale', ('phi3', 0.7, 0.9, 1024), ROOM_A) is None
@@ -0,0 +1,25 @@
+from lib.crewai.commands import Command, CommandDispatcher
+
+def dispatcher():
+    return CommandDispatcher(['planner', 'writer'])
+
+def test_parses_agent_task_and_content():
+    assert dispatcher().parse("@planner trip  plan a week in Lisbon \n") == Command('planner', 'trip', "plan a week in Lisbon")
+    assert dispatcher().parse("@writer\tpoem\tabout tea") == Command('writer', 'poem', "about tea")
+
+def test_task_defaults_when_missing():
+    assert dispatcher().parse("@writer") == Command('writer', CommandDispatcher.DEFAULT_TASK, "")
+
+def test_colon_and_comma_forms_address_the_agent():
+    # The separator must be followed by whitespace, as after '@planner'
+    assert dispatcher().parse("@planner: trip Lisbon") == Command('planner', 'trip', "Lisbon")
+    assert dispatcher().parse("@planner, trip Lisbon") == Command('planner', 'trip', "Lisbon")
+    assert dispatcher().parse("@planner:trip Lisbon") is None
+
+def test_leading_whitespace_is_ignored():
+    assert dispatcher().parse("  @planner trip") == Command('planner', 'trip', "")
+
+def test_other_messages_are_not_commands():
+    commands = dispatcher()
+    for body in ("", "hello @planner", "  hello", "@plannerx trip", "@someone hi", "@", "planner trip"):
+        assert commands.parse(body) is None, body
@@ -0,0 +1,185 @@
+import json
+import time
+import threading
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from cryptography.fernet import InvalidToken
+
+from lib.crewai.llm import EndpointPool, ModelManager, add_timing_listener, is_endpoint_error, parse_hours, _timing_listeners
+
+class StubOllama:
+    """Local HTTP server answering /api/tags and /api/generate with a settable status"""
+    def __init__(self):
+        self.status = 200
+        self.hits = 0
+        self.load_duration = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _answer(self):
+                if self.path == '/api/generate':
+                    stub.hits += 1
+                body = json.dumps({'load_duration': stub.load_duration}).encode()
+                self.send_response(stub.status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = _answer
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                self._answer()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.fixture
+def stubs():
+    servers = [StubOllama(), StubOllama()]
+    yield servers
+    for server in servers:
+        server.close()
+
+def generate(url):
+    request = urllib.request.Request(f"{url}/api/generate", data=b'{}', method='POST')
+    with urllib.request.urlopen(request, timeout=2) as response:
+        return response.read()
+
+def test_routes_to_least_outstanding(stubs):
+    pool = EndpointPool([stub.url for stub in stubs])
+    busy = pool.acquire()
+    # While one endpoint holds a request, the next ones go to the other
+    for _ in range(3):
+        with pool.lease() as endpoint:
+            assert endpoint is not busy
+            generate(endpoint.url)
+    pool.release(busy)
+
+    idle = next(stub for stub in stubs if stub.url != busy.url)
+    assert idle.hits == 3
+    assert pool.get_stats()['hosts'][idle.url]['outstanding'] == 0
+
+def test_ejects_after_three_failures_and_readmits(stubs):
+    pool = EndpointPool([stub.url for stub in stubs], eject_after=3, eject_seconds=60.0)
+    failing, healthy = stubs
+    failing.status = 500
+    target = next(endpoint for endpoint in pool.endpoints if endpoint.url == failing.url)
+
+    # Requests alternate between the two endpoints; the failing one is out
+    # after its third failed request
+    for _ in range(6):
+        try:
+            with pool.lease() as endpoint:
+                generate(endpoint.url)
+        except urllib.error.HTTPError:
+            pass
+    assert target.failures == 3
+    assert not target.available(time.monotonic())
+
+    # Ejected: everything goes to the healthy endpoint
+    for _ in range(4):
+        with pool.lease() as endpoint:
+            assert endpoint.url == healthy.url
+
+    # A failing health check keeps it out, a passing one readmits it
+    assert not pool.check(target)
+    failing.status = 200
+    assert pool.check(target)
+    assert target.failures == 0
+    assert target in (pool.choose(), pool.choose())
+
+def test_request_errors_do_not_count(stubs):
+    pool = EndpointPool([stubs[0].url])
+    endpoint = pool.endpoints[0]
+    for error in (KeyError('no_such_task'), InvalidToken(), ValueError("bad prompt")):
+        with pytest.raises(type(error)):
+            with pool.lease():
+                raise error
+    assert endpoint.failures == 0
+    assert endpoint.outstanding == 0
+
+def test_choose_leaves_counters_alone(stubs):
+    pool = EndpointPool([stubs[0].url])
+    endpoint = pool.endpoints[0]
+    endpoint.failures = 2
+    assert pool.choose() is endpoint
+    assert endpoint.failures == 2
+    assert endpoint.outstanding == 0
+    assert endpoint.requests == 0
+
+def test_is_endpoint_error():
+    assert is_endpoint_error(ConnectionRefusedError())
+    assert is_endpoint_error(TimeoutError())
+    assert not is_endpoint_error(KeyError('task'))
+
+    class ResponseError(Exception):
+        def __init__(self, status_code):
+            self.status_code = status_code
+
+    assert is_endpoint_error(ResponseError(503))
+    assert not is_endpoint_error(ResponseError(400))
+
+    # Wrapped by the caller, as CrewAI does
+    try:
+        try:
+            raise ConnectionResetError()
+        except ConnectionResetError as e:
+            raise RuntimeError("crew failed") from e
+    except RuntimeError as e:
+        assert is_endpoint_error(e)
+
+def test_parse_hours():
+    assert parse_hours(None) is None
+    assert parse_hours('7-23') == (7, 23)
+    assert parse_hours('22-6') == (22, 6)
+    assert parse_hours('0-24') == (0, 24)
+    for spec in ('7', '7-', 'a-b', '7-23-1', '25-3', '7-25'):
+        with pytest.raises(ValueError, match='CREWAI_MODEL_HOURS'):
+            parse_hours(spec)
+
+def test_pings_are_not_loads(stubs):
+    loads = []
+    pool = EndpointPool([stubs[0].url])
+    models = ModelManager(['phi3:mini'], pool=pool, hours=(0, 24), on_load=lambda *args: loads.append(args))
+
+    stubs[0].load_duration = int(4.5e9)  # cold load
+    models.load_all()
+    stubs[0].load_duration = int(2e6)  # still resident
+    models.load_all()
+
+    assert [(seconds, cold) for _, _, seconds, cold in loads] == [(4.5, True), (0.002, False)]
+    stats = models.get_stats()
+    assert (stats['loads'], stats['pings'], stats['last_load_seconds']) == (1, 1, 4.5)
+
+def test_timing_listener_sees_every_reply():
+    pytest.importorskip('langchain_core')
+    from uuid import uuid4
+    from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+    from langchain_core.outputs import ChatGeneration, LLMResult
+    from lib.crewai.llm import _get_timings_handler
+
+    seen = []
+    add_timing_listener(lambda metadata, prompt_text: seen.append((metadata, prompt_text)))
+    try:
+        handler = _get_timings_handler()
+        run_id = uuid4()
+        handler.on_chat_model_start({}, [[SystemMessage("be brief"), HumanMessage("hi")]], run_id=run_id)
+        generation = ChatGeneration(message=AIMessage("hello"), generation_info={'load_duration': 5, 'prompt_eval_count': 4})
+        handler.on_llm_end(LLMResult(generations=[[generation]]), run_id=run_id)
+    finally:
+        _timing_listeners.clear()
+    assert seen == [({'load_duration': 5, 'prompt_eval_count': 4}, "be briefhi")]
@@ -0,0 +1,69 @@
+import math
+
+import pytest
+
+from lib.crewai.metrics import Histogram, Metrics
+
+def test_histogram_buckets_are_log_spaced():
+    histogram = Histogram(min_value=0.001, max_value=10.0, growth=2.0)
+    assert histogram.index(0.0005) == 0
+    assert histogram.index(0.001) == 0
+    # Exact bounds stay in their own bucket
+    assert histogram.index(0.002) == 1
+    assert histogram.index(0.0021) == 2
+    assert histogram.index(1000.0) == histogram.size  # overflow
+
+def test_quantiles_are_within_one_bucket():
+    histogram = Histogram()
+    values = [0.001 * 1.1 ** i for i in range(100)]
+    for value in values:
+        histogram.record(value)
+
+    for q in (0.5, 0.9, 0.99):
+        exact = sorted(values)[math.ceil(q * len(values)) - 1]
+        assert exact <= histogram.quantile(q) <= exact * histogram.growth
+    assert histogram.quantile(1.0) == max(values)
+    assert histogram.count == 100
+    assert histogram.sum == pytest.approx(sum(values))
+
+def test_quantile_of_empty_histogram():
+    assert Histogram().quantile(0.5) == 0.0
+
+def test_cumulative_counts_only_grow():
+    histogram = Histogram()
+    for value in (0.0002, 0.01, 0.01, 0.5, 2.0):
+        histogram.record(value)
+    counts = [seen for _bound, seen in histogram.cumulative()]
+    assert counts == sorted(counts)
+    assert counts[-1] == 5
+
+def test_operations_track_errors():
+    metrics = Metrics()
+    metrics.record_time('crew_kickoff', 1.0)
+    metrics.record_time('crew_kickoff', 3.0, error=True)
+
+    operation = metrics.get_operation('crew_kickoff')
+    assert (operation['count'], operation['errors'], operation['error_rate']) == (2, 1, 0.5)
+    assert operation['avg'] == 2.0
+    assert operation['max'] == 3.0
+    assert metrics.get_operation('missing') is None
+
+def test_prometheus_export():
+    metrics = Metrics()
+    metrics.increment_request()
+    metrics.record_time('cache lookup', 0.01, error=True)
+    metrics.increment('cache-hits', 3)
+    metrics.add_collector('pool', lambda: {'size': 4, 'healthy': True, 'name': 'db'})
+    metrics.add_collector('broken', lambda: 1 / 0)
+
+    text = metrics.render_prometheus()
+    lines = text.splitlines()
+    assert "crewai_requests_total 1" in lines
+    assert 'crewai_operation_duration_seconds_bucket{operation="cache lookup",le="+Inf"} 1' in lines
+    assert 'crewai_operation_duration_seconds_count{operation="cache lookup"} 1' in lines
+    assert 'crewai_operation_errors_total{operation="cache lookup"} 1' in lines
+    assert "crewai_cache_hits_total 3" in lines
+    assert "crewai_pool_size 4" in lines
+    # Only numbers are exported, and a failing collector is skipped
+    assert not any(line.startswith("crewai_pool_healthy") or line.startswith("crewai_pool_name") for line in lines)
+    assert not any(line.startswith("crewai_broken") for line in lines)
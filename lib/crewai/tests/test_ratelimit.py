@@ -0,0 +1,71 @@
+from lib.crewai.ratelimit import Limit, RateLimiter
+
+class Clock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+def test_tiers_refill_with_time():
+    clock = Clock()
+    limiter = RateLimiter(user=Limit(rate=1.0, burst=2), room=Limit(rate=1.0, burst=3), clock=clock)
+
+    assert limiter.check('alice', 'room') is None
+    assert limiter.check('alice', 'room') is None
+    assert limiter.check('alice', 'room') == 'user'
+    assert limiter.check('bob', 'room') is None
+    # The room is out before bob is
+    assert limiter.check('bob', 'room') == 'room'
+
+    clock.now = 1.0
+    assert limiter.allow('alice', 'room')
+    stats = limiter.get_stats()
+    assert (stats['allowed'], stats['limited_user'], stats['limited_room']) == (4, 1, 1)
+
+def test_global_tier_is_checked_first():
+    clock = Clock()
+    limiter = RateLimiter(user=Limit(rate=1.0, burst=5), global_limit=Limit(rate=1.0, burst=1), clock=clock)
+    assert limiter.check('alice') is None
+    assert limiter.check('bob') == 'global'
+
+def test_idle_buckets_expire_once_full():
+    clock = Clock()
+    limiter = RateLimiter(user=Limit(rate=1.0, burst=2), tick=1.0, slots=8, clock=clock)
+    limiter.check('alice')
+
+    # One token short, full again at t=1
+    clock.now = 0.5
+    limiter._advance(clock())
+    assert limiter.get_stats()['buckets'] == 1
+    clock.now = 1.0
+    limiter._advance(clock())
+    assert limiter.get_stats()['buckets'] == 0
+    assert limiter.get_stats()['expired'] == 1
+
+def test_deadlines_past_one_revolution_wrap_around():
+    clock = Clock()
+    # Four one-second slots, and a bucket that takes 10s to refill
+    limiter = RateLimiter(user=Limit(rate=0.1, burst=2), tick=1.0, slots=4, clock=clock)
+    limiter.check('alice')
+
+    # Activity at t=5 moves the deadline out to 20s
+    clock.now = 5.0
+    limiter.check('alice')
+    for now in range(6, 20):
+        limiter._advance(float(now))
+        assert ('user', 'alice') in limiter.buckets, now
+    limiter._advance(20.0)
+    assert ('user', 'alice') not in limiter.buckets
+
+def test_long_pause_visits_every_slot_once():
+    clock = Clock()
+    limiter = RateLimiter(user=Limit(rate=1.0, burst=1), tick=1.0, slots=4, clock=clock)
+    for user in ('alice', 'bob', 'carol'):
+        limiter.check(user)
+
+    clock.now = 1000.0
+    assert limiter.check('dave') is None
+    assert limiter.current_tick == 1000
+    stats = limiter.get_stats()
+    assert (stats['expired'], stats['buckets']) == (3, 1)
@@ -0,0 +1,78 @@
+from cryptography.fernet import Fernet
+
+from lib.crewai.rooms import RoomRegistry
+
+KEY_A = Fernet.generate_key().decode()
+KEY_B = Fernet.generate_key().decode()
+
+class Events:
+    def __init__(self):
+        self.joined = []
+        self.left = []
+
+    def registry(self):
+        return RoomRegistry(
+            on_added=lambda room: self.joined.append(room.room_jid),
+            on_removed=lambda room: self.left.append(room.room_jid)
+        )
+
+class FailingConnection:
+    notifies = []
+    closed = False
+
+    def fileno(self):
+        return 42
+
+    def poll(self):
+        raise OSError("server closed the connection unexpectedly")
+
+    def close(self):
+        self.closed = True
+
+class FakeLoop:
+    def __init__(self):
+        self.readers = {}
+
+    def add_reader(self, fd, callback):
+        self.readers[fd] = callback
+
+    def remove_reader(self, fd):
+        self.readers.pop(fd, None)
+
+def test_load_resyncs_added_rekeyed_and_removed_rooms():
+    events = Events()
+    rooms = events.registry()
+    rooms.load([(1, 'a@muc', KEY_A), (2, 'b@muc', KEY_A)])
+    old_fernet = rooms.get('a@muc').fernet
+
+    rooms.load([(1, 'a@muc', KEY_B), (3, 'c@muc', KEY_A)])
+
+    assert rooms.get('a@muc').fernet is not old_fernet
+    assert rooms.get('b@muc') is None
+    assert rooms.get_by_id(3).room_jid == 'c@muc'
+    assert events.joined == ['a@muc', 'b@muc', 'c@muc']
+    assert events.left == ['b@muc']
+
+def test_changed_jid_leaves_old_muc_and_joins_new():
+    events = Events()
+    rooms = events.registry()
+    rooms.add(1, 'old@muc', KEY_A)
+    rooms.add(1, 'new@muc', KEY_A)
+
+    assert rooms.get('old@muc') is None
+    assert rooms.get('new@muc').room_id == 1
+    assert events.joined == ['old@muc', 'new@muc']
+    assert events.left == ['old@muc']
+
+def test_failed_listener_is_closed_and_reported():
+    rooms = RoomRegistry()
+    conn, loop = FailingConnection(), FakeLoop()
+    disconnects = []
+    rooms.listen(conn, loop, on_disconnect=lambda: disconnects.append(True))
+
+    loop.readers[42]()
+
+    assert disconnects == [True]
+    assert conn.closed
+    assert loop.readers == {}
+    assert rooms.listen_conn is None
@@ -0,0 +1,59 @@
+import pytest
+
+from lib.crewai.routing import Route, RoutingPolicy
+
+class FakeAgents:
+    """The parts of AgentRegistry that RoutingPolicy reads"""
+    def __init__(self, agent_configs):
+        self.agent_configs = agent_configs
+
+    def params(self, name):
+        config = self.agent_configs[name]
+        return (config.get('model', 'llama3'), 0.7, 0.9, config.get('max_tokens', 1024))
+
+AGENTS = {
+    'planner': {
+        'context_tokens': 2000,
+        'routes': [
+            {'name': 'short', 'max_prompt_tokens': 40, 'max_tokens': 256},
+            {'name': 'busy', 'min_queue_depth': 4, 'model': 'phi3:mini', 'context_tokens': 800},
+        ],
+    },
+    'writer': {'model': 'mistral'},
+}
+
+TASKS = {
+    'summarize': {'routes': [{'agents': ['planner'], 'model': 'qwen2', 'temperature': 0.2}]},
+    'default': {},
+}
+
+@pytest.fixture
+def policy():
+    return RoutingPolicy(FakeAgents(AGENTS), TASKS)
+
+def test_without_a_matching_rule_the_agent_settings_apply(policy):
+    assert policy.route('planner', 'default', 100) == Route('llama3', 0.7, 0.9, 1024, 2000, None)
+    assert policy.route('writer', 'unknown_task', 10).model == 'mistral'
+
+def test_first_matching_agent_rule_wins(policy):
+    # Both rules match; only the first one applies
+    route = policy.route('planner', 'default', 20, queue_depth=5)
+    assert (route.rule, route.max_tokens, route.model) == ('short', 256, 'llama3')
+
+    route = policy.route('planner', 'default', 100, queue_depth=5)
+    assert (route.rule, route.model, route.context_tokens) == ('busy', 'phi3:mini', 800)
+
+def test_task_rule_applies_on_top_of_agent_rule(policy):
+    route = policy.route('planner', 'summarize', 20)
+    assert route == Route('qwen2', 0.2, 0.9, 256, 2000, 'task_summarize_0')
+    assert route.params == ('qwen2', 0.2, 0.9, 256)
+    # The task rule is limited to the planner
+    assert policy.route('writer', 'summarize', 20).model == 'mistral'
+
+def test_models_lists_every_routable_model(policy):
+    assert policy.models() == {'llama3', 'mistral', 'phi3:mini', 'qwen2'}
+
+def test_unknown_settings_are_rejected():
+    agents = FakeAgents({'planner': {'routes': [{'max_prompt_token': 40, 'model': 'phi3:mini'}]}})
+    with pytest.raises(ValueError, match='agent_planner_0: max_prompt_token'):
+        RoutingPolicy(agents, {})
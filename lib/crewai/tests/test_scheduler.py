@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+
+from lib.crewai import scheduler
+from lib.crewai.scheduler import RequestScheduler, SchedulerFull
+
+def noop():
+    async def run():
+        pass
+    return run()
+
+def drain(requests):
+    """Rooms in the order the scheduler would run their queued jobs"""
+    order = []
+    while requests.queued:
+        order.append(requests._next_job().room)
+    return order
+
+def test_rooms_are_served_round_robin():
+    requests = RequestScheduler(max_queue=20, max_per_room=10)
+    for _ in range(3):
+        requests.submit('busy', noop)
+    requests.submit('quiet', noop)
+    requests.submit('other', noop)
+
+    assert drain(requests) == ['busy', 'quiet', 'other', 'busy', 'busy']
+    assert requests.get_stats()['rooms_waiting'] == 0
+
+def test_higher_priority_runs_first():
+    requests = RequestScheduler()
+    requests.submit('a', noop)
+    requests.submit('b', noop, priority=5)
+    requests.submit('c', noop, priority=1)
+    assert drain(requests) == ['b', 'c', 'a']
+
+def test_positions_account_for_round_robin():
+    requests = RequestScheduler()
+    assert requests.submit('a', noop) == 1
+    assert requests.submit('a', noop) == 2
+    # One job from 'a' runs before it, then it is next
+    assert requests.submit('b', noop) == 2
+    assert requests.submit('c', noop, priority=1) == 1
+
+def test_queue_limits():
+    requests = RequestScheduler(max_queue=3, max_per_room=2)
+    requests.submit('a', noop)
+    requests.submit('a', noop)
+    with pytest.raises(SchedulerFull):
+        requests.submit('a', noop)
+    requests.submit('b', noop)
+    with pytest.raises(SchedulerFull):
+        requests.submit('c', noop)
+    assert requests.get_stats()['rejected'] == 2
+
+    requests._next_job()
+    requests.submit('c', noop)
+
+def test_workers_run_jobs_and_report_waits(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(scheduler.time, 'monotonic', lambda: now[0])
+    waits = []
+    ran = []
+
+    async def main():
+        requests = RequestScheduler(workers=1, on_wait=waits.append)
+
+        def job(name, fail=False):
+            async def run():
+                ran.append(name)
+                if fail:
+                    raise RuntimeError(name)
+            return run
+
+        requests.submit('a', job('first'))
+        now[0] += 2.5
+        requests.submit('a', job('second', fail=True))
+        now[0] += 1.0
+        requests.start()
+        while requests.queued or requests.running:
+            await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        await requests.stop()
+        return requests.get_stats()
+
+    stats = asyncio.run(main())
+    assert ran == ['first', 'second']
+    assert waits == [3.5, 1.0]
+    assert (stats['completed'], stats['failed'], stats['queued'], stats['running']) == (1, 1, 0, 0)
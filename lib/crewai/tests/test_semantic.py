@@ -0,0 +1,139 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from lib.crewai import semantic
+from lib.crewai.llm import EndpointPool
+from lib.crewai.semantic import HashingEmbedder, OllamaEmbedder, SemanticCache
+
+ROOM_A = SimpleNamespace(room_id=1)
+ROOM_B = SimpleNamespace(room_id=2)
+PARAMS = ('phi3:mini', 0.7, 0.9, 1024)
+
+QUESTION = "how do we plan a bake sale for saturday"
+PARAPHRASE = "how do we plan a bake sale on saturday"
+UNRELATED = "summarize the zoning rules for street murals"
+
+def similarity(a, b):
+    vectors = HashingEmbedder().embed([a, b])
+    return float(vectors[0] @ vectors[1])
+
+def test_hashing_embedder_is_deterministic_and_normalized():
+    first = HashingEmbedder().embed([QUESTION, UNRELATED])
+    second = HashingEmbedder().embed([QUESTION, UNRELATED])
+
+    assert np.array_equal(first, second)
+    assert np.allclose(np.linalg.norm(first, axis=1), 1.0)
+    assert similarity(QUESTION, PARAPHRASE) > similarity(QUESTION, UNRELATED)
+
+def test_hit_at_or_above_threshold_and_miss_below():
+    score = similarity(QUESTION, PARAPHRASE)
+
+    cache = SemanticCache(HashingEmbedder(), threshold=score - 0.01)
+    cache.set('planner', 'default', QUESTION, 'bake sale plan', PARAMS, ROOM_A)
+    assert cache.get('planner', 'default', PARAPHRASE, PARAMS, ROOM_A) == 'bake sale plan'
+    assert cache.get('planner', 'default', UNRELATED, PARAMS, ROOM_A) is None
+
+    strict = SemanticCache(HashingEmbedder(), threshold=score + 0.01)
+    strict.set('planner', 'default', QUESTION, 'bake sale plan', PARAMS, ROOM_A)
+    assert strict.get('planner', 'default', PARAPHRASE, PARAMS, ROOM_A) is None
+    assert strict.get('planner', 'default', QUESTION, PARAMS, ROOM_A) == 'bake sale plan'
+
+    stats = strict.get_stats()
+    assert (stats['hits'], stats['misses']) == (1, 1)
+
+def test_answers_stay_in_their_room():
+    cache = SemanticCache(HashingEmbedder(), threshold=0.5)
+    cache.set('planner', 'default', QUESTION, 'ROOM A PRIVATE ANSWER', PARAMS, ROOM_A)
+
+    assert cache.get('planner', 'default', PARAPHRASE, PARAMS, ROOM_B) is None
+    assert cache.get('planner', 'default', PARAPHRASE, PARAMS) is None
+    cache.set('planner', 'default', QUESTION, 'no room', PARAMS)
+    assert cache.get_stats()['entries'] == 1
+
+def test_capacity_evicts_least_recently_used():
+    cache = SemanticCache(HashingEmbedder(), threshold=0.99, capacity=2)
+    cache.set('planner', 'default', 'first question about parking', 'one', PARAMS, ROOM_A)
+    cache.set('planner', 'default', 'second question about catering', 'two', PARAMS, ROOM_A)
+    # Touch the first so the second is the least recently used
+    assert cache.get('planner', 'default', 'first question about parking', PARAMS, ROOM_A) == 'one'
+    cache.set('planner', 'default', 'third question about volunteers', 'three', PARAMS, ROOM_A)
+
+    assert cache.get('planner', 'default', 'first question about parking', PARAMS, ROOM_A) == 'one'
+    assert cache.get('planner', 'default', 'second question about catering', PARAMS, ROOM_A) is None
+    assert cache.get('planner', 'default', 'third question about volunteers', PARAMS, ROOM_A) == 'three'
+    assert cache.get_stats()['evictions'] == 1
+
+def test_same_request_replaces_its_entry():
+    cache = SemanticCache(HashingEmbedder(), capacity=2)
+    cache.set('planner', 'default', QUESTION, 'old', PARAMS, ROOM_A)
+    cache.set('planner', 'default', QUESTION.upper(), 'new', PARAMS, ROOM_A)
+
+    assert cache.get_stats()['entries'] == 1
+    assert cache.get('planner', 'default', QUESTION, PARAMS, ROOM_A) == 'new'
+
+def test_partitions_are_bounded():
+    cache = SemanticCache(HashingEmbedder(), max_partitions=2)
+    for room_id in (1, 2, 3):
+        cache.set('planner', 'default', QUESTION, f'room {room_id}', PARAMS, SimpleNamespace(room_id=room_id))
+
+    assert cache.get_stats()['partitions'] == 2
+    assert cache.get('planner', 'default', QUESTION, PARAMS, SimpleNamespace(room_id=1)) is None
+    assert cache.get('planner', 'default', QUESTION, PARAMS, SimpleNamespace(room_id=3)) == 'room 3'
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(semantic.time, 'time', lambda: now[0])
+    cache = SemanticCache(HashingEmbedder(), ttl=60)
+    cache.set('planner', 'default', QUESTION, 'bake sale plan', PARAMS, ROOM_A)
+
+    now[0] += 59
+    assert cache.get('planner', 'default', QUESTION, PARAMS, ROOM_A) == 'bake sale plan'
+    now[0] += 2
+    assert cache.get('planner', 'default', QUESTION, PARAMS, ROOM_A) is None
+
+def embed_server(hits):
+    """Local HTTP server answering /api/embed with one vector per input"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            inputs = request['input'] if isinstance(request['input'], list) else [request['input']]
+            hits.append(self.server.server_address[1])
+            body = json.dumps({'model': request['model'], 'embeddings': [[1.0, 0.0]] * len(inputs)}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def test_ollama_embedder_leases_endpoints_from_the_pool():
+    pytest.importorskip('langchain_ollama')
+    hits = []
+    servers = [embed_server(hits), embed_server(hits)]
+    try:
+        pool = EndpointPool([f"http://127.0.0.1:{server.server_address[1]}" for server in servers])
+        embedder = OllamaEmbedder(pool=pool)
+        busy = pool.acquire()
+        # While one endpoint holds a request, embeddings go to the other
+        assert embedder.embed([QUESTION, UNRELATED]).shape == (2, 2)
+        pool.release(busy)
+
+        idle = next(endpoint for endpoint in pool.endpoints if endpoint is not busy)
+        assert list(embedder.clients) == [idle.url]
+        assert (idle.requests, idle.outstanding) == (1, 0)
+        assert hits == [int(idle.url.rsplit(':', 1)[1])]
+    finally:
+        for server in servers:
+            server.shutdown()
+            server.server_close()
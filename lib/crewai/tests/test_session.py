@@ -0,0 +1,55 @@
+import pytest
+
+from lib.crewai import session as session_module
+from lib.crewai.session import SessionManager
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(session_module.time, 'time', lambda: now[0])
+    return now
+
+def test_sessions_are_reused_until_they_time_out(clock):
+    sessions = SessionManager(session_timeout=100)
+    first = sessions.get_session('alice@example.com', 'room@muc')
+
+    clock[0] += 100
+    assert sessions.get_session('alice@example.com', 'room@muc') is first
+    clock[0] += 101
+    assert sessions.get_session('alice@example.com', 'room@muc') is not first
+
+def test_context_round_trip(clock):
+    sessions = SessionManager()
+    assert sessions.get_session_context('alice@example.com', 'room@muc', 'topic', 'none') == 'none'
+    sessions.update_session_context('alice@example.com', 'room@muc', 'topic', 'tea')
+    assert sessions.get_session_context('alice@example.com', 'room@muc', 'topic') == 'tea'
+
+def test_activity_pushes_the_deadline_again(clock):
+    sessions = SessionManager(session_timeout=100, stripes=1)
+    sessions.get_session('alice@example.com', 'room@muc')
+    sessions.get_session('bob@example.com', 'room@muc')
+    assert sessions.next_deadline() == 1100
+
+    clock[0] += 60
+    sessions.get_session('alice@example.com', 'room@muc')
+
+    # Both deadlines come up; only bob was idle the whole time
+    clock[0] += 40
+    assert sessions.cleanup_expired_sessions() == 1
+    assert list(sessions.sessions) == [('alice@example.com', 'room@muc')]
+    assert sessions.next_deadline() == 1160
+
+    clock[0] += 59
+    assert sessions.cleanup_expired_sessions() == 0
+    clock[0] += 1
+    assert sessions.cleanup_expired_sessions() == 1
+    assert sessions.next_deadline() is None
+
+def test_cleared_sessions_are_skipped(clock):
+    sessions = SessionManager(session_timeout=100)
+    sessions.get_session('alice@example.com', 'room@muc')
+    sessions.clear_session('alice@example.com', 'room@muc')
+
+    clock[0] += 100
+    assert sessions.cleanup_expired_sessions() == 0
+    assert sessions.next_deadline() is None
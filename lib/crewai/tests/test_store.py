@@ -0,0 +1,76 @@
+import sqlite3
+
+from lib.crewai.store import ArtifactStore
+
+def spec(size):
+    return {'data': 'x' * size}
+
+def test_replacing_an_artifact_keeps_total_bytes_exact(tmp_path):
+    store = ArtifactStore(tmp_path / "artifacts.sqlite3", max_bytes=10 ** 6)
+    store.put('agent-1', 'agent', spec(100))
+    store.put('agent-1', 'agent', spec(300))
+    store.put('agent-1', 'agent', spec(50))
+
+    actual = store.conn.execute("SELECT SUM(size) FROM artifacts").fetchone()[0]
+    assert store.total_bytes() == actual
+
+def test_replacing_a_crew_replaces_its_refs(tmp_path):
+    store = ArtifactStore(tmp_path / "artifacts.sqlite3", max_bytes=10 ** 6)
+    store.put('agent-1', 'agent', spec(10))
+    store.put('agent-2', 'agent', spec(10))
+    store.put('crew-1', 'crew', spec(10), refs=['agent-1'])
+    store.put('crew-1', 'crew', spec(10), refs=['agent-2'])
+
+    assert set(store.load('crew-1')) == {'crew-1', 'agent-2'}
+
+def test_referenced_artifacts_outlive_newer_unreferenced_ones(tmp_path):
+    store = ArtifactStore(tmp_path / "artifacts.sqlite3", max_bytes=2500, grace_seconds=0)
+    store.put('agent-1', 'agent', spec(500))
+    store.put('task-1', 'task', spec(500), refs=['agent-1'])
+    store.put('crew-1', 'crew', spec(500), refs=['agent-1', 'task-1'])
+    store.put('agent-2', 'agent', spec(500))
+    store.load('crew-1')  # the crew is now the most recently used graph
+
+    # Over quota: agent-2 is the only unreferenced artifact older than the crew
+    store.put('agent-3', 'agent', spec(500))
+
+    assert set(store.load('crew-1')) == {'crew-1', 'task-1', 'agent-1'}
+    assert store.load('agent-2') == {}
+    assert store.total_bytes() <= 2500
+
+def test_whole_graphs_are_evicted_from_their_root(tmp_path):
+    store = ArtifactStore(tmp_path / "artifacts.sqlite3", max_bytes=2000, grace_seconds=0)
+    store.put('agent-1', 'agent', spec(500))
+    store.put('task-1', 'task', spec(500), refs=['agent-1'])
+    store.put('crew-1', 'crew', spec(500), refs=['agent-1', 'task-1'])
+    store.put('agent-2', 'agent', spec(1500))
+
+    assert store.load('crew-1') == {}
+    assert store.load('task-1') == {}
+    assert store.load('agent-1') == {}
+    assert set(store.load('agent-2')) == {'agent-2'}
+
+def test_drifted_total_is_resynced_on_upgrade(tmp_path):
+    path = tmp_path / "artifacts.sqlite3"
+    store = ArtifactStore(path, max_bytes=10 ** 6)
+    store.put('agent-1', 'agent', spec(100))
+    store.conn.execute("DROP TRIGGER artifacts_size_update")
+    store.conn.execute("UPDATE store_meta SET value = 99999 WHERE key = 'total_bytes'")
+    store.conn.close()
+
+    store = ArtifactStore(path, max_bytes=10 ** 6)
+    assert store.total_bytes() == sqlite3.connect(path).execute("SELECT SUM(size) FROM artifacts").fetchone()[0]
+
+def test_new_artifacts_are_not_evicted_before_they_are_referenced(tmp_path):
+    store = ArtifactStore(tmp_path / "artifacts.sqlite3", max_bytes=1000, grace_seconds=60)
+    store.put('agent-1', 'agent', spec(500))
+    store.conn.execute("UPDATE artifacts SET created_at = created_at - 120")
+    store.put('agent-2', 'agent', spec(500))
+    store.load('agent-1')  # agent-2 is now the least recently used
+
+    # Over quota: agent-2 was just created and its task is still to come
+    store.put('agent-3', 'agent', spec(500))
+
+    assert store.load('agent-1') == {}
+    assert set(store.load('agent-2')) == {'agent-2'}
+    assert set(store.load('agent-3')) == {'agent-3'}
@@ -0,0 +1,79 @@
+import pytest
+
+from lib.crewai import streaming
+from lib.crewai.streaming import StreamPublisher
+
+class FakeMessage(dict):
+    def __init__(self, xmpp, body):
+        super().__init__(body=body, replace={})
+        self.xmpp = xmpp
+
+    def send(self):
+        self.xmpp.sent.append(self)
+
+class FakeXMPP:
+    """Records what a publisher sends to the room"""
+    def __init__(self):
+        self.sent = []
+
+    def make_message(self, mto, mbody, mtype):
+        return FakeMessage(self, mbody)
+
+    def send_message(self, mto, mbody, mtype):
+        self.sent.append(FakeMessage(self, mbody))
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(streaming.time, 'monotonic', lambda: now[0])
+    return now
+
+def test_correct_mode_grows_one_message(clock):
+    xmpp = FakeXMPP()
+    publisher = StreamPublisher(xmpp, 'room@muc', mode='correct', interval=1.0, min_chars=5)
+
+    publisher.feed("Hello there")
+    assert xmpp.sent == []  # the interval has not passed yet
+    clock[0] += 1.0
+    publisher.feed(", friend")
+    clock[0] += 1.0
+    publisher.feed(" of mine")
+    assert publisher.finish() == "Hello there, friend of mine"
+
+    bodies = [message['body'] for message in xmpp.sent]
+    assert bodies == ["Hello there, friend …", "Hello there, friend of mine …", "Hello there, friend of mine"]
+    # Every correction replaces the first message
+    first_id = xmpp.sent[0]['id']
+    assert 'id' not in xmpp.sent[0]['replace']
+    assert [message['replace']['id'] for message in xmpp.sent[1:]] == [first_id, first_id]
+
+def test_chunks_mode_splits_at_whitespace(clock):
+    xmpp = FakeXMPP()
+    publisher = StreamPublisher(xmpp, 'room@muc', mode='chunks', interval=1.0, min_chars=1)
+
+    clock[0] += 1.0
+    publisher.feed("The quick bro")
+    clock[0] += 1.0
+    publisher.feed("wn fox")
+    publisher.finish()
+
+    assert [message['body'] for message in xmpp.sent] == ["The quick", "brown", "fox"]
+
+def test_final_text_replaces_the_stream(clock):
+    xmpp = FakeXMPP()
+    publisher = StreamPublisher(xmpp, 'room@muc', mode='correct', interval=1.0, min_chars=1)
+    clock[0] += 1.0
+    publisher.feed("gAAAA")
+
+    assert publisher.finish("decrypted reply") == "decrypted reply"
+    assert xmpp.sent[-1]['body'] == "decrypted reply"
+    assert xmpp.sent[-1]['replace']['id'] == xmpp.sent[0]['id']
+
+def test_final_text_goes_out_whole_in_chunks_mode(clock):
+    xmpp = FakeXMPP()
+    publisher = StreamPublisher(xmpp, 'room@muc', mode='chunks', interval=1.0, min_chars=1)
+    clock[0] += 1.0
+    publisher.feed("gAAAA token")
+
+    publisher.finish("decrypted reply")
+    assert [message['body'] for message in xmpp.sent] == ["gAAAA", "decrypted reply"]
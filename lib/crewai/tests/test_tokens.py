@@ -0,0 +1,22 @@
+from lib.crewai.tokens import TokenCounter
+
+def test_estimate_calibrates_toward_reported_counts():
+    counter = TokenCounter(chars_per_token=3.8)
+    text = "x" * 1000
+    for _ in range(100):
+        counter.observe(text, 400)  # the model reports 2.5 chars per token
+
+    assert abs(counter.chars_per_token - 2.5) < 0.01
+    assert counter.count(text) == 400
+
+def test_implausible_counts_are_ignored():
+    counter = TokenCounter(chars_per_token=3.8)
+    # Most of this prompt came from Ollama's prompt cache
+    counter.observe("x" * 1000, 12)
+    counter.observe("x" * 1000, None)
+
+    assert counter.chars_per_token == 3.8
+
+def test_tokenizer_is_opt_in(monkeypatch):
+    monkeypatch.delenv('CREWAI_TIKTOKEN', raising=False)
+    assert TokenCounter().encoding is None
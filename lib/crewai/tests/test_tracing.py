@@ -0,0 +1,89 @@
+import json
+import asyncio
+import logging
+
+import pytest
+
+from lib.crewai import tracing
+from lib.crewai.tracing import Tracer, format_breakdown
+
+def test_disabled_tracer_is_a_noop():
+    tracer = Tracer(enabled=False)
+    with tracer.trace('request') as root:
+        root.set(room=1)
+        with tracer.span('stage') as stage:
+            assert stage is root
+
+def test_span_outside_a_trace_is_a_noop():
+    tracer = Tracer(enabled=True, slow_ms=10 ** 9)
+    with tracer.span('stage') as stage:
+        stage.set(rows=3)
+    assert not isinstance(stage, tracing.Span)
+
+def test_spans_nest_and_record_errors():
+    tracer = Tracer(enabled=True, slow_ms=10 ** 9)
+    with tracer.trace('request', request_id='abc', room=7) as root:
+        with tracer.span('cache_lookup', hit=False):
+            pass
+        with pytest.raises(ValueError):
+            with tracer.span('crew'):
+                with tracer.span('memory.load') as inner:
+                    raise ValueError("boom")
+
+    names = [(depth, span.name) for depth, span in root.walk()]
+    assert names == [(0, 'request'), (1, 'cache_lookup'), (1, 'crew'), (2, 'memory.load')]
+    assert inner.error == "ValueError('boom')"
+    assert root.trace_id == 'abc'
+    assert all(span.end_ns is not None for _depth, span in root.walk())
+    assert "cache_lookup" in format_breakdown(root)
+
+def test_spans_in_worker_threads_nest_under_the_request():
+    tracer = Tracer(enabled=True, slow_ms=10 ** 9)
+
+    def stage():
+        with tracer.span('decrypt'):
+            pass
+
+    async def request():
+        with tracer.trace('request') as root:
+            with tracer.span('memory'):
+                await asyncio.to_thread(stage)
+        return root
+
+    root = asyncio.run(request())
+    assert [(depth, span.name) for depth, span in root.walk()] == [(0, 'request'), (1, 'memory'), (2, 'decrypt')]
+
+def test_a_nested_trace_becomes_a_span():
+    tracer = Tracer(enabled=True, slow_ms=10 ** 9)
+    with tracer.trace('outer') as root:
+        with tracer.trace('inner'):
+            pass
+    assert [span.name for _depth, span in root.walk()] == ['outer', 'inner']
+
+def test_slow_requests_are_logged(caplog):
+    tracer = Tracer(enabled=True, slow_ms=0)
+    with caplog.at_level(logging.WARNING, logger='tracing'):
+        with tracer.trace('request', request_id='r1'):
+            with tracer.span('crew'):
+                pass
+    assert "Slow request request [r1]" in caplog.text
+    assert "  crew:" in caplog.text
+
+def test_otlp_export(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracer = Tracer(enabled=True, slow_ms=10 ** 9, export_path=str(path))
+    with tracer.trace('request', request_id='not-hex', flag=True, rows=2) as root:
+        with tracer.span('crew', ratio=0.5):
+            pass
+
+    document = json.loads(path.read_text().splitlines()[0])
+    spans = document["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    request, crew = spans
+    assert len(request["traceId"]) == 32 and request["traceId"] == crew["traceId"]
+    assert crew["parentSpanId"] == request["spanId"] == root.span_id
+    assert "parentSpanId" not in request
+    attributes = {item["key"]: item["value"] for item in request["attributes"]}
+    assert attributes == {
+        "flag": {"boolValue": True}, "rows": {"intValue": "2"}, "request.id": {"stringValue": "not-hex"}
+    }
+    assert int(crew["startTimeUnixNano"]) <= int(crew["endTimeUnixNano"])
@@ -0,0 +1,156 @@
+import threading
+from contextlib import contextmanager
+
+import psycopg2
+import pytest
+
+from lib.crewai import writebehind
+from lib.crewai.writebehind import MessageWriter, _Row
+
+class FakePool:
+    """Hands out ids from a fake sequence and counts the connections taken"""
+    def __init__(self):
+        self.next_id = 1
+        self.connections = 0
+        self.reserved = []
+
+    @contextmanager
+    def connection(self):
+        self.connections += 1
+        yield self
+
+    def execute(self, sql, params):
+        assert sql == writebehind.RESERVE_IDS_SQL
+        self.reserved = list(range(self.next_id, self.next_id + params[0]))
+        self.next_id += params[0]
+
+    def fetchall(self):
+        return [(message_id,) for message_id in self.reserved]
+
+    def cursor(self):
+        return self
+
+    def commit(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+class FakeTable:
+    """Records inserted rows; rejects rows whose content is 'bad'"""
+    def __init__(self, error=None):
+        self.rows = []
+        self.error = error
+        self.lock = threading.Lock()
+
+    def execute_values(self, cursor, sql, rows, page_size=None):
+        if self.error is not None:
+            raise self.error
+        if any(row[3] == 'bad' for row in rows):
+            raise psycopg2.DataError("invalid input")
+        with self.lock:
+            self.rows.extend(rows)
+
+@pytest.fixture
+def table(monkeypatch):
+    table = FakeTable()
+    monkeypatch.setattr(writebehind, 'execute_values', table.execute_values)
+    return table
+
+def stopped_writer(**kwargs):
+    """A writer whose background thread is stopped, so flushes run inline"""
+    writer = MessageWriter(FakePool(), flush_interval=0.01, **kwargs)
+    writer.stopped.set()
+    writer.thread.join()
+    writer.reserved_ids = list(range(1000, 0, -1))
+    return writer
+
+def pending(contents):
+    return [_Row(i, 7, None, content, 1, None) for i, content in enumerate(contents)]
+
+def test_bad_rows_are_dropped_after_retries(table):
+    writer = stopped_writer(max_retries=3)
+    writer.pending = pending(['a', 'b', 'bad', 'c', 'd'])
+
+    assert not writer.flush()
+    assert not writer.flush()
+    assert writer.flush()
+
+    assert [row[3] for row in table.rows] == ['a', 'b', 'c', 'd']
+    assert writer.pending == []
+    stats = writer.get_stats()
+    assert (stats['dropped'], stats['flushed'], stats['flush_errors']) == (1, 4, 3)
+
+def test_unreachable_database_keeps_rows(table):
+    writer = stopped_writer(max_retries=1)
+    table.error = psycopg2.OperationalError("connection refused")
+    writer.pending = pending(['a', 'b'])
+
+    for _ in range(5):
+        assert not writer.flush()
+    assert len(writer.pending) == 2
+
+    table.error = None
+    assert writer.flush()
+    assert [row[3] for row in table.rows] == ['a', 'b']
+    assert writer.get_stats()['dropped'] == 0
+
+def test_full_buffer_falls_back_to_a_direct_insert(table):
+    writer = stopped_writer(max_queue=1, put_timeout=0.01)
+    writer.enqueue(7, 'queued', 1)
+    message_id, _created_at = writer.enqueue(7, 'direct', 1)
+
+    assert [row[3] for row in table.rows] == ['direct']
+    assert table.rows[0][0] == message_id
+    assert writer.get_stats()['sync_writes'] == 1
+
+def test_enqueue_never_reserves_ids_itself(table):
+    writer = stopped_writer()
+    writer.reserved_ids = []
+    writer.pool.connections = 0
+    assigned = []
+
+    message_id, created_at = writer.enqueue(7, 'late', 1, on_id=lambda *key: assigned.append(key))
+    assert message_id is None
+    assert writer.pool.connections == 0
+    assert assigned == []
+
+    # The writer thread assigns the id before inserting the row
+    writer._take(0)
+    assert writer.flush()
+    assert writer.pool.connections == 2  # one to reserve ids, one to insert
+    assert assigned == [(table.rows[0][0], created_at)]
+    assert table.rows[0][0] is not None
+
+def test_readers_are_held_below_unflushed_rows(table):
+    writer = stopped_writer()
+    first_id, first_at = writer.enqueue(7, 'first', 1)
+    writer.enqueue(7, 'second', 1)
+    writer.enqueue(8, 'other room', 1)
+
+    assert writer.oldest_unflushed(7) == (first_at, first_id)
+    assert writer.oldest_unflushed(9) is None
+
+    writer._take(0)
+    assert writer.flush()
+    assert writer.oldest_unflushed(7) is None
+    assert writer.oldest_unflushed(8) is None
+
+def test_rows_without_an_id_hold_back_their_whole_timestamp(table):
+    writer = stopped_writer()
+    writer.reserved_ids = []
+    _message_id, created_at = writer.enqueue(7, 'late', 1)
+    assert writer.oldest_unflushed(7) == (created_at, 0)
+
+def test_dropped_rows_stop_holding_readers_back(table):
+    writer = stopped_writer(max_retries=1)
+    writer.enqueue(7, 'bad', 1)
+    writer.enqueue(7, 'good', 1)
+    writer._take(0)
+
+    assert writer.flush()
+    assert [row[3] for row in table.rows] == ['good']
+    assert writer.oldest_unflushed(7) is None
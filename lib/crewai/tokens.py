@@ -0,0 +1,124 @@
+import os
+import math
+import logging
+import threading
+
+# Characters per token for English chat text with the phi3 tokenizer
+DEFAULT_CHARS_PER_TOKEN = 3.8
+
+class TokenCounter:
+    """
+    Counts prompt tokens with a calibrated character-based estimate.
+
+    The chars-per-token ratio starts at CREWAI_CHARS_PER_TOKEN and is
+    calibrated from the token counts Ollama reports for real prompts
+    (prompt_eval_count), which the bot passes to observe() for every reply,
+    including the crew's and the summarizer's. That tracks whatever model is
+    actually serving.
+
+    With use_tokenizer (CREWAI_TIKTOKEN=true) and tiktoken installed, counts
+    come from tiktoken's cl100k_base encoding instead. That is not phi3's
+    tokenizer, so those counts are only an approximation, and they are not
+    calibrated.
+    """
+    # Ratios outside this range come from prompts Ollama partly served from
+    # its prompt cache, not from the tokenizer
+    MIN_CHARS_PER_TOKEN = 1.5
+    MAX_CHARS_PER_TOKEN = 8.0
+
+    def __init__(self, chars_per_token=None, use_tokenizer=None):
+        if chars_per_token is None:
+            chars_per_token = float(os.environ.get('CREWAI_CHARS_PER_TOKEN', DEFAULT_CHARS_PER_TOKEN))
+        if use_tokenizer is None:
+            use_tokenizer = os.environ.get('CREWAI_TIKTOKEN', 'false') == 'true'
+        self.chars_per_token = chars_per_token
+        self.encoding = None
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger('tokens')
+
+        if use_tokenizer:
+            try:
+                import tiktoken
+                self.encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception:
+                self.logger.debug("tiktoken not available, estimating token counts")
+
+    def count(self, text):
+        if not text:
+            return 0
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        return max(1, math.ceil(len(text) / self.chars_per_token))
+
+    def observe(self, text, actual_tokens, weight=0.1):
+        """Nudge the estimator toward a token count reported by the model"""
+        if self.encoding is not None or not text or not actual_tokens:
+            return
+        observed = len(text) / actual_tokens
+        if not self.MIN_CHARS_PER_TOKEN <= observed <= self.MAX_CHARS_PER_TOKEN:
+            return
+        with self.lock:
+            self.chars_per_token += (observed - self.chars_per_token) * weight
+
+_counter = None
+_counter_lock = threading.Lock()
+
+def get_token_counter():
+    """Return the process-wide token counter"""
+    global _counter
+    with _counter_lock:
+        if _counter is None:
+            _counter = TokenCounter()
+        return _counter
+
+def count_tokens(text):
+    return get_token_counter().count(text)
+
+class ContextAssembler:
+    """
+    Packs conversation context into a token budget.
+
+    Messages carry precomputed token counts, so assembling is just a greedy
+    walk from the newest message backwards until the budget is used up. A
+    summary of older messages, when there is one, is placed first and its
+    tokens are reserved before any messages are packed.
+    """
+    SUMMARY_HEADER = "[SUMMARY OF PREVIOUS CONVERSATION]: "
+    RECENT_HEADER = "\n\n[RECENT MESSAGES]:\n"
+    OMITTED_MARKER = "...[Earlier conversation omitted]...\n\n"
+
+    def __init__(self, counter=None):
+        self.counter = counter or get_token_counter()
+
+    def assemble(self, messages, budget, summary=None):
+        """
+        Build the history text from (text, token_count) pairs, oldest first.
+
+        Returns (history, used_tokens).
+        """
+        remaining = budget
+        prefix = ""
+
+        if summary:
+            summary_text = self.SUMMARY_HEADER + summary + self.RECENT_HEADER
+            summary_tokens = self.counter.count(summary_text)
+            if summary_tokens < remaining:
+                prefix = summary_text
+                remaining -= summary_tokens
+
+        # Separator newline counts as roughly one token
+        costs = [(tokens if tokens is not None else self.counter.count(text)) + 1 for text, tokens in messages]
+        if not prefix and sum(costs) > remaining:
+            # Not everything fits, so make room to say so
+            prefix = self.OMITTED_MARKER
+            remaining -= self.counter.count(prefix)
+
+        packed = []
+        for (text, _tokens), cost in zip(reversed(messages), reversed(costs)):
+            if cost > remaining:
+                break
+            packed.append(text)
+            remaining -= cost
+        packed.reverse()
+
+        return prefix + "\n".join(packed), budget - remaining
@@ -0,0 +1,232 @@
+import os
+import json
+import hashlib
+import time
+import uuid
+import logging
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+
+logger = logging.getLogger('tracing')
+
+_current = contextvars.ContextVar('crewai_span', default=None)
+
+class Span:
+    """
+    One timed stage of a request.
+
+    Spans nest through a context variable, which asyncio tasks and
+    asyncio.to_thread() copy, so stages run in worker threads still land
+    under the request that started them.
+    """
+    __slots__ = (
+        'name', 'trace_id', 'span_id', 'parent', 'attributes', 'children',
+        'start_ns', 'end_ns', 'wall_start_ns', 'error'
+    )
+
+    def __init__(self, name, trace_id, parent=None, attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent = parent
+        self.attributes = attributes or {}
+        self.children = []
+        self.wall_start_ns = time.time_ns()
+        self.start_ns = time.perf_counter_ns()
+        self.end_ns = None
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def finish(self):
+        self.end_ns = time.perf_counter_ns()
+
+    @property
+    def duration_ms(self):
+        end = self.end_ns if self.end_ns is not None else time.perf_counter_ns()
+        return (end - self.start_ns) / 1e6
+
+    def walk(self, depth=0):
+        yield depth, self
+        for child in list(self.children):
+            yield from child.walk(depth + 1)
+
+class _NoopSpan:
+    """Returned when tracing is disabled or no request is being traced"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+_NOOP = _NoopSpan()
+
+class Tracer:
+    """
+    Records nested stage timings per request.
+
+    A request is traced with trace(); stages inside it use span(). When the
+    request finishes, it is logged with its full breakdown if it took longer
+    than slow_ms, and appended to export_path as OpenTelemetry (OTLP/JSON)
+    resourceSpans, one document per line, if an export path is set.
+
+    When disabled, trace() and span() return a shared no-op span that is
+    also its own context manager, so instrumented code pays for a method
+    call and an attribute check.
+    """
+    def __init__(self, enabled=None, slow_ms=None, export_path=None, service_name='truecolors-crewai'):
+        if enabled is None:
+            enabled = os.environ.get('CREWAI_TRACING', 'false') == 'true'
+        self.enabled = enabled
+        self.slow_ms = slow_ms if slow_ms is not None else float(os.environ.get('CREWAI_TRACE_SLOW_MS', 5000))
+        self.export_path = export_path or os.environ.get('CREWAI_TRACE_EXPORT')
+        self.service_name = service_name
+        self.export_lock = threading.Lock()
+
+    def trace(self, name, request_id=None, **attributes):
+        """Trace one request; nested inside another trace it becomes a span"""
+        if not self.enabled:
+            return _NOOP
+        if _current.get() is not None:
+            return self._span(_current.get(), name, attributes)
+        return self._trace(name, request_id, attributes)
+
+    @contextmanager
+    def _trace(self, name, request_id, attributes):
+        root = Span(name, request_id or uuid.uuid4().hex, attributes=attributes)
+        token = _current.set(root)
+        try:
+            yield root
+        except BaseException as e:
+            root.error = repr(e)
+            raise
+        finally:
+            _current.reset(token)
+            root.finish()
+            self._finish_trace(root)
+
+    def span(self, name, **attributes):
+        """Time one stage of the current request; a no-op outside a trace"""
+        if not self.enabled:
+            return _NOOP
+        parent = _current.get()
+        if parent is None:
+            return _NOOP
+        return self._span(parent, name, attributes)
+
+    @contextmanager
+    def _span(self, parent, name, attributes):
+        span = Span(name, parent.trace_id, parent=parent, attributes=attributes)
+        parent.children.append(span)
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = repr(e)
+            raise
+        finally:
+            _current.reset(token)
+            span.finish()
+
+    def traced(self, name=None):
+        """Decorator running a function inside span(name)"""
+        def decorator(func):
+            span_name = name or func.__qualname__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled or _current.get() is None:
+                    return func(*args, **kwargs)
+                with self.span(span_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _finish_trace(self, root):
+        if root.duration_ms >= self.slow_ms:
+            logger.warning(f"Slow request {root.name} [{root.trace_id}]:\n{format_breakdown(root)}")
+        if self.export_path:
+            try:
+                document = json.dumps(to_otlp(root, self.service_name))
+                with self.export_lock:
+                    with open(self.export_path, 'a') as f:
+                        f.write(document + "\n")
+            except Exception as e:
+                logger.error(f"Failed to export trace {root.trace_id}: {e}")
+
+def format_breakdown(root):
+    """Indented tree of stage timings"""
+    lines = []
+    for depth, span in root.walk():
+        attributes = " ".join(f"{key}={value}" for key, value in span.attributes.items())
+        error = f" error={span.error}" if span.error else ""
+        lines.append(f"{'  ' * depth}{span.name}: {span.duration_ms:.1f}ms {attributes}{error}".rstrip())
+    return "\n".join(lines)
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def to_otlp(root, service_name):
+    """Render a finished trace as an OTLP/JSON ExportTraceServiceRequest"""
+    # OTLP wants 16 hex bytes; other request IDs are hashed into that shape
+    trace_id = root.trace_id.replace('-', '').lower()
+    if len(trace_id) != 32 or trace_id.strip('0123456789abcdef'):
+        trace_id = hashlib.md5(root.trace_id.encode()).hexdigest()
+    offset_ns = root.wall_start_ns - root.start_ns
+    spans = []
+    for _depth, span in root.walk():
+        end_ns = span.end_ns if span.end_ns is not None else span.start_ns
+        record = {
+            "traceId": trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 1,
+            "startTimeUnixNano": str(span.start_ns + offset_ns),
+            "endTimeUnixNano": str(end_ns + offset_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in span.attributes.items()],
+            "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+        }
+        if span.parent is not None:
+            record["parentSpanId"] = span.parent.span_id
+        else:
+            record["attributes"].append({"key": "request.id", "value": {"stringValue": str(root.trace_id)}})
+        spans.append(record)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+            "scopeSpans": [{"scope": {"name": "crewai.tracing"}, "spans": spans}],
+        }]
+    }
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+def get_tracer():
+    """Return the process-wide tracer"""
+    global _tracer
+    if _tracer is not None:
+        return _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer()
+        return _tracer
+
+def trace(name, request_id=None, **attributes):
+    return get_tracer().trace(name, request_id=request_id, **attributes)
+
+def span(name, **attributes):
+    return get_tracer().span(name, **attributes)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import json
+import logging
+import argparse
+import threading
+import socketserver
+
+from common import error_response
+from create_agent import create_agent, ERROR_PREFIX as AGENT_ERROR
+from create_task import create_task, ERROR_PREFIX as TASK_ERROR
+from create_crew import create_crew, ERROR_PREFIX as CREW_ERROR
+from run_crew import run_crew, ERROR_PREFIX as RUN_ERROR
+from llm import get_llm, default_model, ModelManager
+from tracing import trace
+
+# Commands accepted by the worker, mapped to the same entry points the
+# one-shot scripts use so both paths return identical envelopes
+COMMANDS = {
+    'create_agent': (create_agent, AGENT_ERROR),
+    'create_task': (create_task, TASK_ERROR),
+    'create_crew': (create_crew, CREW_ERROR),
+    'run_crew': (run_crew, RUN_ERROR),
+}
+
+logger = logging.getLogger('crewai_worker')
+
+def warm_up():
+    """Import CrewAI, build the default LLM client and load its models before serving requests"""
+    try:
+        import crewai  # noqa: F401
+        get_llm()
+        # Load the models in Ollama too; CREWAI_WARM_MODELS adds any beyond the default
+        extra = [model.strip() for model in os.environ.get('CREWAI_WARM_MODELS', '').split(',')]
+        ModelManager([default_model()] + extra).start()
+    except Exception as e:
+        # Requests will report the failure through the normal error envelope
+        logger.warning(f"Warm-up failed: {e}")
+
+def handle_request(request):
+    """
+    Dispatch a single request and return its response envelope.
+
+    A request looks like {"id": ..., "command": "create_agent", "payload": {...}}.
+    For run_crew the payload is the crew ID. The request ID, if present, is
+    echoed back so clients can pipeline several requests on one connection.
+    """
+    request_id = request.get('id') if isinstance(request, dict) else None
+    command = request.get('command') if isinstance(request, dict) else None
+
+    if command not in COMMANDS:
+        response = {
+            "status": "error",
+            "message": f"Unknown command: {command}"
+        }
+    else:
+        handler, error_prefix = COMMANDS[command]
+        try:
+            with trace(command, request_id=str(request_id) if request_id is not None else None):
+                response = handler(request.get('payload', {}))
+        except Exception as e:
+            logger.error(f"{error_prefix}: {e}")
+            response = error_response(error_prefix, e)
+
+    if request_id is not None:
+        response = dict(response, id=request_id)
+    return response
+
+def handle_line(line):
+    """Decode one JSON line and return the encoded response line"""
+    try:
+        request = json.loads(line)
+    except ValueError as e:
+        response = {
+            "status": "error",
+            "message": f"Invalid request: {str(e)}"
+        }
+    else:
+        response = handle_request(request)
+    return json.dumps(response) + "\n"
+
+def serve_stdio():
+    """Serve JSON-lines requests from stdin, writing responses to stdout"""
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        sys.stdout.write(handle_line(line))
+        sys.stdout.flush()
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for raw in self.rfile:
+            line = raw.decode('utf-8')
+            if not line.strip():
+                continue
+            self.wfile.write(handle_line(line).encode('utf-8'))
+            self.wfile.flush()
+
+class WorkerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def serve_socket(path):
+    """Serve JSON-lines requests on a Unix domain socket"""
+    if os.path.exists(path):
+        os.unlink(path)
+
+    server = WorkerServer(path, _RequestHandler)
+    os.chmod(path, 0o660)
+    logger.info(f"CrewAI worker listening on {path}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.unlink(path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Persistent CrewAI worker")
+    parser.add_argument('--socket', default=os.environ.get('CREWAI_WORKER_SOCKET'),
+                        help="Unix socket path to listen on (default: serve stdin/stdout)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+
+    # Warm the imports in the background so the socket is available immediately
+    warm_thread = threading.Thread(target=warm_up, daemon=True)
+    warm_thread.start()
+
+    if args.socket:
+        serve_socket(args.socket)
+    else:
+        warm_thread.join()
+        serve_stdio()
+
+if __name__ == '__main__':
+    main()
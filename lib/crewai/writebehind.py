@@ -0,0 +1,298 @@
+import os
+import time
+import queue
+import atexit
+import logging
+import threading
+from datetime import datetime, timezone
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+INSERT_SQL = (
+    "INSERT INTO chat_messages (id, room_id, agent_name, encrypted_content, token_count, created_at) VALUES %s"
+)
+RESERVE_IDS_SQL = (
+    "SELECT nextval(pg_get_serial_sequence('chat_messages', 'id')) FROM generate_series(1, %s)"
+)
+
+class _Row:
+    __slots__ = ('message_id', 'room_id', 'agent_name', 'encrypted_content', 'token_count', 'created_at', 'on_id')
+
+    def __init__(self, message_id, room_id, agent_name, encrypted_content, token_count, created_at, on_id=None):
+        self.message_id = message_id
+        self.room_id = room_id
+        self.agent_name = agent_name
+        self.encrypted_content = encrypted_content
+        self.token_count = token_count
+        self.created_at = created_at
+        self.on_id = on_id
+
+    def values(self):
+        return (
+            self.message_id, self.room_id, self.agent_name, self.encrypted_content, self.token_count,
+            self.created_at
+        )
+
+class MessageWriter:
+    """
+    Write-behind buffer for chat_messages rows.
+
+    enqueue() gives the row its created_at and, from a block of ids the
+    writer thread keeps reserved from the table's sequence, its id, and
+    returns without touching the database. If the reserve has run out, the
+    row gets its id on the writer thread just before it is inserted.
+    on_id(message_id, created_at) is called once the row has its id.
+    A background thread inserts the buffered rows with one multi-row INSERT
+    per batch, flushing when batch_size rows are waiting or flush_interval
+    seconds have passed.
+
+    A buffered row becomes visible after rows that were inserted directly
+    in the meantime, possibly with later (created_at, id) keys. Keyset
+    readers (the history window, the summarizer) therefore read no further
+    than oldest_unflushed(room_id), so they never move past a row that is
+    still to come.
+
+    A batch whose insert fails stays buffered and is retried. While the
+    database is unreachable that goes on indefinitely; any other error
+    (a constraint or type error in some row) is retried max_retries times,
+    after which the batch is split in halves until the failing rows are
+    found, and those are logged and dropped so the rows behind them are
+    not held up. When the buffer is full, enqueue() waits up to
+    put_timeout seconds and then inserts the row itself.
+
+    close() (also run at exit) drains the buffer.
+    """
+    def __init__(self, pool, batch_size=None, flush_interval=None, max_queue=None, id_block=100, on_flush=None,
+                 max_retries=3, put_timeout=None):
+        self.pool = pool
+        self.batch_size = batch_size or int(os.environ.get('CREWAI_WRITE_BATCH', 200))
+        self.flush_interval = flush_interval or float(os.environ.get('CREWAI_WRITE_INTERVAL', 0.5))
+        self.queue = queue.Queue(maxsize=max_queue or int(os.environ.get('CREWAI_WRITE_QUEUE', 10000)))
+        self.id_block = id_block
+        self.max_retries = max_retries
+        self.put_timeout = put_timeout or float(os.environ.get('CREWAI_WRITE_PUT_TIMEOUT', 1.0))
+        self.failures = 0  # consecutive failed flushes of the pending batch
+        self.on_flush = on_flush  # called with (rows, seconds) after each flush
+        self.reserved_ids = []
+        self.ids_lock = threading.Lock()
+        self.pending = []  # rows taken off the queue but not yet inserted
+        self.unflushed = {}  # room_id -> {row: (created_at, id)}, oldest first
+        self.unflushed_lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='message-writer', daemon=True)
+        self.stats = {
+            'enqueued': 0,
+            'flushed': 0,
+            'flushes': 0,
+            'flush_errors': 0,
+            'dropped': 0,
+            'sync_writes': 0,
+            'last_flush_seconds': 0.0,
+        }
+        self.stats_lock = threading.Lock()
+        self.logger = logging.getLogger('writebehind')
+        self.thread.start()
+
+    def _reserve_ids(self):
+        """Top up the reserved ids; runs on the writer thread"""
+        with self.ids_lock:
+            if len(self.reserved_ids) >= self.id_block // 2:
+                return
+        with self.pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(RESERVE_IDS_SQL, (self.id_block,))
+                ids = [row[0] for row in cursor.fetchall()]
+        with self.ids_lock:
+            # Handed out from the end, lowest first
+            self.reserved_ids = list(reversed(ids)) + self.reserved_ids
+
+    def _assign_ids(self, rows):
+        """Give rows enqueued without an id one, before they are inserted"""
+        for row in rows:
+            if row.message_id is not None:
+                continue
+            with self.ids_lock:
+                message_id = self.reserved_ids.pop() if self.reserved_ids else None
+            if message_id is None:
+                self._reserve_ids()
+                with self.ids_lock:
+                    message_id = self.reserved_ids.pop()
+            row.message_id = message_id
+            if row.on_id is not None:
+                row.on_id(message_id, row.created_at)
+
+    def enqueue(self, room_id, encrypted_content, token_count, agent_name=None, on_id=None):
+        """Buffer one message row; returns its (id, created_at), the id None if it is assigned later"""
+        with self.unflushed_lock:
+            # Keys are handed out in order under this lock, so each room's
+            # unflushed rows stay sorted by key
+            with self.ids_lock:
+                message_id = self.reserved_ids.pop() if self.reserved_ids else None
+            created_at = datetime.now(timezone.utc).replace(tzinfo=None)
+            row = _Row(message_id, room_id, agent_name, encrypted_content, token_count, created_at, on_id)
+            # Without an id yet, hold back every row from created_at on
+            self.unflushed.setdefault(room_id, {})[row] = (created_at, message_id or 0)
+        if message_id is not None and on_id is not None:
+            on_id(message_id, created_at)
+        try:
+            # Waits only when the buffer is full, i.e. the database is behind
+            self.queue.put(row, timeout=self.put_timeout)
+        except queue.Full:
+            # Do not hold the caller's thread any longer; write it directly
+            self._assign_ids([row])
+            try:
+                self._insert([row])
+            finally:
+                self._settle([row])
+            with self.stats_lock:
+                self.stats['sync_writes'] += 1
+            return row.message_id, created_at
+        with self.stats_lock:
+            self.stats['enqueued'] += 1
+        return message_id, created_at
+
+    def oldest_unflushed(self, room_id):
+        """(created_at, id) key of the room's oldest row not yet inserted, or None"""
+        with self.unflushed_lock:
+            rows = self.unflushed.get(room_id)
+            return next(iter(rows.values())) if rows else None
+
+    def _settle(self, rows):
+        """Stop holding readers back for rows that were inserted or dropped"""
+        with self.unflushed_lock:
+            for row in rows:
+                room_rows = self.unflushed.get(row.room_id)
+                if room_rows is not None:
+                    room_rows.pop(row, None)
+                    if not room_rows:
+                        del self.unflushed[row.room_id]
+
+    def _take(self, timeout):
+        """Move up to batch_size queued rows into pending"""
+        deadline = time.monotonic() + timeout
+        while len(self.pending) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    self.pending.append(self.queue.get_nowait())
+                else:
+                    self.pending.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+    def _run(self):
+        while not self.stopped.is_set():
+            try:
+                self._reserve_ids()
+            except Exception as e:
+                self.logger.warning(f"Could not reserve message ids: {e}")
+            self._take(self.flush_interval)
+            if self.pending and not self.flush():
+                # Back off before retrying a failed batch
+                self.stopped.wait(self.flush_interval)
+
+    def _insert(self, rows):
+        with self.pool.connection() as conn:
+            with conn.cursor() as cursor:
+                execute_values(cursor, INSERT_SQL, [row.values() for row in rows], page_size=len(rows))
+            conn.commit()
+
+    def _isolate(self, rows):
+        """
+        Insert rows in ever smaller halves, dropping the rows that fail on
+        their own. Returns (written, rows left unwritten because the
+        database became unreachable).
+        """
+        try:
+            self._insert(rows)
+            self._settle(rows)
+            return len(rows), []
+        except psycopg2.OperationalError:
+            return 0, rows
+        except Exception as e:
+            if len(rows) == 1:
+                self.logger.error(
+                    f"Dropping buffered message {rows[0].message_id} for room {rows[0].room_id}: {e}"
+                )
+                self._settle(rows)
+                with self.stats_lock:
+                    self.stats['dropped'] += 1
+                return 0, []
+        middle = len(rows) // 2
+        written_first, left_first = self._isolate(rows[:middle])
+        written_second, left_second = self._isolate(rows[middle:])
+        return written_first + written_second, left_first + left_second
+
+    def flush(self):
+        """Insert the pending rows; returns False if the insert failed"""
+        rows = self.pending
+        if not rows:
+            return True
+        started = time.monotonic()
+        try:
+            self._assign_ids(rows)
+            self._insert(rows)
+            self._settle(rows)
+            written, left = len(rows), []
+        except Exception as e:
+            self.failures += 1
+            with self.stats_lock:
+                self.stats['flush_errors'] += 1
+            self.logger.error(f"Failed to write {len(rows)} buffered messages: {e}")
+            if isinstance(e, psycopg2.OperationalError) or self.failures < self.max_retries:
+                return False
+            # The batch itself is bad; write what can be written
+            written, left = self._isolate(rows)
+            if left:
+                self.pending = left
+                return False
+
+        elapsed = time.monotonic() - started
+        self.pending = []
+        self.failures = 0
+        with self.stats_lock:
+            self.stats['flushed'] += written
+            self.stats['flushes'] += 1
+            self.stats['last_flush_seconds'] = elapsed
+        if self.on_flush is not None:
+            self.on_flush(written, elapsed)
+        return True
+
+    def close(self, timeout=10.0):
+        """Stop the writer thread and drain everything still buffered"""
+        if self.stopped.is_set():
+            return
+        self.stopped.set()
+        self.thread.join(timeout)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            self._take(0)
+            if not self.pending:
+                break
+            if not self.flush():
+                time.sleep(min(self.flush_interval, max(0.0, deadline - time.monotonic())))
+        if self.pending or not self.queue.empty():
+            self.logger.error(f"Dropped {len(self.pending) + self.queue.qsize()} unwritten messages at shutdown")
+
+    def get_stats(self):
+        with self.stats_lock:
+            stats = dict(self.stats)
+        stats['queue_depth'] = self.queue.qsize() + len(self.pending)
+        return stats
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+def write_behind_enabled():
+    return os.environ.get('CREWAI_WRITE_BEHIND', 'false') == 'true'
+
+def get_writer(pool):
+    """Return the process-wide message writer for a connection pool"""
+    with _writers_lock:
+        writer = _writers.get(id(pool))
+        if writer is None:
+            writer = MessageWriter(pool)
+            _writers[id(pool)] = writer
+            atexit.register(writer.close)
+        return writer
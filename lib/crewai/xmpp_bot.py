@@ -1,18 +1,33 @@
 import asyncio
 import logging
 from slixmpp import ClientXMPP
-from crewai import Crew, Agent, Task
-from langchain_ollama import ChatOllama
+from crewai import Crew, Task
 import yaml
-import psycopg2
-from cryptography.fernet import Fernet
+from cryptography.fernet import InvalidToken
 from .pg_memory import PostgresMemory
 import time
 from functools import wraps
 import os
-from .metrics import Metrics
-from .cache import ResponseCache
+import uuid
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from .metrics import Metrics, MetricsServer
+from .cache import ResponseCache, PostgresCacheTier, normalize_content
+from .singleflight import SingleFlight
+from .scheduler import RequestScheduler, SchedulerFull
+from .ratelimit import RateLimiter, limit_from_env
 from .session import SessionManager
+from .agents import AgentRegistry
+from .commands import CommandDispatcher
+from .routing import RoutingPolicy
+from .llm import add_timing_listener, get_endpoint_pool, is_endpoint_error, ModelManager
+from .summarizer import summary_model
+from .rooms import RoomRegistry
+from .db import get_pool, AsyncDatabase
+from .tokens import count_tokens, get_token_counter
+from .tracing import trace, span
+from .streaming import StreamPublisher
+from .writebehind import get_writer, write_behind_enabled
 
 def retry_on_exception(max_retries=3, delay=2):
     def decorator(func):
@@ -32,34 +47,139 @@ def retry_on_exception(max_retries=3, delay=2):
     return decorator
 
 class TrueColorsBot(ClientXMPP):
+    RATE_LIMIT_MESSAGES = {
+        'user': "Rate limit exceeded. Please try again later.",
+        'room': "This room is sending requests too quickly. Please try again later.",
+        'global': "I'm handling too many requests right now. Please try again later.",
+    }
+    ACTIVE_ROOMS_SQL = "SELECT id, xmpp_jid, room_key FROM chat_rooms WHERE active = true"
+    
     def __init__(self, jid, password, db_url):
         super().__init__(jid, password)
         self.db_url = db_url
+        # Database work never runs on the event loop: the bot goes through
+        # self.db, whose executor threads use this pool under strict timeouts
+        self.pool = get_pool(
+            db_url,
+            max_size=int(os.environ.get('CREWAI_DB_POOL_SIZE', 10)),
+            timeout=float(os.environ.get('CREWAI_DB_POOL_TIMEOUT', 30)),
+            connect_timeout=float(os.environ.get('CREWAI_DB_CONNECT_TIMEOUT', 5)),
+            statement_timeout=int(os.environ.get('CREWAI_DB_STATEMENT_TIMEOUT_MS', 15000))
+        )
+        self.db = AsyncDatabase(self.pool, timeout=float(os.environ.get('CREWAI_DB_TIMEOUT', 10)))
+        # Optionally buffer chat_messages inserts and write them in batches
+        self.writer = get_writer(self.pool) if write_behind_enabled() else None
         self.load_config()
         
-        # Rate limiting
-        self.rate_limits = {}
-        self.rate_limit_window = 60  # seconds
-        self.rate_limit_max = 5      # requests per window
+        # Rate limiting: token buckets per user, per room and overall
+        self.rate_limiter = RateLimiter(
+            user=limit_from_env('CREWAI_RATE_USER', per_minute=5, burst=5),
+            room=limit_from_env('CREWAI_RATE_ROOM', per_minute=20, burst=10),
+            global_limit=limit_from_env('CREWAI_RATE_GLOBAL', per_minute=120, burst=30)
+        )
         
         # Add plugins
         self.register_plugin('xep_0045')  # Multi-User Chat
         self.register_plugin('xep_0199')  # XMPP Ping
         self.register_plugin('xep_0085')  # Chat State Notifications
+        self.register_plugin('xep_0308')  # Last Message Correction
         
         # Event handlers
         self.add_event_handler("session_start", self.start)
         self.add_event_handler("groupchat_message", self.on_groupchat)
+        self.add_event_handler("killed", self.on_killed)
         
         # Initialize metrics
         self.metrics = Metrics()
         
         # Initialize cache
-        self.cache = ResponseCache()
+        # with an optional Postgres tier that survives restarts
+        l2 = None
+        if os.environ.get('CREWAI_L2_CACHE', 'false') == 'true':
+            l2 = PostgresCacheTier(
+                self.pool,
+                ttl=int(os.environ.get('CREWAI_L2_CACHE_TTL', 86400)),
+                max_entries=int(os.environ.get('CREWAI_L2_CACHE_MAX_ENTRIES', 10000))
+            )
+        self.cache = ResponseCache(l2=l2)
+        
+        # Optional near-duplicate cache, consulted after an exact miss
+        self.semantic_cache = None
+        if os.environ.get('CREWAI_SEMANTIC_CACHE', 'false') == 'true':
+            from .semantic import SemanticCache, get_embedder
+            self.semantic_cache = SemanticCache(
+                get_embedder(),
+                threshold=float(os.environ.get('CREWAI_SEMANTIC_THRESHOLD', 0.92)),
+                capacity=int(os.environ.get('CREWAI_SEMANTIC_CAPACITY', 256))
+            )
+        
+        # Coalesce identical in-flight requests; across rooms only if enabled,
+        # since each room's memory can change the answer
+        self.inflight = SingleFlight()
+        self.coalesce_across_rooms = os.environ.get('CREWAI_COALESCE_ACROSS_ROOMS', 'false') == 'true'
+        
+        # Requests run through a bounded, fair scheduler; its worker count
+        # matches the threads available for crew kickoff (the LLM capacity)
+        workers = int(os.environ.get('CREWAI_WORKERS', 2))
+        self.scheduler = RequestScheduler(
+            workers=workers,
+            max_queue=int(os.environ.get('CREWAI_QUEUE_SIZE', 50)),
+            max_per_room=int(os.environ.get('CREWAI_ROOM_QUEUE_SIZE', 10)),
+            on_wait=lambda seconds: self.metrics.record_time('queue_wait', seconds)
+        )
+        self.crew_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='crew')
+        
+        # Ollama endpoints (OLLAMA_HOSTS), routed by least outstanding requests
+        self.llm_endpoints = get_endpoint_pool()
+        
+        # Preload the routed models and, during CREWAI_MODEL_HOURS, keep them loaded
+        self.models = None
+        if os.environ.get('CREWAI_MODEL_WARMUP', 'true') == 'true':
+            self.models = ModelManager(
+                self.routing.models() | {summary_model()},
+                pool=self.llm_endpoints,
+                on_load=lambda model, url, seconds, cold: self.metrics.record_time(
+                    'model_load' if cold else 'model_keepalive', seconds
+                )
+            )
+            self.metrics.add_collector('models', self.models.get_stats)
+        
+        # Optionally stream replies into the room as they are generated
+        self.streaming = os.environ.get('CREWAI_STREAMING', 'false') == 'true'
+        self.stream_mode = os.environ.get('CREWAI_STREAM_MODE', 'correct')
+        self.stream_interval = float(os.environ.get('CREWAI_STREAM_INTERVAL', 1.5))
         
         # Initialize session manager
         self.session_manager = SessionManager()
         
+        # Room metadata, kept in sync with chat_rooms via LISTEN/NOTIFY
+        self.rooms = RoomRegistry(on_added=self.join_room, on_removed=self.leave_room)
+        self.room_follower = None
+        
+        # Export component stats with the latency histograms
+        self.metrics.add_collector('response_cache', self.cache.get_stats)
+        self.metrics.add_collector('inflight', self.inflight.get_stats)
+        self.metrics.add_collector('db_pool', self.pool.get_metrics)
+        self.metrics.add_collector('db_async', self.db.get_stats)
+        if self.writer is not None:
+            self.metrics.add_collector('write_behind', self.writer.get_stats)
+            self.writer.on_flush = lambda rows, seconds: self.metrics.record_time('write_behind_flush', seconds)
+        self.metrics.add_collector('scheduler', self.scheduler.get_stats)
+        self.metrics.add_collector('rate_limiter', self.rate_limiter.get_stats)
+        self.metrics.add_collector('llm_endpoints', self.llm_endpoints.get_stats)
+        # Model load and generation times of every Ollama reply
+        add_timing_listener(self.record_model_timings)
+        if self.semantic_cache is not None:
+            self.metrics.add_collector('semantic_cache', self.semantic_cache.get_stats)
+        
+        # Prometheus endpoint, if a port is configured
+        self.metrics_server = None
+        metrics_port = os.environ.get('CREWAI_METRICS_PORT')
+        if metrics_port:
+            self.metrics_server = MetricsServer(
+                self.metrics, int(metrics_port), os.environ.get('CREWAI_METRICS_HOST', '0.0.0.0')
+            ).start()
+        
     def load_config(self):
         # Load agents and tasks from YAML
         with open("config/agents.yaml") as f:
@@ -67,185 +187,460 @@ class TrueColorsBot(ClientXMPP):
             
         with open("config/tasks.yaml") as f:
             self.task_configs = yaml.safe_load(f)
+
+        # Build agents and their LLM clients once, up front
+        self.agents = AgentRegistry(self.agent_configs)
+        
+        # '@agent task content' parsing, compiled once
+        self.commands = CommandDispatcher(self.agent_configs)
+        
+        # Per-agent and per-task rules choosing the model for each request
+        self.routing = RoutingPolicy(self.agents, self.task_configs)
     
     async def start(self, event):
         await self.get_roster()
         self.send_presence()
+        self.scheduler.start()
+        self.session_manager.start()
+        if self.models is not None:
+            self.models.start()
+        
+        # Load rooms from database and join them
+        rows = await self.db.fetchall(self.ACTIVE_ROOMS_SQL)
+        self.rooms.load(rows)
+        
+        # Follow rooms being added, deactivated or rekeyed
+        if self.room_follower is None:
+            self.room_follower = asyncio.ensure_future(self.follow_rooms())
+        
+        if self.cache.l2 is not None:
+            asyncio.ensure_future(self.sweep_cache())
+    
+    async def follow_rooms(self, max_backoff=60):
+        """
+        Keep the room registry coherent with chat_rooms.
         
-        # Join rooms from database
-        conn = psycopg2.connect(self.db_url)
-        with conn.cursor() as cursor:
-            cursor.execute("SELECT id, xmpp_jid FROM chat_rooms WHERE active = true")
-            for row in cursor.fetchall():
-                room_id, room_jid = row
-                self.plugin['xep_0045'].join_muc(room_jid, self.boundjid.localpart)
-                logging.info(f"Joined room: {room_jid}")
-        conn.close()
+        Subscribes to change notifications and then reloads every active
+        room, so changes made while not listening are not missed. When the
+        listening connection fails, reconnects with exponential backoff.
+        """
+        loop = asyncio.get_running_loop()
+        backoff = 1
+        while True:
+            disconnected = asyncio.Event()
+            try:
+                conn = await self.db.run(
+                    self.rooms.connect_listener, self.db_url, self.pool.connect_kwargs.get('connect_timeout')
+                )
+                self.rooms.listen(
+                    conn, loop,
+                    on_change=lambda room_id: asyncio.ensure_future(self.refresh_room(room_id=room_id)),
+                    on_disconnect=disconnected.set
+                )
+                self.rooms.load(await self.db.fetchall(self.ACTIVE_ROOMS_SQL))
+            except Exception as e:
+                self.rooms.close()
+                logging.error(f"Could not listen for room changes, retrying in {backoff}s: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, max_backoff)
+                continue
+            
+            backoff = 1
+            await disconnected.wait()
+            logging.warning("Lost the room notification connection, reconnecting")
+    
+    async def sweep_cache(self, interval=300):
+        """Periodically remove expired and overflow L2 cache entries in bulk"""
+        while True:
+            try:
+                await self.db.run(self.cache.l2.sweep, timeout=120)
+            except Exception as e:
+                logging.error(f"Error sweeping response cache: {e}")
+            await asyncio.sleep(interval)
+    
+    def on_killed(self, event):
+        """Drain buffered writes once the bot has disconnected for good"""
+        if self.writer is not None:
+            self.writer.close()
+    
+    async def refresh_room(self, room_id=None, room_jid=None):
+        """Reload one room off the event loop and apply the change on it"""
+        try:
+            row = await self.db.run(self._fetch_room, room_id, room_jid)
+        except Exception as e:
+            logging.error(f"Error reloading room {room_id or room_jid}: {e}")
+            return None
+        return self.rooms.apply(row, room_id=room_id)
+    
+    def _fetch_room(self, room_id, room_jid):
+        with self.pool.connection() as conn:
+            return self.rooms.fetch(conn, room_id=room_id, room_jid=room_jid)
+    
+    def join_room(self, room):
+        self.plugin['xep_0045'].join_muc(room.room_jid, self.boundjid.localpart)
+        logging.info(f"Joined room: {room.room_jid}")
+    
+    def leave_room(self, room):
+        self.plugin['xep_0045'].leave_muc(room.room_jid, self.boundjid.localpart)
+        logging.info(f"Left room: {room.room_jid}")
     
     async def on_groupchat(self, msg):
-        if msg['mucnick'] == self.boundjid.localpart:
+        # Ordinary chat is rejected here before anything else is looked at
+        command = self.commands.parse(msg['body'])
+        if command is None or msg['mucnick'] == self.boundjid.localpart:
             return
-            
-        body = msg['body'].strip()
+        
         room_jid = msg['from'].bare
         user_jid = f"{msg['mucnick']}@{self.boundjid.domain}"
         
-        # Check for agent commands
-        for agent_name in self.agent_configs.keys():
-            if body.startswith(f"@{agent_name}"):
-                # Check rate limit
-                if not self.check_rate_limit(user_jid):
-                    self.send_message(mto=room_jid, 
-                                     mbody=f"Rate limit exceeded. Please try again later.", 
-                                     mtype='groupchat')
-                    return
-                    
-                await self.process_agent_message(agent_name, body, room_jid)
-                break
+        # Check rate limit
+        limited = self.rate_limiter.check(user_jid, room_jid)
+        if limited is not None:
+            self.metrics.increment('rate_limited')
+            self.send_message(mto=room_jid, 
+                             mbody=self.RATE_LIMIT_MESSAGES[limited], 
+                             mtype='groupchat')
+            return
+        
+        await self.schedule_agent_message(command, room_jid)
+    
+    def request_priority(self, agent_name, task_name):
+        """Priority from the task's config, else the agent's; higher runs first"""
+        task_config = self.task_configs.get(task_name) or {}
+        if 'priority' in task_config:
+            return int(task_config['priority'])
+        return int(self.agent_configs[agent_name].get('priority', 0))
+    
+    async def schedule_agent_message(self, command, room_jid):
+        """Queue a request, telling the room when it has to wait or cannot be taken"""
+        agent_name, task_name, _content = command
+        
+        idle_workers = self.scheduler.worker_count - self.scheduler.running
+        try:
+            position = self.scheduler.submit(
+                room_jid,
+                lambda: self.process_agent_message(command, room_jid),
+                priority=self.request_priority(agent_name, task_name)
+            )
+        except SchedulerFull:
+            self.metrics.increment('scheduler_rejected')
+            self.send_message(mto=room_jid, 
+                            mbody="I'm busy with other requests right now. Please try again in a few minutes.", 
+                            mtype='groupchat')
+            return
+        
+        if position > idle_workers:
+            self.send_message(mto=room_jid, 
+                            mbody=f"Request for {agent_name} / {task_name} queued (position {position - idle_workers}).", 
+                            mtype='groupchat')
     
     @retry_on_exception(max_retries=3, delay=2)
-    async def process_agent_message(self, agent_name, body, room_jid):
+    async def process_agent_message(self, command, room_jid):
+        agent_name, task_name, content = command
+        
         # Track metrics
         start_time = time.time()
-        try:
-            # Get room info and encryption key
-            conn = psycopg2.connect(self.db_url)
-            with conn.cursor() as cursor:
-                cursor.execute("SELECT id, room_key FROM chat_rooms WHERE xmpp_jid = %s", (room_jid,))
-                result = cursor.fetchone()
-                if not result:
+        failed = False
+        self.metrics.increment_request()
+        # Each request is one trace; the stages below are its spans
+        with trace('process_agent_message', request_id=uuid.uuid4().hex, agent=agent_name, room=room_jid) as request_span:
+            try:
+                # Get room info and encryption key
+                with span('room_lookup'):
+                    room = self.rooms.get(room_jid)
+                    if room is None:
+                        # Not seen yet (e.g. notification missed), look it up once
+                        room = await self.refresh_room(room_jid=room_jid)
+                if room is None:
                     self.send_message(mto=room_jid, 
                                     mbody="Error: Room not registered in database", 
                                     mtype='groupchat')
                     return
-                    
-                room_id, encrypted_key = result
-            conn.close()
-            
-            # Extract task from message
-            parts = body.split(' ', 2)
-            task_name = parts[1] if len(parts) > 1 else "default"
-            content = parts[2] if len(parts) > 2 else ""
-            
-            # Encrypt content for Ollama (using room key)
-            fernet = Fernet(encrypted_key)
-            encrypted_content = fernet.encrypt(content.encode()).decode()
-            
-            # Initialize memory with encryption
-            memory = PostgresMemory(
-                db_url=self.db_url,
-                room_id=room_id,
-                encryption_key=encrypted_key
-            )
-            
-            # Create agent
-            agent_config = self.agent_configs[agent_name]
-            agent = Agent(
-                role=agent_config['role'],
-                goal=agent_config['goal'],
-                backstory=agent_config['backstory'],
-                memory=memory,
-                verbose=True,
-                llm=ChatOllama(
-                    model="phi3:mini",
-                    temperature=0.7,
-                    top_p=0.9,
-                    max_tokens=1024
-                )
-            )
-            
-            # Create task with encrypted content
-            if task_name in self.task_configs:
-                task_config = self.task_configs[task_name]
-                task = Task(
-                    description=task_config['description'].format(content=f"ENCRYPTED:{encrypted_content}"),
-                    expected_output=task_config['expected_output'],
-                    agent=agent
-                )
-                
-                # Run crew with single agent and task
-                crew = Crew(
-                    agents=[agent],
-                    tasks=[task],
-                    verbose=True
-                )
-                
-                # Tell user we're processing
-                self.send_message(mto=room_jid, 
-                                mbody=f"Processing request for {agent_name} / {task_name}...", 
-                                mtype='groupchat')
                 
-                # Run the crew and get encrypted result
-                result = await asyncio.to_thread(crew.kickoff, inputs={"input": encrypted_content})
+                room_id = room.room_id
                 
-                # Decrypt the result before sending
-                decrypted_result = fernet.decrypt(result.encode()).decode()
+                # Model, token limit and context budget for this request
+                route = self.routing.route(agent_name, task_name, count_tokens(content), self.scheduler.queued)
+                if route.rule is not None:
+                    self.metrics.increment(f'route_{route.rule}')
+                request_span.set(task=task_name, model=route.model)
                 
-                # Send decrypted result back to room
-                self.send_message(mto=room_jid, mbody=decrypted_result, mtype='groupchat')
+                # Encrypt content for Ollama (using room key)
+                fernet = room.fernet
+                encrypted_content = fernet.encrypt(content.encode()).decode()
                 
-                # Save the interaction in the database (still encrypted)
-                await self.save_interaction(room_id, agent_name, task_name, encrypted_content, result)
+                # Serve repeated requests from the response cache
+                cache_params = route.params
+                if task_name in self.task_configs:
+                    with span('cache_lookup') as cache_span:
+                        cached = await self.cache_get(agent_name, task_name, content, cache_params, room)
+                        if cached is None and self.semantic_cache is not None:
+                            cached = await asyncio.to_thread(
+                                self.semantic_cache.get, agent_name, task_name, content, cache_params, room
+                            )
+                        cache_span.set(hit=cached is not None)
+                    if cached is not None:
+                        with span('xmpp_send'):
+                            self.send_message(mto=room_jid, mbody=cached, mtype='groupchat')
+                        with span('save_interaction'):
+                            await self.save_interaction(room_id, agent_name, task_name, encrypted_content, cached)
+                        return
                 
-            else:
+                if task_name in self.task_configs:
+                    # Tell user we're processing
+                    self.send_message(mto=room_jid, 
+                                    mbody=f"Processing request for {agent_name} / {task_name}...", 
+                                    mtype='groupchat')
+                    
+                    # Identical requests already running share the leader's result
+                    flight_key = (agent_name, task_name, normalize_content(content), cache_params)
+                    if not self.coalesce_across_rooms:
+                        flight_key += (room_id,)
+                    if self.streaming:
+                        run = lambda: self.stream_crew(agent_name, task_name, room, encrypted_content, room_jid, route)
+                    else:
+                        run = lambda: self.run_crew(agent_name, task_name, room, encrypted_content, route)
+                    with span('crew') as crew_span:
+                        decrypted_result, coalesced = await self.inflight.do(flight_key, run)
+                        crew_span.set(coalesced=coalesced)
+                    if not coalesced:
+                        with span('cache_store'):
+                            await self.cache_set(agent_name, task_name, content, decrypted_result, cache_params, room)
+                            if self.semantic_cache is not None:
+                                await asyncio.to_thread(
+                                    self.semantic_cache.set, agent_name, task_name, content, decrypted_result,
+                                    cache_params, room
+                                )
+                    
+                    # Send decrypted result back to room, unless it was streamed there
+                    if not (self.streaming and not coalesced):
+                        with span('xmpp_send'):
+                            self.send_message(mto=room_jid, mbody=decrypted_result, mtype='groupchat')
+                    
+                    # Save the interaction in the database (encrypted with the room key)
+                    with span('save_interaction'):
+                        await self.save_interaction(room_id, agent_name, task_name, encrypted_content, decrypted_result)
+                    
+                else:
+                    self.send_message(mto=room_jid, 
+                                    mbody=f"Unknown task: {task_name}", 
+                                    mtype='groupchat')
+            except Exception as e:
+                failed = True
+                request_span.set(error=str(e))
+                self.metrics.increment_error()
+                logging.error(f"Error processing message: {e}")
                 self.send_message(mto=room_jid, 
-                                mbody=f"Unknown task: {task_name}", 
+                                mbody=f"Error: {str(e)}", 
                                 mtype='groupchat')
+            finally:
+                # Record metrics
+                execution_time = time.time() - start_time
+                self.metrics.record_time('process_agent_message', execution_time, error=failed)
+
+    async def cache_get(self, agent_name, task_name, content, params, room):
+        """Look up a response in L1, then L2 off the event loop"""
+        if self.cache.l2 is None:
+            return self.cache.get(agent_name, task_name, content, params, room)
+        return await self.db.run(self.cache.get, agent_name, task_name, content, params, room)
+    
+    async def cache_set(self, agent_name, task_name, content, response, params, room):
+        """Store a response in L1 and, off the event loop, in L2"""
+        if self.cache.l2 is None:
+            self.cache.set(agent_name, task_name, content, response, params, room)
+        else:
+            await self.db.run(self.cache.set, agent_name, task_name, content, response, params, room)
+    
+    def run_on_crew_executor(self, func, *args):
+        """
+        Run func on the bounded crew executor. The context is copied here,
+        so call this inside the span the work belongs to: spans opened in
+        the crew thread then nest under it.
+        """
+        context = contextvars.copy_context()
+        return asyncio.get_running_loop().run_in_executor(self.crew_executor, context.run, func, *args)
+    
+    async def run_crew(self, agent_name, task_name, room, encrypted_content, route):
+        """Run a single agent/task crew for a room and return the decrypted result"""
+        fernet = room.fernet
+        
+        # Initialize memory with encryption
+        with span('memory_init'):
+            memory = PostgresMemory(
+                db_url=self.db_url,
+                room_id=room.room_id,
+                encryption_key=room.room_key,
+                fernet=fernet,
+                token_budget=route.context_tokens
+            )
+        
+        # Least loaded Ollama endpoint, held until the crew finishes
+        endpoint = self.llm_endpoints.acquire()
+        ok = False
+        endpoint_failed = False
+        started = time.time()
+        try:
+            # Bind the prebuilt agent for that endpoint to this room's memory
+            agent = self.agents.bind(agent_name, memory, endpoint.url, route.params)
+            
+            # Create task with encrypted content
+            task = Task(
+                description=self.task_description(task_name, encrypted_content),
+                expected_output=self.task_configs[task_name]['expected_output'],
+                agent=agent
+            )
+            
+            # Run crew with single agent and task
+            crew = Crew(
+                agents=[agent],
+                tasks=[task],
+                verbose=True
+            )
+            
+            with span('crew_kickoff', endpoint=endpoint.url):
+                result = await self.run_on_crew_executor(lambda: crew.kickoff(inputs={"input": encrypted_content}))
+            ok = True
         except Exception as e:
-            logging.error(f"Error processing message: {e}")
-            self.send_message(mto=room_jid, 
-                            mbody=f"Error: {str(e)}", 
-                            mtype='groupchat')
+            # Only transport and server errors count against the endpoint
+            endpoint_failed = is_endpoint_error(e)
+            raise
         finally:
-            # Record metrics
-            execution_time = time.time() - start_time
-            self.metrics.record_time('process_agent_message', execution_time)
-
+            self.llm_endpoints.release(endpoint, ok=not endpoint_failed)
+            self.metrics.record_time('crew_kickoff', time.time() - started, error=not ok)
+        
+        # Decrypt the result before sending
+        return self.open_result(fernet, result)
+    
+    def task_description(self, task_name, encrypted_content):
+        """The task as the crew and the streaming path both send it, with the request still encrypted"""
+        return self.task_configs[task_name]['description'].format(content=f"ENCRYPTED:{encrypted_content}")
+    
+    def open_result(self, fernet, result):
+        """
+        The reply in plaintext, for both the crew and the streaming path: a
+        Fernet token is decrypted with the room key, other text is passed
+        through as the model wrote it.
+        """
+        try:
+            return fernet.decrypt(result.encode()).decode()
+        except InvalidToken:
+            return result
+    
+    async def stream_crew(self, agent_name, task_name, room, encrypted_content, room_jid, route):
+        """
+        Answer a single agent/task request straight from the agent's LLM,
+        streaming the reply into the room as it is generated.
+        
+        The prompt mirrors what the crew would send for one agent and one
+        task: the agent's persona, the room's history and the task, with the
+        request encrypted as in run_crew. The reply goes through the same
+        open_result(); if that changes it, the final flush replaces what
+        was streamed.
+        """
+        with span('memory_init'):
+            memory = PostgresMemory(
+                db_url=self.db_url,
+                room_id=room.room_id,
+                encryption_key=room.room_key,
+                fernet=room.fernet,
+                token_budget=route.context_tokens
+            )
+        history = (await self.db.run(memory.load_memory_variables, {}))['chat_history']
+        
+        agent_config = self.agent_configs[agent_name]
+        task_config = self.task_configs[task_name]
+        system = (
+            f"You are {agent_config['role']}. {agent_config['backstory']}\n"
+            f"Your personal goal is: {agent_config['goal']}"
+        )
+        prompt = self.task_description(task_name, encrypted_content)
+        if history:
+            prompt = f"Conversation so far:\n{history}\n\n{prompt}"
+        prompt += f"\n\nThis is the expected output for your answer: {task_config['expected_output']}"
+        
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue()
+        
+        def produce():
+            try:
+                with self.llm_endpoints.lease() as endpoint:
+                    llm = self.agents.llm_for(agent_config, endpoint.url, route.params)
+                    for chunk in llm.stream([("system", system), ("human", prompt)]):
+                        loop.call_soon_threadsafe(chunks.put_nowait, chunk.content)
+            except Exception as e:
+                loop.call_soon_threadsafe(chunks.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(chunks.put_nowait, None)
+        
+        publisher = StreamPublisher(self, room_jid, mode=self.stream_mode, interval=self.stream_interval)
+        started = time.time()
+        first_chunk = True
+        with span('llm_stream') as stream_span:
+            producer = self.run_on_crew_executor(produce)
+            while True:
+                chunk = await chunks.get()
+                if chunk is None:
+                    break
+                if isinstance(chunk, Exception):
+                    raise chunk
+                if first_chunk:
+                    first_chunk = False
+                    self.metrics.record_time('first_chunk', time.time() - started)
+                publisher.feed(chunk)
+            await producer
+            result = publisher.finish(self.open_result(room.fernet, publisher.text()))
+            stream_span.set(flushes=publisher.flushes)
+        self.metrics.record_time('crew_kickoff', time.time() - started)
+        
+        # The reply is already in the room; a failed save must not fail the request
+        try:
+            await self.db.run(memory.save_context, {'input': encrypted_content}, {'reply': result})
+        except Exception as e:
+            logging.error(f"Error saving streamed reply to memory: {e!r}")
+        return result
+    
+    def record_model_timings(self, metadata, prompt_text=None):
+        """
+        Split Ollama's timings for a reply into model load and generation,
+        and calibrate the token estimate from the prompt's token count.
+        Registered with add_timing_listener, so it sees every reply: crew
+        kickoffs, streamed replies and summaries.
+        """
+        if 'load_duration' not in metadata:
+            return
+        get_token_counter().observe(prompt_text, metadata.get('prompt_eval_count'))
+        self.metrics.record_time('model_load', metadata['load_duration'] / 1e9)
+        self.metrics.record_time(
+            'generation', (metadata.get('prompt_eval_duration', 0) + metadata.get('eval_duration', 0)) / 1e9
+        )
+    
     async def save_interaction(self, room_id, agent_name, task_name, input_content, result):
         """Save the interaction in the database for future reference"""
-        conn = psycopg2.connect(self.db_url)
         try:
+            fernet = self.rooms.get_by_id(room_id).fernet
+            await self.db.run(self._insert_interaction, fernet, room_id, agent_name, task_name, input_content, result)
+        except Exception as e:
+            logging.error(f"Error saving interaction: {e!r}")
+    
+    def _insert_interaction(self, fernet, room_id, agent_name, task_name, input_content, result):
+        # Encrypt content with the cached room key
+        message = f"Task: {task_name}\nInput: {input_content}\nResult: {result}"
+        encrypted_content = fernet.encrypt(message.encode())
+        
+        if self.writer is not None:
+            self.writer.enqueue(room_id, encrypted_content, count_tokens(message), agent_name=agent_name)
+            return
+        
+        with self.pool.connection() as conn:
             with conn.cursor() as cursor:
-                # Get room key for encryption
-                cursor.execute("SELECT room_key FROM chat_rooms WHERE id = %s", (room_id,))
-                room_key = cursor.fetchone()[0]
-                
-                # Encrypt content
-                fernet = Fernet(room_key)
-                encrypted_content = fernet.encrypt(f"Task: {task_name}\nInput: {input_content}\nResult: {result}".encode())
-                
-                # Save as a message
+                # Save as a message, with its token count for context packing
                 cursor.execute(
-                    "INSERT INTO chat_messages (room_id, agent_name, encrypted_content) VALUES (%s, %s, %s)",
-                    (room_id, agent_name, encrypted_content)
+                    "INSERT INTO chat_messages (room_id, agent_name, encrypted_content, token_count) "
+                    "VALUES (%s, %s, %s, %s)",
+                    (room_id, agent_name, encrypted_content, count_tokens(message))
                 )
-                conn.commit()
-        except Exception as e:
-            logging.error(f"Error saving interaction: {e}")
-        finally:
-            conn.close()
+            conn.commit()
 
-    def check_rate_limit(self, user_jid):
+    def check_rate_limit(self, user_jid, room_jid=None):
         """Check if user has exceeded rate limit"""
-        now = time.time()
-        
-        # Clean up old entries
-        for jid in list(self.rate_limits.keys()):
-            if self.rate_limits[jid]['reset_time'] < now:
-                del self.rate_limits[jid]
-        
-        # Check if user is in rate limits
-        if user_jid not in self.rate_limits:
-            self.rate_limits[user_jid] = {
-                'count': 1,
-                'reset_time': now + self.rate_limit_window
-            }
-            return True
-        
-        # Check if user has exceeded limit
-        if self.rate_limits[user_jid]['count'] >= self.rate_limit_max:
-            return False
-        
-        # Increment count
-        self.rate_limits[user_jid]['count'] += 1
-        return True
\ No newline at end of file
+        return self.rate_limiter.allow(user_jid, room_jid)
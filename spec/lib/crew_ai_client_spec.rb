@@ -0,0 +1,76 @@
+# frozen_string_literal: true
+
+require 'rails_helper'
+
+RSpec.describe CrewAiClient do
+  let(:tmpdir) { Dir.mktmpdir }
+  let(:socket_path) { File.join(tmpdir, 'worker.sock') }
+
+  around do |example|
+    ClimateControl.modify(CREWAI_WORKER_SOCKET: socket_path) do
+      example.run
+    end
+  end
+
+  after { FileUtils.remove_entry(tmpdir) }
+
+  # Answers one request on the socket like lib/crewai/worker.py, and keeps
+  # the request it received
+  def serve_once(&reply)
+    server = UNIXServer.new(socket_path)
+    Thread.new do
+      client = server.accept
+      request = JSON.parse(client.gets)
+      client.write("#{reply.call(request).to_json}\n")
+      client.close
+      request
+    ensure
+      server.close
+    end
+  end
+
+  describe '.call' do
+    context 'when the worker answers' do
+      it 'sends the command as one JSON line and returns the success envelope' do
+        worker = serve_once { |request| { id: request['id'], status: 'success', agent_id: 42 } }
+
+        result = described_class.call(:create_agent, { name: 'planner' })
+        request = worker.value
+
+        expect(request).to include('command' => 'create_agent', 'payload' => { 'name' => 'planner' })
+        expect(result).to include('id' => request['id'], 'status' => 'success', 'agent_id' => 42)
+      end
+    end
+
+    context 'when the worker returns an error envelope' do
+      it 'raises with the worker message' do
+        worker = serve_once { |request| { id: request['id'], status: 'error', message: 'Unknown agent: planner' } }
+
+        expect { described_class.call(:run_crew, '7') }
+          .to raise_error(described_class::Error, 'Unknown agent: planner')
+        worker.join
+      end
+    end
+
+    context 'when the socket is missing' do
+      it 'returns nil so callers fall back to the scripts' do
+        expect(described_class.available?).to be false
+        expect(described_class.call(:create_crew, {})).to be_nil
+      end
+    end
+
+    context 'when the socket refuses connections' do
+      before do
+        # A socket file left behind by a worker that is no longer listening
+        UNIXServer.new(socket_path).close
+        allow(Rails.logger).to receive(:warn)
+      end
+
+      it 'logs and returns nil so callers fall back to the scripts' do
+        expect(described_class.available?).to be true
+        expect(described_class.call(:create_task, {})).to be_nil
+        expect(Rails.logger).to have_received(:warn).with(/falling back to scripts/)
+      end
+    end
+  end
+end